@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+FIELD_ALIASES = {
+    "email_id": ("email_id", "request_id", "id"),
+    "subject": ("subject", "title"),
+    "message": ("message", "body")
+}
+
+def detect_format(text, content_type="", filename=""):
+    content_type = (content_type or "").lower()
+    filename = (filename or "").lower()
+    if "json" in content_type or filename.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    if "csv" in content_type or filename.endswith(".csv"):
+        return "csv"
+    return "jsonl" if text.lstrip().startswith("{") else "csv"
+
+def normalize_row(row):
+    """Map a raw row onto email_id/subject/message, accepting the aliases in FIELD_ALIASES."""
+    normalized = {}
+    for field, aliases in FIELD_ALIASES.items():
+        value = next((row[alias] for alias in aliases if row.get(alias) not in (None, "")), "")
+        normalized[field] = str(value)
+    if not normalized["message"]:
+        raise ValueError("row has no message/body")
+    return normalized
+
+def parse_email_rows(content, content_type="", filename=""):
+    """Yield (row_number, fields, error) for every row of a CSV or JSONL upload.
+
+    row_number is the JSONL line number or the 1-based CSV record number.
+    fields is the normalized row dict, or None when the row could not be parsed, in
+    which case error says why; one bad row never stops the rest from parsing.
+    """
+    text = content.decode("utf-8-sig") if isinstance(content, bytes) else content
+    if detect_format(text, content_type, filename) == "jsonl":
+        for row_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("row is not a JSON object")
+                yield row_number, normalize_row(row), None
+            except Exception as e:
+                yield row_number, None, str(e)
+    else:
+        for row_number, row in enumerate(csv.DictReader(io.StringIO(text)), start=1):
+            try:
+                yield row_number, normalize_row(row), None
+            except Exception as e:
+                yield row_number, None, str(e)
@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from batch_io import parse_email_rows
+from models import EmailRequest
+
+logger = logging.getLogger(__name__)
+
+def checkpoint_key(row_number, email_id):
+    return f"{row_number}\t{email_id}"
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+async def _worker_loop(tasks, results, concurrency):
+    import main
+
+    semaphore = asyncio.Semaphore(concurrency)
+    running = set()
+    if main.result_store is not None:
+        await main.result_store.start()
+
+    async def run_row(row_number, fields):
+        try:
+            result = await main.run_email(EmailRequest(**fields))
+            outcome = {"row": row_number, "email_id": fields["email_id"], "status": "ok", "result": jsonable_encoder(result)}
+        except Exception as e:
+            logger.error(f"Row {row_number} ({fields['email_id']}) failed: {e}")
+            outcome = {"row": row_number, "email_id": fields["email_id"], "status": "error", "error": str(e)}
+        finally:
+            semaphore.release()
+        results.put(outcome)
+
+    while True:
+        await semaphore.acquire()
+        task = await asyncio.to_thread(tasks.get)
+        if task is None:
+            semaphore.release()
+            break
+        running.add(asyncio.create_task(run_row(*task)))
+        running = {pending for pending in running if not pending.done()}
+    if running:
+        await asyncio.gather(*running)
+    if main.result_store is not None:
+        await main.result_store.stop()
+    await main.llm_client.aclose()
+
+def _worker(tasks, results, concurrency):
+    import main
+    main.reconnect_after_fork()
+    asyncio.run(_worker_loop(tasks, results, concurrency))
+    main.tracer.shutdown()
+
+def run_batch(input_path, output_path, checkpoint_path, workers, concurrency):
+    # Importing main here loads prompts, the catalog, embeddings and indexes once; forked
+    # workers inherit them copy-on-write instead of each re-running process_catalog.
+    import main
+
+    with open(input_path, "rb") as f:
+        rows = list(parse_email_rows(f.read(), filename=input_path))
+    completed = load_checkpoint(checkpoint_path)
+    pending = []
+    parse_errors = []
+    for row_number, fields, error in rows:
+        if error is not None:
+            parse_errors.append({"row": row_number, "email_id": None, "status": "error", "error": error})
+        elif checkpoint_key(row_number, fields["email_id"]) not in completed:
+            pending.append((row_number, fields))
+    logger.info(
+        f"{len(rows)} rows in {input_path}: {len(rows) - len(pending) - len(parse_errors)} already done, "
+        f"{len(pending)} to process, {len(parse_errors)} unparseable"
+    )
+
+    context = multiprocessing.get_context("fork")
+    tasks = context.Queue()
+    results = context.Queue()
+    for task in pending:
+        tasks.put(task)
+    for _ in range(workers):
+        tasks.put(None)
+
+    # Close parent connections the children must not share before forking
+    main.db_handler.client.close()
+    processes = [context.Process(target=_worker, args=(tasks, results, concurrency), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    started = time.perf_counter()
+    succeeded = failed = 0
+    with open(output_path, "a", encoding="utf-8") as output, open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        for outcome in parse_errors:
+            output.write(json.dumps(outcome) + "\n")
+        received = 0
+        while received < len(pending):
+            try:
+                outcome = results.get(timeout=5)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    logger.error(f"All workers exited with {len(pending) - received} rows outstanding; rerun to resume")
+                    break
+                continue
+            received += 1
+            output.write(json.dumps(outcome) + "\n")
+            output.flush()
+            if outcome["status"] == "ok":
+                succeeded += 1
+                # Only successes are checkpointed, so a resumed run retries the failures
+                checkpoint.write(checkpoint_key(outcome["row"], outcome["email_id"]) + "\n")
+                checkpoint.flush()
+            else:
+                failed += 1
+            if received % 100 == 0:
+                os.fsync(checkpoint.fileno())
+                elapsed = time.perf_counter() - started
+                logger.info(f"{received}/{len(pending)} emails done ({received / elapsed:.1f} emails/s)")
+
+    for process in processes:
+        process.join()
+    logger.info(f"Batch finished: {succeeded} succeeded, {failed} failed, {len(parse_errors)} unparseable")
+    return succeeded, failed
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
+    parser = argparse.ArgumentParser(description="Run the email workflow over a CSV or JSONL file without the API server")
+    parser.add_argument("input", help="CSV or JSONL with email_id, subject and message columns (aliases accepted)")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="Completed-row file used to resume (default: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('BATCH_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv('BATCH_WORKER_CONCURRENCY', '8')),
+                        help="Emails in flight per worker process")
+    args = parser.parse_args()
+
+    run_batch(args.input, args.output, args.checkpoint or f"{args.output}.checkpoint", args.workers, args.concurrency)
@@ -0,0 +1,83 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+class ProductRecord:
+    __slots__ = ("store", "row", "product_id", "name", "category", "description", "seasons")
+
+    def __init__(self, store, row, product_id, name, category, description, seasons):
+        self.store = store
+        self.row = row
+        self.product_id = product_id
+        self.name = name
+        self.category = category
+        self.description = description
+        self.seasons = seasons
+
+    @property
+    def stock(self):
+        return int(self.store.stock[self.row])
+
+    @property
+    def price(self):
+        return float(self.store.price[self.row])
+
+    def __repr__(self):
+        return f"ProductRecord(product_id={self.product_id!r}, name={self.name!r}, stock={self.stock}, price={self.price})"
+
+class CatalogStore:
+    """Catalog records indexed by product_id and lowercase name, with stock and price held as columns."""
+
+    def __init__(self, product_catalog_df):
+        def column(name, default=""):
+            if name in product_catalog_df.columns:
+                return product_catalog_df[name].fillna(default).tolist()
+            return [default] * len(product_catalog_df)
+
+        self.stock = np.array(pd.to_numeric(product_catalog_df['stock'], errors='coerce').fillna(0), dtype=np.int64)
+        self.price = np.array(pd.to_numeric(product_catalog_df['price'], errors='coerce').fillna(0), dtype=np.float64) \
+            if 'price' in product_catalog_df.columns else np.zeros(len(product_catalog_df), dtype=np.float64)
+
+        self.records = [
+            ProductRecord(self, row, product_id, name, category, description, seasons)
+            for row, (product_id, name, category, description, seasons) in enumerate(zip(
+                column('product_id'), column('name'), column('category'), column('description'), column('seasons')
+            ))
+        ]
+        self._rows_by_id = {}
+        self._rows_by_name = {}
+        for record in self.records:
+            # First occurrence wins, matching the previous iloc[0] lookups
+            self._rows_by_id.setdefault(record.product_id, record.row)
+            self._rows_by_name.setdefault(str(record.name).strip().lower(), record.row)
+        logger.info(f"Catalog store built with {len(self.records)} products")
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, product_id):
+        return product_id in self._rows_by_id
+
+    def row_of(self, product_id):
+        return self._rows_by_id.get(product_id)
+
+    def get(self, product_id):
+        row = self._rows_by_id.get(product_id)
+        return self.records[row] if row is not None else None
+
+    def find_by_name(self, name):
+        row = self._rows_by_name.get(str(name).strip().lower())
+        return self.records[row] if row is not None else None
+
+    def reserve(self, product_id, quantity):
+        """Take up to quantity units from stock and return how many were filled."""
+        row = self._rows_by_id.get(product_id)
+        if row is None:
+            return 0
+        filled = int(min(self.stock[row], quantity))
+        if filled > 0:
+            self.stock[row] -= filled
+        return filled
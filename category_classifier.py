@@ -0,0 +1,155 @@
+import argparse
+import csv
+import json
+import logging
+import re
+import zlib
+
+import numpy as np
+
+from global_state import Category
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[^\W_]+")
+_TEMPERATURES = np.geomspace(0.005, 1.0, 40)
+
+def _features(subject, body):
+    tokens = _TOKEN.findall(f"{subject or ''} {body or ''}".casefold())
+    return tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+
+class CategoryClassifier:
+    """Nearest-centroid classifier over hashed TF-IDF word unigrams and bigrams.
+
+    predict() returns the closest category and a softmax confidence over the cosine
+    similarities to every centroid; the softmax temperature is fitted on leave-one-out
+    similarities at training time.
+    """
+
+    def __init__(self, labels, centroids, idf, temperature):
+        self.labels = [Category(label) for label in labels]
+        self.centroids = centroids
+        self.idf = idf
+        self.temperature = temperature
+        self.n_features = len(idf)
+
+    def _hash(self, features):
+        return np.array([zlib.crc32(feature.encode("utf-8")) % self.n_features for feature in features], dtype=np.int64)
+
+    def vectorize(self, subject, body):
+        """Return (indices, values) of the L2-normalised sparse TF-IDF vector."""
+        buckets = self._hash(_features(subject, body))
+        if len(buckets) == 0:
+            return buckets, np.empty(0, dtype=np.float32)
+        indices, counts = np.unique(buckets, return_counts=True)
+        values = (1.0 + np.log(counts)) * self.idf[indices]
+        norm = np.linalg.norm(values)
+        return indices, (values / norm if norm > 0 else values).astype(np.float32)
+
+    def similarities(self, subject, body):
+        indices, values = self.vectorize(subject, body)
+        return self.centroids[:, indices] @ values
+
+    def _probabilities(self, similarities, temperature):
+        logits = similarities / temperature
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def predict(self, subject, body):
+        """Return (Category, confidence); confidence is 0.0 for an empty email."""
+        similarities = self.similarities(subject, body)
+        if not np.any(similarities):
+            return Category.UNKNOWN, 0.0
+        probabilities = self._probabilities(similarities, self.temperature)
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+    @classmethod
+    def train(cls, examples, n_features=2 ** 16):
+        """Fit from (subject, body, category) triples."""
+        examples = [(subject, body, Category(str(category).strip().lower())) for subject, body, category in examples]
+        labels = sorted({category.value for _, _, category in examples})
+        if len(labels) < 2:
+            raise ValueError("Training data needs at least two categories")
+
+        classifier = cls(labels, None, np.ones(n_features, dtype=np.float32), 1.0)
+        document_frequency = np.zeros(n_features, dtype=np.float64)
+        for subject, body, _ in examples:
+            document_frequency[np.unique(classifier._hash(_features(subject, body)))] += 1
+        classifier.idf = (np.log((1 + len(examples)) / (1 + document_frequency)) + 1.0).astype(np.float32)
+
+        vectors = [classifier.vectorize(subject, body) for subject, body, _ in examples]
+        targets = np.array([labels.index(category.value) for _, _, category in examples])
+        sums = np.zeros((len(labels), n_features), dtype=np.float64)
+        for (indices, values), target in zip(vectors, targets):
+            sums[target, indices] += values
+        sum_norms = np.linalg.norm(sums, axis=1)
+
+        # Leave-one-out similarities: each email is scored against centroids built without it,
+        # so the fitted temperature reflects unseen emails rather than the training set
+        held_out = np.zeros((len(examples), len(labels)), dtype=np.float64)
+        for row, ((indices, values), target) in enumerate(zip(vectors, targets)):
+            dots = sums[:, indices] @ values
+            norms = sum_norms.copy()
+            self_dot = float(values @ values)
+            dots[target] -= self_dot
+            norms[target] = np.sqrt(max(sum_norms[target] ** 2 - 2 * (dots[target] + self_dot) + self_dot, 0.0))
+            norms[norms == 0] = 1.0
+            held_out[row] = dots / norms
+
+        losses = [
+            -np.mean(np.log(classifier._probabilities(held_out, temperature)[np.arange(len(targets)), targets] + 1e-12))
+            for temperature in _TEMPERATURES
+        ]
+        classifier.temperature = float(_TEMPERATURES[int(np.argmin(losses))])
+        classifier.centroids = (sums / np.where(sum_norms == 0, 1.0, sum_norms)[:, None]).astype(np.float32)
+        accuracy = float(np.mean(np.argmax(held_out, axis=1) == targets))
+        logger.info(
+            f"Category classifier trained on {len(examples)} emails, {len(labels)} categories, "
+            f"leave-one-out accuracy {accuracy:.3f}, temperature {classifier.temperature:.4f}"
+        )
+        return classifier
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            labels=np.array([label.value for label in self.labels]),
+            centroids=self.centroids,
+            idf=self.idf,
+            temperature=np.array(self.temperature)
+        )
+        logger.info(f"Category classifier saved to {path}")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            return cls(
+                saved["labels"].tolist(), saved["centroids"], saved["idf"], float(saved["temperature"])
+            )
+
+def load_labelled_examples(path):
+    """Read (subject, body, category) triples from a CSV or JSONL file of labelled runs."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    return [
+        (row.get("subject", ""), row.get("message", row.get("body", "")), row["category"])
+        for row in rows
+        if row.get("category")
+    ]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
+    parser = argparse.ArgumentParser(description="Train the local email category classifier")
+    parser.add_argument("input", help="CSV or JSONL with subject, message (or body) and category columns")
+    parser.add_argument("--output", default="category_classifier.npz")
+    parser.add_argument("--features", type=int, default=2 ** 16, help="Number of hashed feature buckets")
+    args = parser.parse_args()
+
+    training_examples = load_labelled_examples(args.input)
+    logger.info(f"Loaded {len(training_examples)} labelled emails from {args.input}")
+    CategoryClassifier.train(training_examples, n_features=args.features).save(args.output)
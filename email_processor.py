@@ -3,7 +3,6 @@ import logging
 import os
 
 import numpy as np
-import openai
 from dotenv import load_dotenv
 from pydantic import ValidationError
 
@@ -13,10 +12,65 @@ from global_state import (Category, CustomerMessage, OrderStatus, Product,
 
 logger = logging.getLogger(__name__)
 
+_FUSED_PRODUCT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "product_name": {"type": "string"},
+        "product_description": {"type": "string"},
+        "quantity": {"type": "integer"},
+        "product_id": {"type": "string"}
+    },
+    "required": ["product_name", "product_description", "quantity", "product_id"],
+    "additionalProperties": False
+}
+
+FUSED_EXTRACTION_SCHEMA = {
+    "name": "customer_email_extraction",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "category": {"type": "string", "enum": [category.value for category in Category]},
+            "first_name": {"type": "string"},
+            "last_name": {"type": "string"},
+            "title": {"type": "string"},
+            "occasion": {"type": "string"},
+            "questions": {"type": "array", "items": {"type": "string"}},
+            "products_purchase": {"type": "array", "items": _FUSED_PRODUCT_SCHEMA},
+            "products_inquiry": {"type": "array", "items": _FUSED_PRODUCT_SCHEMA}
+        },
+        "required": [
+            "category", "first_name", "last_name", "title", "occasion",
+            "questions", "products_purchase", "products_inquiry"
+        ],
+        "additionalProperties": False
+    }
+}
+
+FUSED_EXTRACTION_PROMPT = (
+    "Read the customer email below and extract every field of the response schema in one pass.\n"
+    "category: one of order (wants to buy), inquiry (asks about products), order_inquiry (both), "
+    "complaint, status (asks about an existing order) or unknown.\n"
+    "first_name, last_name, title: the sender's name and salutation, or \"none\" when not given.\n"
+    "occasion: the reason or event the customer mentions, or an empty string.\n"
+    "questions: each distinct question the customer asks, as a list of strings.\n"
+    "products_purchase: products the customer wants to buy; products_inquiry: products the customer asks about. "
+    "Use the catalog product_id when quoted (e.g. LTH0976), otherwise \"none\"; use quantity 0 when no quantity is given.\n\n"
+    "Subject: {subject}\n"
+    "Email: {email}"
+)
+
+SUMMARIZE_EMAIL_PROMPT = (
+    "Condense the customer email below to at most {max_words} words for an order-processing assistant.\n"
+    "Keep verbatim: every product name, product ID, quantity, question, date and occasion, and the sender's "
+    "name and salutation. Drop pleasantries, repetition and unrelated anecdotes. Return only the condensed email.\n\n"
+    "Email: {email}"
+)
+
 class EmailProcessor:
-    def __init__(self, api_key, prompts, db_handler):
+    def __init__(self, api_key, prompts, db_handler, llm_client):
         load_dotenv()
-        openai.api_key = api_key
+        self.llm_client = llm_client
         self.embeddings = None
         self.vector_store = None
         self.db_handler = db_handler
@@ -31,13 +85,9 @@ class EmailProcessor:
             return obj.get(key, default)
         return default
 
-    def embed_email_content(self, content):
+    async def embed_email_content(self, content):
         try:
-            response = openai.embeddings.create(
-                input=content,
-                model=os.getenv('OPEN_AI_EMBEDDING_MODEL'),
-            )
-            embedding = response.data[0].embedding
+            embedding = await self.llm_client.embed(content)
             norm = np.linalg.norm(embedding)
             logger.debug(f"Email embedding norm: {norm}")
             return embedding
@@ -45,7 +95,7 @@ class EmailProcessor:
             logger.error(f"Error embedding email content: {e}")
             return None
 
-    def verify_email_extraction(self, state: State) -> dict:
+    async def verify_email_extraction(self, state: State) -> dict:
         try:
             system_prompt_doc = self.prompts.get("extract_system_verification")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -86,18 +136,10 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{message}", body).replace("{extracted_info}", json.dumps(extracted_info))
             
-            response = openai.chat.completions.create(
-                model=os.getenv('OPEN_AI_CHAT_MODEL'),
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.0,
-            )
+            content = await self.llm_client.chat(system_prompt, user_prompt)
             
-            logger.info(f"OpenAI API response: {response.choices[0].message.content}")
-            verification_data = json.loads(response.choices[0].message.content.strip())
+            logger.info(f"OpenAI API response: {content}")
+            verification_data = json.loads(content)
             
             try:
                 validated_data = VerificationResult(**verification_data)
@@ -138,7 +180,7 @@ class EmailProcessor:
                 occasion=False
             )}
 
-    def extract_category(self, state):
+    async def extract_category(self, state):
         try:
             system_prompt_doc = self.prompts.get("extract_system_info")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -160,7 +202,7 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body)
             
-            extracted_data = self._call_openai(system_prompt, user_prompt)
+            extracted_data = await self._call_openai(system_prompt, user_prompt, prompt_name="extract_category")
             if extracted_data and "category" in extracted_data:
                 try:
                     updated_message = customer_message.model_copy(update={"category": Category(extracted_data["category"])})
@@ -177,7 +219,7 @@ class EmailProcessor:
             logger.error(f"Unexpected error in extract_category: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
 
-    def extract_name_title(self, state):
+    async def extract_name_title(self, state):
         try:
             system_prompt_doc = self.prompts.get("extract_system_info")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -199,7 +241,7 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body)
             
-            extracted_data = self._call_openai(system_prompt, user_prompt)
+            extracted_data = await self._call_openai(system_prompt, user_prompt, prompt_name="extract_name_title")
             if extracted_data and all(key in extracted_data for key in ["first_name", "last_name", "title"]):
                 try:
                     updated_message = customer_message.model_copy(update={
@@ -220,7 +262,7 @@ class EmailProcessor:
             logger.error(f"Unexpected error in extract_name_title: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
         
-    def extract_questions(self, state):
+    async def extract_questions(self, state):
         try:
             system_prompt_doc = self.prompts.get("extract_system_info")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -242,7 +284,7 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body)
             
-            extracted_data = self._call_openai(system_prompt, user_prompt)
+            extracted_data = await self._call_openai(system_prompt, user_prompt, prompt_name="extract_questions")
             questions = []
             if extracted_data:
                 if isinstance(extracted_data, list) and all(isinstance(item, str) for item in extracted_data):
@@ -265,10 +307,10 @@ class EmailProcessor:
             logger.error(f"Unexpected error in extract_questions: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
         
-    def extract_language(self, state):
+    async def extract_language(self, state):
         pass
 
-    def extract_reason(self, state):
+    async def extract_reason(self, state):
         try:
             system_prompt_doc = self.prompts.get("extract_system_info")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -290,7 +332,7 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body)
             
-            extracted_data = self._call_openai(system_prompt, user_prompt)
+            extracted_data = await self._call_openai(system_prompt, user_prompt, prompt_name="extract_reason")
             if extracted_data and "occasion" in extracted_data:
                 try:
                     updated_message = customer_message.model_copy(update={"occasion": extracted_data["occasion"]})
@@ -307,7 +349,7 @@ class EmailProcessor:
             logger.error(f"Unexpected error in extract_reason: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
 
-    def extract_orders(self, state):
+    async def extract_orders(self, state):
         try:
             system_prompt_doc = self.prompts.get("extract_system_info")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -329,7 +371,7 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body)
             
-            extracted_data = self._call_openai(system_prompt, user_prompt)
+            extracted_data = await self._call_openai(system_prompt, user_prompt, prompt_name="extract_orders")
             products = []
             if extracted_data:
                 if isinstance(extracted_data, list):
@@ -347,24 +389,7 @@ class EmailProcessor:
                     logger.error("Invalid or missing products_purchase in OpenAI response")
                     return {"customer_message": customer_message}
                 
-                for item in product_list:
-                    if not isinstance(item, dict):
-                        logger.error(f"Invalid product purchase item: {item}")
-                        continue
-                    item_with_defaults = {
-                        "product_name": item.get("product_name", ""),
-                        "product_description": item.get("product_description", ""),
-                        "quantity": item.get("quantity", 0),
-                        "product_id": item.get("product_id", ""),
-                        "filled": item.get("filled", 0),
-                        "unfilled": item.get("unfilled", 0),
-                        "order_status": item.get("order_status", OrderStatus.NONE)
-                    }
-                    try:
-                        products.append(Product(**item_with_defaults))
-                    except ValidationError as e:
-                        logger.error(f"Validation error for product {item}: {e}")
-                        continue
+                products.extend(self._build_products(product_list, "purchase"))
             
             updated_message = customer_message.model_copy(update={"products_purchase": products})
             logger.info(f"products content: {[product.dict() for product in products]}")
@@ -376,7 +401,7 @@ class EmailProcessor:
             logger.error(f"Unexpected error in extract_orders: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
 
-    def extract_inquiries(self, state):
+    async def extract_inquiries(self, state):
         try:
             system_prompt_doc = self.prompts.get("extract_system_info")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -398,7 +423,7 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body)
             
-            extracted_data = self._call_openai(system_prompt, user_prompt)
+            extracted_data = await self._call_openai(system_prompt, user_prompt, prompt_name="extract_inquiries")
             products = []
             if extracted_data:
                 if isinstance(extracted_data, list):
@@ -409,24 +434,7 @@ class EmailProcessor:
                     logger.error("Invalid or missing products_inquiry in OpenAI response")
                     return {"customer_message": customer_message}
                 
-                for item in product_list:
-                    if not isinstance(item, dict):
-                        logger.error(f"Invalid product inquiry item: {item}")
-                        continue
-                    item_with_defaults = {
-                        "product_name": item.get("product_name", ""),
-                        "product_description": item.get("product_description", ""),
-                        "quantity": item.get("quantity", 0),
-                        "product_id": item.get("product_id", ""),
-                        "filled": item.get("filled", 0),
-                        "unfilled": item.get("unfilled", 0),
-                        "order_status": item.get("order_status", OrderStatus.NONE)
-                    }
-                    try:
-                        products.append(Product(**item_with_defaults))
-                    except ValidationError as e:
-                        logger.error(f"Validation error for product {item}: {e}")
-                        continue
+                products.extend(self._build_products(product_list, "inquiry"))
             
             updated_message = customer_message.model_copy(update={"products_inquiry": products})
             
@@ -440,7 +448,7 @@ class EmailProcessor:
             logger.error(f"Unexpected error in extract_inquiries: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
 
-    def extract_purchase_and_inquiry(self, state):
+    async def extract_purchase_and_inquiry(self, state):
         try:
             system_prompt_doc = self.prompts.get("extract_system_info")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -462,7 +470,7 @@ class EmailProcessor:
             
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body)
             
-            extracted_data = self._call_openai(system_prompt, user_prompt)
+            extracted_data = await self._call_openai(system_prompt, user_prompt, prompt_name="extract_purchase_and_inquiry")
             purchase_products = []
             inquiry_products = []
             if extracted_data:
@@ -476,43 +484,9 @@ class EmailProcessor:
                     logger.error("Invalid or missing products_purchase/products_inquiry in OpenAI response")
                     return {"customer_message": customer_message}
                 
-                for item in purchase_list:
-                    if not isinstance(item, dict):
-                        logger.error(f"Invalid product purchase item: {item}")
-                        continue
-                    item_with_defaults = {
-                        "product_name": item.get("product_name", ""),
-                        "product_description": item.get("product_description", ""),
-                        "quantity": item.get("quantity", 0),
-                        "product_id": item.get("product_id", ""),
-                        "filled": item.get("filled", 0),
-                        "unfilled": item.get("unfilled", 0),
-                        "order_status": item.get("order_status", OrderStatus.NONE)
-                    }
-                    try:
-                        purchase_products.append(Product(**item_with_defaults))
-                    except ValidationError as e:
-                        logger.error(f"Validation error for product purchase {item}: {e}")
-                        continue
+                purchase_products.extend(self._build_products(purchase_list, "purchase"))
                 
-                for item in inquiry_list:
-                    if not isinstance(item, dict):
-                        logger.error(f"Invalid product inquiry item: {item}")
-                        continue
-                    item_with_defaults = {
-                        "product_name": item.get("product_name", ""),
-                        "product_description": item.get("product_description", ""),
-                        "quantity": item.get("quantity", 0),
-                        "product_id": item.get("product_id", ""),
-                        "filled": item.get("filled", 0),
-                        "unfilled": item.get("unfilled", 0),
-                        "order_status": item.get("order_status", OrderStatus.NONE)
-                    }
-                    try:
-                        inquiry_products.append(Product(**item_with_defaults))
-                    except ValidationError as e:
-                        logger.error(f"Validation error for product inquiry {item}: {e}")
-                        continue
+                inquiry_products.extend(self._build_products(inquiry_list, "inquiry"))
             
             updated_message = customer_message.model_copy(update={
                 "products_purchase": purchase_products,
@@ -525,18 +499,126 @@ class EmailProcessor:
             logger.error(f"Unexpected error in extract_purchase_and_inquiry: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
 
-    def _call_openai(self, system_prompt, user_prompt):
+    async def extract_fused(self, state):
+        """Extract category, name/title, occasion, questions and products in a single structured call."""
         try:
-            response = openai.chat.completions.create(
-                model=os.getenv('OPEN_AI_CHAT_MODEL'),
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.0,
+            system_prompt_doc = self.prompts.get("extract_system_info")
+            if not system_prompt_doc or system_prompt_doc.get("role") != "system":
+                logger.error("Prompt 'extract_system_info' with role 'system' not found")
+                return {"customer_message": state.get("customer_message", CustomerMessage())}
+
+            user_prompt_doc = self.prompts.get("extract_fused")
+            if user_prompt_doc and user_prompt_doc.get("role") == "user":
+                user_prompt_template = user_prompt_doc["content"]
+            else:
+                logger.debug("Prompt 'extract_fused' not found, using built-in fused extraction prompt")
+                user_prompt_template = FUSED_EXTRACTION_PROMPT
+
+            system_prompt = system_prompt_doc["content"]
+            customer_message = state.get("customer_message", CustomerMessage())
+            subject = self.safe_get(customer_message, "subject", "")
+            body = self.safe_get(customer_message, "body", "")
+            
+            if body == "":
+                return {"customer_message": customer_message}
+            
+            user_prompt = user_prompt_template.replace("{subject}", subject).replace("{email}", body)
+            
+            extracted_data = await self._call_openai(
+                system_prompt, user_prompt, max_tokens=1000,
+                response_format={"type": "json_schema", "json_schema": FUSED_EXTRACTION_SCHEMA},
+                prompt_name="extract_fused"
             )
-            return json.loads(response.choices[0].message.content.strip())
+            if not isinstance(extracted_data, dict):
+                logger.error("Invalid or missing fused extraction data in OpenAI response")
+                return {"customer_message": customer_message}
+
+            updates = {}
+            try:
+                updates["category"] = Category(extracted_data.get("category"))
+            except ValueError as e:
+                logger.error(f"Invalid category value in fused extraction: {e}")
+                return {"customer_message": customer_message}
+
+            if all(key in extracted_data for key in ["first_name", "last_name", "title"]):
+                updates.update({
+                    "first_name": extracted_data["first_name"],
+                    "last_name": extracted_data["last_name"],
+                    "title": extracted_data["title"]
+                })
+            if "occasion" in extracted_data:
+                updates["occasion"] = extracted_data["occasion"]
+            questions = extracted_data.get("questions")
+            if isinstance(questions, list) and all(isinstance(item, str) for item in questions):
+                updates["questions"] = questions
+
+            # Keep only the product lists the per-category extractor would have produced
+            category = updates["category"]
+            purchase_list = extracted_data.get("products_purchase") or []
+            inquiry_list = extracted_data.get("products_inquiry") or []
+            if category in (Category.ORDER, Category.ORDER_INQUIRY):
+                updates["products_purchase"] = self._build_products(purchase_list, "purchase")
+            if category in (Category.INQUIRY, Category.ORDER_INQUIRY):
+                updates["products_inquiry"] = self._build_products(inquiry_list, "inquiry")
+
+            try:
+                updated_message = customer_message.model_copy(update=updates)
+                logger.info(f"Fused extraction completed with fields: {list(updates.keys())}")
+                return {"customer_message": updated_message}
+            except ValidationError as e:
+                logger.error(f"Validation error in fused extraction: {e}")
+                return {"customer_message": customer_message}
+
+        except Exception as e:
+            logger.error(f"Unexpected error in extract_fused: {e}")
+            return {"customer_message": state.get("customer_message", CustomerMessage())}
+
+    async def summarize_body(self, body, max_tokens):
+        """Condense an over-long email body to roughly max_tokens; returns None on failure."""
+        system_prompt_doc = self.prompts.get("extract_system_info")
+        if not system_prompt_doc or system_prompt_doc.get("role") != "system":
+            logger.error("Prompt 'extract_system_info' with role 'system' not found")
+            return None
+        user_prompt_doc = self.prompts.get("summarize_email")
+        if user_prompt_doc and user_prompt_doc.get("role") == "user":
+            user_prompt_template = user_prompt_doc["content"]
+        else:
+            user_prompt_template = SUMMARIZE_EMAIL_PROMPT
+        # Roughly three words per four tokens
+        user_prompt = user_prompt_template.replace("{max_words}", str(max_tokens * 3 // 4)).replace("{email}", body)
+        try:
+            return await self.llm_client.chat(
+                system_prompt_doc["content"], user_prompt, max_tokens=max_tokens, temperature=0.0, prompt_name="summarize_email"
+            )
+        except Exception as e:
+            logger.error(f"Error calling OpenAI API: {e}")
+            return None
+
+    def _build_products(self, product_list, kind):
+        products = []
+        for item in product_list:
+            if not isinstance(item, dict):
+                logger.error(f"Invalid product {kind} item: {item}")
+                continue
+            item_with_defaults = {
+                "product_name": item.get("product_name", ""),
+                "product_description": item.get("product_description", ""),
+                "quantity": item.get("quantity", 0),
+                "product_id": item.get("product_id", ""),
+                "filled": item.get("filled", 0),
+                "unfilled": item.get("unfilled", 0),
+                "order_status": item.get("order_status", OrderStatus.NONE)
+            }
+            try:
+                products.append(Product(**item_with_defaults))
+            except ValidationError as e:
+                logger.error(f"Validation error for product {kind} {item}: {e}")
+                continue
+        return products
+
+    async def _call_openai(self, system_prompt, user_prompt, max_tokens=500, response_format=None, prompt_name=None):
+        try:
+            return await self.llm_client.chat_json(system_prompt, user_prompt, max_tokens=max_tokens, temperature=0.0, response_format=response_format, prompt_name=prompt_name)
         except json.JSONDecodeError as e:
             logger.error(f"Error parsing OpenAI response: {e}")
             return None
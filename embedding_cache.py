@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text):
+    return " ".join(str(text).split()).casefold()
+
+class EmbeddingCache:
+    def __init__(self, path=None, max_entries=10000, max_disk_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+                )
+                self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+                self.conn.commit()
+
+    @staticmethod
+    def make_key(model, normalized_text):
+        return hashlib.sha256(f"{model}\0{normalized_text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model, normalized_texts):
+        """Return a list aligned with normalized_texts holding cached float32 vectors or None."""
+        keys = [self.make_key(model, text) for text in normalized_texts]
+        vectors = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for position, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    vectors[position] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(position)
+
+        if missing and self.conn is not None:
+            found = self._load_from_disk([keys[position] for position in missing])
+            still_missing = []
+            for position in missing:
+                vector = found.get(keys[position])
+                if vector is not None:
+                    vectors[position] = vector
+                    self.disk_hits += 1
+                else:
+                    still_missing.append(position)
+            missing = still_missing
+
+        self.misses += len(missing)
+        return vectors
+
+    def put_many(self, model, normalized_texts, embeddings):
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, embedding in zip(normalized_texts, embeddings):
+                key = self.make_key(model, text)
+                vector = self._freeze(embedding)
+                self._store(key, vector)
+                rows.append((key, model, vector.tobytes(), now))
+        if self.conn is not None and rows:
+            try:
+                with self._lock:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) VALUES (?, ?, ?, ?)", rows
+                    )
+                    self._evict_disk()
+                    self.conn.commit()
+            except Exception as e:
+                logger.error(f"Error persisting embeddings to {self.path}: {e}")
+
+    def _load_from_disk(self, keys):
+        found = {}
+        now = time.time()
+        try:
+            with self._lock:
+                placeholders = ",".join("?" for _ in keys)
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys
+                ).fetchall()
+                for key, blob in rows:
+                    vector = self._freeze(np.frombuffer(blob, dtype=np.float32))
+                    self._store(key, vector)
+                    found[key] = vector
+                if rows:
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key, _ in rows]
+                    )
+                    self.conn.commit()
+        except Exception as e:
+            logger.error(f"Error reading embeddings from {self.path}: {e}")
+        return found
+
+    def _evict_disk(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,)
+            )
+
+    def _store(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _freeze(embedding):
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False
+        return vector
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "path": self.path,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+    def reopen(self):
+        """Open a fresh connection, e.g. in a forked worker that must not share the parent's."""
+        self._lock = threading.Lock()
+        if self.path:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
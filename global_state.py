@@ -39,6 +39,9 @@ class CustomerMessage(BaseModel):
     products_recommendations: List[Product] = Field(default_factory=list)
     questions: List[str] = Field(default_factory=list)
     category: Category = Category.UNKNOWN
+    category_source: str = ""
+    products_source: str = ""
+    seeded_product_ids: List[str] = Field(default_factory=list)
     history: List[str] = Field(default_factory=list)
     formatted_summary: str = ""
     order_details: Dict = Field(default_factory=dict)
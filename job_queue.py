@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class Job:
+    __slots__ = ("id", "request", "status", "submitted_at", "started_at", "finished_at", "result", "error")
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+class JobQueue:
+    """In-process job queue drained by a fixed pool of asyncio workers.
+
+    Finished jobs are kept for result_ttl_seconds (and at most max_jobs in total)
+    so clients can poll for their results.
+    """
+
+    def __init__(self, handler, workers=4, max_queue_size=1000, result_ttl_seconds=3600, max_jobs=10000):
+        self.handler = handler
+        self.n_workers = workers
+        self.max_queue_size = max_queue_size
+        self.result_ttl_seconds = result_ttl_seconds
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.queue = None
+        self.workers = []
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.counters = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0}
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.started_at = time.monotonic()
+        self.workers = [asyncio.create_task(self._work(number)) for number in range(self.n_workers)]
+        logger.info(f"Job queue started with {self.n_workers} workers")
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def submit(self, request):
+        """Enqueue a request and return its Job; raises asyncio.QueueFull when the queue is at capacity."""
+        self._prune()
+        job = Job(request)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise
+        self.jobs[job.id] = job
+        self.counters["submitted"] += 1
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def _work(self, number):
+        while True:
+            job = await self.queue.get()
+            self.busy += 1
+            job.status = "running"
+            job.started_at = time.time()
+            started = time.monotonic()
+            try:
+                job.result = await self.handler(job.request)
+                job.status = "succeeded"
+                self.counters["succeeded"] += 1
+            except Exception as e:
+                logger.error(f"Job {job.id} failed in worker {number}: {e}")
+                job.error = str(e)
+                job.status = "failed"
+                self.counters["failed"] += 1
+            finally:
+                job.finished_at = time.time()
+                job.request = None
+                self.busy -= 1
+                self.busy_seconds += time.monotonic() - started
+                self.queue.task_done()
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+        while len(self.jobs) >= self.max_jobs:
+            oldest_finished = next((job_id for job_id, job in self.jobs.items() if job.finished_at), None)
+            if oldest_finished is None:
+                break
+            del self.jobs[oldest_finished]
+
+    def stats(self):
+        uptime = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            **self.counters,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "max_queue_size": self.max_queue_size,
+            "workers": self.n_workers,
+            "busy_workers": self.busy,
+            "utilisation": self.busy / self.n_workers if self.n_workers else 0.0,
+            "average_utilisation": self.busy_seconds / (uptime * self.n_workers) if uptime and self.n_workers else 0.0,
+            "tracked_jobs": len(self.jobs)
+        }
@@ -0,0 +1,110 @@
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+def _trigrams(text):
+    padded = f"  {normalize_text(text)} "
+    return Counter(padded[position:position + 3] for position in range(len(padded) - 2))
+
+def _tokens(text):
+    return Counter(_TOKEN.findall(normalize_text(text)))
+
+class _SparseIndex:
+    """TF-IDF weighted inverted index; query() returns the cosine score of every row."""
+
+    def __init__(self, documents):
+        self.n_rows = len(documents)
+        document_frequency = Counter(term for terms in documents for term in terms)
+        self.idf = {
+            term: math.log((1 + self.n_rows) / (1 + frequency)) + 1.0
+            for term, frequency in document_frequency.items()
+        }
+        postings = defaultdict(lambda: ([], []))
+        for row, terms in enumerate(documents):
+            weights = {term: count * self.idf[term] for term, count in terms.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for term, weight in weights.items():
+                rows, row_weights = postings[term]
+                rows.append(row)
+                row_weights.append(weight / norm)
+        self.postings = {
+            term: (np.array(rows, dtype=np.int64), np.array(row_weights, dtype=np.float32))
+            for term, (rows, row_weights) in postings.items()
+        }
+
+    def query(self, terms):
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        # Terms unseen in the catalog still count towards the query norm, so typos lower the score
+        weights = {term: count * self.idf.get(term, math.log(1 + self.n_rows) + 1.0) for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if norm == 0:
+            return scores
+        for term, weight in weights.items():
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1] * (weight / norm)
+        return scores
+
+class LexicalIndex:
+    """Scores catalog products against an extracted name/description without any model calls.
+
+    A product's score is the best of: character-trigram similarity between the query
+    name and the catalog name, the same between the query description and the catalog
+    name, and word-level similarity between the query description and the catalog
+    name plus description. Scores are cosines in [0, 1].
+    """
+
+    def __init__(self, catalog_store, threshold=0.75, margin=0.1):
+        self.catalog_store = catalog_store
+        self.threshold = threshold
+        self.margin = margin
+        self.product_ids = [record.product_id for record in catalog_store.records]
+        self.names = _SparseIndex([_trigrams(record.name) for record in catalog_store.records])
+        self.descriptions = _SparseIndex([
+            _tokens(f"{record.name} {record.description}") for record in catalog_store.records
+        ])
+        logger.info(f"Lexical index built for {len(self.product_ids)} products (threshold {threshold}, margin {margin})")
+
+    def scores(self, product_name="none", description=""):
+        scores = np.zeros(len(self.product_ids), dtype=np.float32)
+        if product_name and product_name.strip().lower() != "none":
+            scores = np.maximum(scores, self.names.query(_trigrams(product_name)))
+        if description and description.strip():
+            scores = np.maximum(scores, self.names.query(_trigrams(description)))
+            scores = np.maximum(scores, self.descriptions.query(_tokens(description)))
+        return np.minimum(scores, 1.0)
+
+    def search(self, product_name="none", description="", k=5, exclude_product_ids=None):
+        """Return up to k (product_id, score) candidates, best first."""
+        scores = self.scores(product_name, description)
+        if exclude_product_ids:
+            for product_id in exclude_product_ids:
+                row = self.catalog_store.row_of(product_id)
+                if row is not None:
+                    scores[row] = 0.0
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [(self.product_ids[row], float(scores[row])) for row in rows]
+
+    def best_match(self, product_name="none", description="", exclude_product_ids=None):
+        """Return the top product_id when it clears the threshold and beats the runner-up by the margin."""
+        candidates = self.search(product_name, description, k=2, exclude_product_ids=exclude_product_ids)
+        if not candidates or candidates[0][1] < self.threshold:
+            return None
+        if len(candidates) > 1 and candidates[0][1] - candidates[1][1] < self.margin:
+            logger.debug(f"Ambiguous lexical match for '{product_name}' / '{description}': {candidates}")
+            return None
+        logger.debug(f"Lexical match for '{product_name}' / '{description}': {candidates[0]}")
+        return candidates[0][0]
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+def prompts_fingerprint(prompts: dict) -> str:
+    """Hash the role and content of every loaded prompt document."""
+    payload = {
+        name: {"role": doc.get("role"), "content": doc.get("content")}
+        for name, doc in prompts.items()
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class SQLiteCacheTier:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, response TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self.conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def set(self, key, namespace, response, created_at):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, namespace, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, namespace, response, created_at)
+            )
+            self.conn.commit()
+
+    def purge(self, namespace, expired_before):
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM llm_cache WHERE namespace != ? OR created_at < ?", (namespace, expired_before)
+            )
+            self.conn.commit()
+        return cursor.rowcount
+
+    def reopen(self):
+        """Open a fresh connection, e.g. in a forked worker that must not share the parent's."""
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def close(self):
+        self.conn.close()
+
+class MongoCacheTier:
+    def __init__(self, db_handler, collection_name):
+        self.db_handler = db_handler
+        self.collection_name = collection_name
+
+    def get(self, key):
+        documents = self.db_handler.find_documents(self.collection_name, {"_id": key}, limit=1)
+        if not documents:
+            return None
+        return documents[0]["response"], documents[0]["created_at"]
+
+    def set(self, key, namespace, response, created_at):
+        self.db_handler.upsert_document(
+            self.collection_name,
+            {"_id": key},
+            {"_id": key, "namespace": namespace, "response": response, "created_at": created_at}
+        )
+
+    def purge(self, namespace, expired_before):
+        return self.db_handler.delete_documents(
+            self.collection_name,
+            {"$or": [{"namespace": {"$ne": namespace}}, {"created_at": {"$lt": expired_before}}]}
+        )
+
+    def close(self):
+        pass
+
+class LLMResponseCache:
+    def __init__(self, max_entries=1024, ttl_seconds=86400, persistent_tier=None, namespace=""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent_tier = persistent_tier
+        self.namespace = namespace
+        self._entries = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def make_key(self, request: dict) -> str:
+        payload = json.dumps({"namespace": self.namespace, "request": request}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def set_namespace(self, namespace):
+        """Switch to a new prompt fingerprint, dropping every in-memory entry produced under the old one.
+
+        Call this on the event loop, which owns the in-memory entries; returns True when the
+        namespace changed, after which purge_persistent() can clear the persistent tier off-loop.
+        """
+        if namespace == self.namespace:
+            return False
+        if self.namespace:
+            logger.info("Prompt documents changed, invalidating LLM response cache")
+            self.invalidations += 1
+        self.namespace = namespace
+        self._entries.clear()
+        return True
+
+    def purge_persistent(self):
+        """Delete persistent entries from other namespaces or past the TTL; safe to run in a thread."""
+        if self.persistent_tier is not None:
+            namespace = self.namespace
+            try:
+                removed = self.persistent_tier.purge(namespace, time.time() - self.ttl_seconds)
+                logger.info(f"Purged {removed} stale persistent LLM cache entries")
+            except Exception as e:
+                logger.error(f"Error purging persistent LLM cache: {e}")
+
+    async def get(self, key):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return value
+            del self._entries[key]
+
+        if self.persistent_tier is not None:
+            try:
+                row = await asyncio.to_thread(self.persistent_tier.get, key)
+            except Exception as e:
+                logger.error(f"Error reading persistent LLM cache: {e}")
+                row = None
+            if row is not None:
+                value, created_at = row
+                if created_at + self.ttl_seconds > now:
+                    self._store(key, value, created_at + self.ttl_seconds)
+                    self.persistent_hits += 1
+                    return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, value):
+        created_at = time.time()
+        self._store(key, value, created_at + self.ttl_seconds)
+        if self.persistent_tier is not None:
+            try:
+                await asyncio.to_thread(self.persistent_tier.set, key, self.namespace, value, created_at)
+            except Exception as e:
+                logger.error(f"Error writing persistent LLM cache: {e}")
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent_tier": type(self.persistent_tier).__name__ if self.persistent_tier else None,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.persistent_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "namespace": self.namespace
+        }
+
+    def reopen(self):
+        if isinstance(self.persistent_tier, SQLiteCacheTier):
+            self.persistent_tier.reopen()
+
+    def close(self):
+        if self.persistent_tier is not None:
+            self.persistent_tier.close()
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from embedding_cache import normalize_text
+from metrics import LLM_ERRORS, LLM_IN_FLIGHT, LLM_LATENCY
+from rate_limiter import status_code_of
+from token_accounting import estimate_tokens
+from tracing import SPAN_KIND_CLIENT, current_span, set_attributes, tracer
+
+logger = logging.getLogger(__name__)
+
+class StreamInterruptedError(Exception):
+    pass
+
+def _response_usage(result):
+    # Streamed chats come back as (content, usage)
+    if isinstance(result, tuple):
+        return result[1]
+    return getattr(result, "usage", None)
+
+class LLMClient:
+    def __init__(self, api_key, max_connections=None, max_keepalive_connections=None, timeout=None, cache=None, embedding_cache=None, rate_limiter=None, token_accountant=None):
+        load_dotenv()
+        self.api_key = api_key
+        self.cache = cache
+        self.embedding_cache = embedding_cache
+        self.rate_limiter = rate_limiter
+        self.token_accountant = token_accountant
+        self.chat_model = os.getenv('OPEN_AI_CHAT_MODEL')
+        self.embedding_model = os.getenv('OPEN_AI_EMBEDDING_MODEL')
+        self.max_connections = max_connections or int(os.getenv('LLM_MAX_CONNECTIONS', '100'))
+        self.max_keepalive_connections = max_keepalive_connections or int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '20'))
+        self.timeout = timeout or float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+        self.http_client = None
+        self.client = None
+        self._connect()
+
+    def _connect(self):
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=30.0
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=10.0)
+        )
+        # With a rate limiter, retries happen there (with backoff and a deadline) rather than in the SDK
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=self.http_client,
+            max_retries=0 if self.rate_limiter is not None else 2
+        )
+
+    def reconnect(self):
+        """Replace the HTTP connection pool, e.g. in a forked worker process."""
+        self._connect()
+
+    async def chat(self, system_prompt, user_prompt, max_tokens=500, temperature=0.0, response_format=None, on_token=None, prompt_name=None):
+        """Return the completion text; with on_token, stream it and pass each text delta to on_token as it arrives.
+
+        prompt_name labels the call in the token accounting and its trace span.
+        """
+        attributes = {"llm.model": self.chat_model, "llm.prompt_name": prompt_name or "", "llm.streamed": on_token is not None}
+        with tracer.span("llm.chat", SPAN_KIND_CLIENT, attributes):
+            try:
+                return await self._chat(system_prompt, user_prompt, max_tokens, temperature, response_format, on_token, prompt_name)
+            except Exception:
+                self._record_failure()
+                raise
+
+    async def _chat(self, system_prompt, user_prompt, max_tokens, temperature, response_format, on_token, prompt_name):
+        request = {
+            "model": self.chat_model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+        if response_format is not None:
+            request["response_format"] = response_format
+
+        # Only temperature 0 completions are deterministic enough to serve from cache
+        cache_key = None
+        if self.cache is not None and temperature == 0.0:
+            cache_key = self.cache.make_key(request)
+            cached = await self.cache.get(cache_key)
+            set_attributes({"llm.cache": "hit" if cached is not None else "miss"})
+            if cached is not None:
+                self._record_usage(prompt_name, request, None, cached, cached=True)
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+
+        if on_token is not None:
+            content, usage = await self._limited(request, lambda: self._stream_chat(request, on_token))
+            content = content.strip()
+        else:
+            response = await self._limited(request, lambda: self.client.chat.completions.create(**request))
+            content = response.choices[0].message.content.strip()
+            usage = response.usage
+        self._record_usage(prompt_name, request, usage, content)
+        if cache_key is not None:
+            await self.cache.set(cache_key, content)
+        return content
+
+    async def _limited(self, request, send):
+        operation = "chat" if "messages" in request else "embeddings"
+
+        async def timed_send():
+            span = current_span()
+            if span is not None:
+                span.attributes["llm.attempts"] = span.attributes.get("llm.attempts", 0) + 1
+            # Each attempt is timed separately, so retries show up as extra observations
+            with LLM_IN_FLIGHT.track_inprogress(operation=operation), LLM_LATENCY.time(operation=operation, model=request["model"]):
+                try:
+                    return await send()
+                except Exception as e:
+                    LLM_ERRORS.inc(operation=operation, model=request["model"], status=status_code_of(e) or type(e).__name__)
+                    raise
+
+        if self.rate_limiter is None:
+            return await timed_send()
+        if "messages" in request:
+            prompt_chars = sum(len(message["content"]) for message in request["messages"])
+            estimated_tokens = prompt_chars // 4 + request.get("max_tokens", 0)
+        else:
+            estimated_tokens = sum(len(text) for text in request["input"]) // 4
+        return await self.rate_limiter.call(
+            request["model"], estimated_tokens, timed_send,
+            actual_tokens=lambda response: getattr(_response_usage(response), "total_tokens", None)
+        )
+
+    def _record_failure(self):
+        if self.token_accountant is not None:
+            self.token_accountant.record_failure()
+
+    def _record_usage(self, prompt_name, request, usage, content, cached=False):
+        if self.token_accountant is None:
+            return
+        if cached:
+            prompt_tokens = completion_tokens = 0
+        elif usage is not None:
+            prompt_tokens = usage.prompt_tokens or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        else:
+            # No usage reported (e.g. a stream without a usage chunk): fall back to the estimate
+            prompt_tokens = sum(estimate_tokens(message["content"]) for message in request["messages"])
+            completion_tokens = estimate_tokens(content or "")
+        self.token_accountant.record(request["model"], prompt_name, prompt_tokens, completion_tokens, cached=cached)
+        set_attributes({"llm.prompt_tokens": prompt_tokens, "llm.completion_tokens": completion_tokens, "llm.usage_estimated": usage is None and not cached})
+
+    async def _stream_chat(self, request, on_token):
+        parts = []
+        usage = None
+        stream = await self.client.chat.completions.create(**request, stream=True, stream_options={"include_usage": True})
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_token(delta)
+        except Exception as e:
+            if parts:
+                # Tokens already reached the client, so a retry would repeat them
+                raise StreamInterruptedError(f"Stream interrupted after {len(parts)} chunks: {e}") from e
+            raise
+        return "".join(parts), usage
+
+    async def chat_json(self, system_prompt, user_prompt, max_tokens=500, temperature=0.0, response_format=None, prompt_name=None):
+        content = await self.chat(system_prompt, user_prompt, max_tokens, temperature, response_format, prompt_name=prompt_name)
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            self._record_failure()
+            raise
+
+    async def embed(self, text):
+        embeddings = await self.embed_many([text])
+        return embeddings[0]
+
+    async def embed_many(self, texts):
+        if not texts:
+            return []
+        with tracer.span("embed_many", attributes={"embedding.texts": len(texts)}):
+            return await self._embed_many(texts)
+
+    async def _embed_many(self, texts):
+        if self.embedding_cache is None:
+            return await self._create_embeddings(list(texts))
+
+        normalized_texts = [normalize_text(text) for text in texts]
+        embeddings = await asyncio.to_thread(self.embedding_cache.get_many, self.embedding_model, normalized_texts)
+        missing = sorted({text for text, embedding in zip(normalized_texts, embeddings) if embedding is None})
+        set_attributes({"embedding.cache_hits": sum(embedding is not None for embedding in embeddings)})
+        if missing:
+            created = await self._create_embeddings(missing)
+            await asyncio.to_thread(self.embedding_cache.put_many, self.embedding_model, missing, created)
+            created_by_text = dict(zip(missing, created))
+            embeddings = [
+                embedding if embedding is not None else created_by_text[text]
+                for text, embedding in zip(normalized_texts, embeddings)
+            ]
+        return embeddings
+
+    async def _create_embeddings(self, texts):
+        request = {"input": texts, "model": self.embedding_model}
+        with tracer.span("llm.embeddings", SPAN_KIND_CLIENT, {"llm.model": self.embedding_model, "embedding.inputs": len(texts)}):
+            try:
+                response = await self._limited(request, lambda: self.client.embeddings.create(**request))
+            except Exception:
+                self._record_failure()
+                raise
+            if response.usage is not None:
+                set_attributes({"llm.prompt_tokens": response.usage.prompt_tokens})
+                if self.token_accountant is not None:
+                    self.token_accountant.record(self.embedding_model, "embedding", response.usage.prompt_tokens, 0)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def aclose(self):
+        await self.client.close()
+        await self.http_client.aclose()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 import os
@@ -5,28 +6,27 @@ import os
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from openai import OpenAI
 
 from global_state import CustomerMessage, Product, State
 
 logger = logging.getLogger(__name__)
 
 class LocateProductByDescription:
-    def __init__(self, api_key, db_handler, product_catalog_df, catalog_embeddings):
+    def __init__(self, api_key, db_handler, product_catalog_df, catalog_embeddings, llm_client, catalog_store, lexical_index=None):
         load_dotenv()
         self.api_key = api_key
         self.db_handler = db_handler
         self.collection_products = os.getenv('MONGO_COLLECTION_PRODUCTS_NAME')
         self.product_catalog_df = product_catalog_df
         self.catalog_embeddings = catalog_embeddings
-        self.client = OpenAI(api_key=api_key)
+        self.llm_client = llm_client
+        self.catalog_store = catalog_store
+        self.lexical_index = lexical_index
+        self.tier_hits = {"preresolved": 0, "exact": 0, "lexical": 0, "embedding": 0, "miss": 0}
 
-    def embed_product_description(self, description):
+    async def embed_product_description(self, description):
         try:
-            response = self.client.embeddings.create(
-                input=description, model=os.getenv('OPEN_AI_EMBEDDING_MODEL')
-            )
-            embedding = response.data[0].embedding
+            embedding = await self.llm_client.embed(description)
             norm = np.linalg.norm(embedding)
             logger.debug(f"Query embedding norm: {norm}")
             return embedding
@@ -34,32 +34,106 @@ class LocateProductByDescription:
             logger.error(f"Error embedding product description: {e}")
             return None
 
-    def find_product_id_by_description(self, description, product_name="none", exclude_product_ids=None):
-        normalized_description = description.strip().lower()
+    def find_product_id_by_name(self, product_name="none", exclude_product_ids=None):
         normalized_product_name = product_name.strip().lower() if product_name else "none"
-
-        # First, try lookup by product_name if not "none"
         if normalized_product_name != "none":
-            matching_products = self.product_catalog_df[self.product_catalog_df['name'].str.lower() == normalized_product_name]
-            if not matching_products.empty:
-                product_id = matching_products.iloc[0]['product_id']
+            matching_product = self.catalog_store.find_by_name(normalized_product_name)
+            if matching_product is not None:
+                product_id = matching_product.product_id
                 logger.debug(f"Found product by name: {product_name}, product_id: {product_id}")
                 if exclude_product_ids is None or product_id not in exclude_product_ids:
                     return product_id
+        return None
+
+    def find_product_id_lexically(self, product_name="none", description="", exclude_product_ids=None):
+        if self.lexical_index is None:
+            return None
+        return self.lexical_index.best_match(product_name, description, exclude_product_ids)
+
+    def tier_stats(self):
+        total = sum(self.tier_hits.values())
+        return {
+            **self.tier_hits,
+            "total": total,
+            "hit_rates": {tier: hits / total if total else 0.0 for tier, hits in self.tier_hits.items()}
+        }
+
+    async def rank_products_by_descriptions(self, descriptions, k):
+        """Embed all descriptions in one request and rank in-stock catalog products for each in one search."""
+        normalized_descriptions = list(dict.fromkeys(description.strip().lower() for description in descriptions))
+        if not normalized_descriptions:
+            return {}
+        try:
+            embeddings = await self.llm_client.embed_many(normalized_descriptions)
+        except Exception as e:
+            logger.error(f"Error embedding {len(normalized_descriptions)} product descriptions: {e}")
+            return {}
+        results = await asyncio.to_thread(
+            self.db_handler.vector_search_many,
+            self.collection_products, embeddings, k=k
+        )
+        return {
+            description: product_ids
+            for description, (product_ids, _, _) in zip(normalized_descriptions, results)
+        }
+
+    async def resolve_product_id(self, product, existing_ids, ranked_candidates):
+        if product.product_id and product.product_id != "none":
+            self.tier_hits["preresolved"] += 1
+            return product.product_id
+        product_id = self.find_product_id_by_name(product.product_name, existing_ids)
+        if product_id:
+            self.tier_hits["exact"] += 1
+            return product_id
+        product_id = self.find_product_id_lexically(product.product_name, product.product_description, existing_ids)
+        if product_id:
+            self.tier_hits["lexical"] += 1
+            return product_id
+        ranked = ranked_candidates.get(product.product_description.strip().lower())
+        if ranked:
+            for candidate_id in ranked:
+                if candidate_id not in existing_ids:
+                    logger.debug(f"Found product by description: {product.product_description}, product_id: {candidate_id}")
+                    self.tier_hits["embedding"] += 1
+                    return candidate_id
+        # Not part of the batch (or every candidate was taken): resolve this item on its own
+        return await self.find_product_id_by_description(
+            description=product.product_description,
+            product_name=product.product_name,
+            exclude_product_ids=existing_ids
+        )
+
+    async def find_product_id_by_description(self, description, product_name="none", exclude_product_ids=None):
+        normalized_description = description.strip().lower()
 
-        # Fallback to cosine similarity if no match or product_name is "none"
-        embedding = self.embed_product_description(normalized_description)
+        # First, try lookup by product_name if not "none"
+        product_id = self.find_product_id_by_name(product_name, exclude_product_ids)
+        if product_id:
+            self.tier_hits["exact"] += 1
+            return product_id
+
+        # Then a fuzzy match on names and descriptions, which needs no model call
+        product_id = self.find_product_id_lexically(product_name, description, exclude_product_ids)
+        if product_id:
+            self.tier_hits["lexical"] += 1
+            return product_id
+
+        # Fallback to cosine similarity if no confident lexical match
+        embedding = await self.embed_product_description(normalized_description)
         if embedding is None:
             logger.error(f"Failed to generate embedding for description: {description}")
+            self.tier_hits["miss"] += 1
             return None
-        product_ids, _, _ = self.db_handler.vector_search(
+        product_ids, _, _ = await asyncio.to_thread(
+            self.db_handler.vector_search,
             self.collection_products, embedding, k=1, exclude_product_ids=exclude_product_ids
         )
         product_id = product_ids[0] if product_ids else None
+        self.tier_hits["embedding" if product_id else "miss"] += 1
         logger.debug(f"Found product by description: {description}, product_id: {product_id}")
         return product_id
 
-    def locate_product_ids(self, state: State) -> dict:
+    async def locate_product_ids(self, state: State) -> dict:
         try:
             customer_message = state.get("customer_message", CustomerMessage())
             
@@ -92,22 +166,29 @@ class LocateProductByDescription:
             
             existing_ids = {product.product_id for product in deduplicated_purchase + deduplicated_inquiry if product.product_id and product.product_id != "none"}
             
+            unresolved = [
+                product for product in deduplicated_purchase + deduplicated_inquiry
+                if not (product.product_id and product.product_id != "none")
+                and not self.find_product_id_by_name(product.product_name, existing_ids)
+                and not self.find_product_id_lexically(product.product_name, product.product_description, existing_ids)
+            ]
+            # Enough candidates per description that exclusions can never exhaust the list
+            ranked_candidates = await self.rank_products_by_descriptions(
+                [product.product_description for product in unresolved],
+                k=len(deduplicated_purchase) + len(deduplicated_inquiry) + len(existing_ids) + 1
+            ) if unresolved else {}
+            
             updated_products_purchase = []
             for product in deduplicated_purchase:
-                product_id = product.product_id if product.product_id and product.product_id != "none" else self.find_product_id_by_description(
-                    description=product.product_description,
-                    product_name=product.product_name,
-                    exclude_product_ids=existing_ids
-                )
+                product_id = await self.resolve_product_id(product, existing_ids, ranked_candidates)
                 if product_id:
-                    product_match = self.product_catalog_df[self.product_catalog_df['product_id'] == product_id]
-                    if not product_match.empty:
-                        product_data = product_match.iloc[0]
+                    product_data = self.catalog_store.get(product_id)
+                    if product_data is not None:
                         updated_dict = {
-                            "product_name": product_data['name'],
-                            "product_description": product_data['description'],
+                            "product_name": product_data.name,
+                            "product_description": product_data.description,
                             "product_id": product_id,
-                            "price": int(product_data.get('price', 0))
+                            "price": int(product_data.price)
                         }
                         if product.quantity > 0:
                             updated_dict["quantity"] = product.quantity
@@ -123,20 +204,15 @@ class LocateProductByDescription:
             
             updated_products_inquiry = []
             for product in deduplicated_inquiry:
-                product_id = product.product_id if product.product_id and product.product_id != "none" else self.find_product_id_by_description(
-                    description=product.product_description,
-                    product_name=product.product_name,
-                    exclude_product_ids=existing_ids
-                )
+                product_id = await self.resolve_product_id(product, existing_ids, ranked_candidates)
                 if product_id:
-                    product_match = self.product_catalog_df[self.product_catalog_df['product_id'] == product_id]
-                    if not product_match.empty:
-                        product_data = product_match.iloc[0]
+                    product_data = self.catalog_store.get(product_id)
+                    if product_data is not None:
                         updated_dict = {
-                            "product_name": product_data['name'],
-                            "product_description": product_data['description'],
+                            "product_name": product_data.name,
+                            "product_description": product_data.description,
                             "product_id": product_id,
-                            "price": int(product_data.get('price', 0))
+                            "price": int(product_data.price)
                         }
                         if product.quantity > 0:
                             updated_dict["quantity"] = product.quantity
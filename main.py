@@ -1,28 +1,55 @@
 import asyncio
+import functools
+import json
 import logging
 import os
 import sys
+import time
 import traceback
 import uuid
 
 import uvicorn
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, StateGraph
 
+from batch_io import parse_email_rows
+from catalog_store import CatalogStore
+from category_classifier import CategoryClassifier
 from email_processor import EmailProcessor
+from embedding_cache import EmbeddingCache
 from global_state import Category, CustomerMessage, State, VerificationResult
 from inventory_manager import InventoryManager
+from job_queue import JobQueue
+from lexical_index import LexicalIndex
+from llm_cache import (LLMResponseCache, MongoCacheTier, SQLiteCacheTier,
+                       prompts_fingerprint)
+from llm_client import LLMClient
 from locate_products import LocateProductByDescription
+from metrics import (EMAILS, EMAILS_IN_FLIGHT, FALLBACKS, HTTP_IN_FLIGHT,
+                     HTTP_LATENCY, LOG_RECORDS, NODE_ERRORS, NODE_LATENCY,
+                     REGISTRY, LogRecordCounter)
 from models import EmailRequest
 from mongodb_handler import MongoDBHandler
 from product_catalog import ProductCatalogProcessor
 from product_similarity import ProductSimilarity
+from rate_limiter import RateLimiter
 from response_generator import ResponseGenerator
+from result_store import ResultStore
+from single_flight import EventFeed, SingleFlight, content_key
+from sku_matcher import SkuMatcher
+from token_accounting import BodyBudget, TokenAccountant
+from tracing import (SPAN_KIND_SERVER, parse_traceparent, set_attributes,
+                     tracer)
 from utils import load_prompts
+from verification_policy import SKIP_RULES, VerificationPolicy
+from vector_index import LocalVectorIndex, NeighbourTable
 from verification_processor import VerificationProcessor
 
 logging.basicConfig(
@@ -33,6 +60,7 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
+logging.getLogger().addHandler(LogRecordCounter(LOG_RECORDS))
 
 logging.getLogger('email_processor').setLevel(logging.INFO)
 logging.getLogger('verification_processor').setLevel(logging.INFO) 
@@ -57,13 +85,53 @@ app.add_middleware(
     allow_headers=["*"],  
 )
 
+@app.middleware("http")
+async def observe_http_requests(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    parent = parse_traceparent(request.headers.get("traceparent"))
+    with HTTP_IN_FLIGHT.track_inprogress(), tracer.span(f"{request.method} {request.url.path}", SPAN_KIND_SERVER, parent=parent) as span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # The route template keeps job IDs and static file names out of the labels
+            route = request.scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route_path, status=status)
+            if span is not None:
+                span.name = f"{request.method} {route_path}"
+                span.set_attributes({"http.method": request.method, "http.route": route_path, "http.status_code": status})
+
 load_dotenv()
+tracer.configure_from_env(os.getenv)
 api_key = os.getenv('OPENAI_API_KEY')
 collection_products = os.getenv('MONGO_COLLECTION_PRODUCTS_NAME')
 collection_prompts = os.getenv('MONGO_COLLECTION_PROMPTS_NAME')
 uri = os.getenv("MONGODB_URI")
 db = os.getenv('MONGO_DB_NAME')
 db_handler = MongoDBHandler(uri, db)
+extractor_concurrency = int(os.getenv('EXTRACTOR_CONCURRENCY', '4'))
+extractor_timeout = float(os.getenv('EXTRACTOR_TIMEOUT_SECONDS', '30'))
+extraction_mode = os.getenv('EXTRACTION_MODE', 'standard').lower()
+sku_prepass_mode = os.getenv('SKU_PREPASS_MODE', 'seed').lower()
+bulk_concurrency = int(os.getenv('BULK_CONCURRENCY', '8'))
+result_store_backend = os.getenv('RESULT_STORE_BACKEND', 'mongo').lower()
+job_workers = int(os.getenv('JOB_WORKERS', '4'))
+job_queue_max_size = int(os.getenv('JOB_QUEUE_MAX_SIZE', '1000'))
+job_result_ttl = float(os.getenv('JOB_RESULT_TTL_SECONDS', '3600'))
+category_classifier_path = os.getenv('CATEGORY_CLASSIFIER_PATH', 'category_classifier.npz')
+category_classifier_threshold = float(os.getenv('CATEGORY_CLASSIFIER_THRESHOLD', '0.9'))
+category_labels_path = os.getenv('CATEGORY_LABELS_PATH', '')
+verify_skip_rules = [rule.strip() for rule in os.getenv('VERIFY_SKIP_RULES', ','.join(SKIP_RULES)).split(',') if rule.strip()]
+verify_sample_rate = float(os.getenv('VERIFY_SAMPLE_RATE', '0.05'))
+email_body_token_budget = int(os.getenv('EMAIL_BODY_TOKEN_BUDGET', '2000'))
+email_body_budget_mode = os.getenv('EMAIL_BODY_BUDGET_MODE', 'truncate').lower()
+verify_template_categories = [
+    Category(category.strip()) for category in os.getenv('VERIFY_TEMPLATE_CATEGORIES', 'complaint,status,unknown').split(',')
+    if category.strip()
+]
 
 try:
     prompts = load_prompts(db_handler, collection_prompts)
@@ -83,18 +151,210 @@ product_processor = ProductCatalogProcessor(api_key, db_handler)
 product_processor.process_catalog()
 processed_catalog_df = product_processor.get_product_catalog()
 catalog_embeddings = processed_catalog_df["embedding"].tolist()
-email_processor = EmailProcessor(api_key, prompts, db_handler)
-verification_processor = VerificationProcessor(api_key, prompts, db_handler)
-locate_products_processor = LocateProductByDescription(api_key, db_handler, processed_catalog_df, catalog_embeddings)
-inventory_processor = InventoryManager(processed_catalog_df)
-response_processor = ResponseGenerator(prompts, db_handler)
+db_handler.register_catalog(collection_products, processed_catalog_df)
+catalog_store = CatalogStore(processed_catalog_df)
+catalog_index = LocalVectorIndex(processed_catalog_df, catalog_embeddings, catalog_store)
+db_handler.register_vector_index(collection_products, catalog_index)
+neighbour_table = NeighbourTable.load_or_build(
+    catalog_index,
+    path=os.getenv('NEIGHBOUR_TABLE_PATH', 'catalog_neighbours.npz') or None,
+    n_neighbours=int(os.getenv('NEIGHBOUR_TABLE_SIZE', '20'))
+)
+llm_cache_backend = os.getenv('LLM_CACHE_BACKEND', 'memory').lower()
+if llm_cache_backend == "sqlite":
+    llm_cache_tier = SQLiteCacheTier(os.getenv('LLM_CACHE_SQLITE_PATH', 'llm_cache.sqlite3'))
+elif llm_cache_backend == "mongo":
+    llm_cache_tier = MongoCacheTier(db_handler, os.getenv('MONGO_COLLECTION_LLM_CACHE_NAME', 'llm_cache'))
+else:
+    llm_cache_tier = None
+llm_cache = None
+if llm_cache_backend != "none":
+    llm_cache = LLMResponseCache(
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '2048')),
+        ttl_seconds=float(os.getenv('LLM_CACHE_TTL_SECONDS', '86400')),
+        persistent_tier=llm_cache_tier
+    )
+    llm_cache.set_namespace(prompts_fingerprint(prompts))
+    llm_cache.purge_persistent()
+prompts_refresh_seconds = float(os.getenv('PROMPTS_REFRESH_SECONDS', '0'))
+embedding_cache = EmbeddingCache(
+    path=os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.sqlite3') or None,
+    max_entries=int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '10000')),
+    max_disk_entries=int(os.getenv('EMBEDDING_CACHE_MAX_DISK_ENTRIES', '200000'))
+)
+rate_limiter = RateLimiter.from_env(os.getenv) if os.getenv('LLM_RATE_LIMITER', 'on').lower() != "off" else None
+token_accountant = TokenAccountant.from_env(os.getenv)
+body_budget = BodyBudget(email_body_token_budget, email_body_budget_mode)
+llm_client = LLMClient(
+    api_key, cache=llm_cache, embedding_cache=embedding_cache, rate_limiter=rate_limiter, token_accountant=token_accountant
+)
+email_processor = EmailProcessor(api_key, prompts, db_handler, llm_client)
+verification_processor = VerificationProcessor(api_key, prompts, db_handler, llm_client)
+lexical_index = LexicalIndex(
+    catalog_store,
+    threshold=float(os.getenv('LEXICAL_MATCH_THRESHOLD', '0.75')),
+    margin=float(os.getenv('LEXICAL_MATCH_MARGIN', '0.1'))
+)
+locate_products_processor = LocateProductByDescription(
+    api_key, db_handler, processed_catalog_df, catalog_embeddings, llm_client, catalog_store, lexical_index
+)
+inventory_processor = InventoryManager(processed_catalog_df, catalog_store)
+response_processor = ResponseGenerator(prompts, db_handler, llm_client)
 product_similarity = ProductSimilarity(
-    processed_catalog_df, catalog_embeddings, api_key, prompts, db_handler
+    processed_catalog_df, catalog_embeddings, api_key, prompts, db_handler, llm_client, catalog_store, neighbour_table
+)
+sku_matcher = SkuMatcher(catalog_store, lexical_index) if sku_prepass_mode != "off" else None
+verification_policy = VerificationPolicy(
+    catalog_store, skip_rules=verify_skip_rules, sample_rate=verify_sample_rate, template_categories=verify_template_categories
 )
+category_classifier = None
+if category_classifier_path and os.path.exists(category_classifier_path):
+    try:
+        category_classifier = CategoryClassifier.load(category_classifier_path)
+        logger.info(f"Category classifier loaded from {category_classifier_path}")
+    except Exception as e:
+        logger.error(f"Failed to load category classifier from {category_classifier_path}: {e}")
+
+def reconnect_after_fork():
+    """Give a forked worker its own Mongo, HTTP and SQLite connections; the catalog and indexes stay shared."""
+    db_handler.reconnect()
+    llm_client.reconnect()
+    embedding_cache.reopen()
+    if llm_cache is not None:
+        llm_cache.reopen()
+    tracer.after_fork()
+
+async def refresh_prompts_periodically():
+    while True:
+        await asyncio.sleep(prompts_refresh_seconds)
+        try:
+            latest_prompts = await asyncio.to_thread(load_prompts, db_handler, collection_prompts)
+        except Exception as e:
+            logger.error(f"Failed to refresh prompts: {e}")
+            continue
+        fingerprint = prompts_fingerprint(latest_prompts)
+        if fingerprint != prompts_fingerprint(prompts):
+            logger.info("Prompt documents changed, reloading prompts")
+            # Processors share this dict, so updating it in place swaps prompts everywhere
+            prompts.clear()
+            prompts.update(latest_prompts)
+            if llm_cache is not None:
+                if llm_cache.set_namespace(fingerprint):
+                    await asyncio.to_thread(llm_cache.purge_persistent)
+
+@app.on_event("startup")
+async def start_prompt_refresh():
+    if prompts_refresh_seconds > 0:
+        app.state.prompt_refresh_task = asyncio.create_task(refresh_prompts_periodically())
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await llm_client.aclose()
+    if llm_cache is not None:
+        llm_cache.close()
+    embedding_cache.close()
+    tracer.shutdown()
+
+@app.get("/llm_cache/stats")
+async def llm_cache_stats():
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats()}
+
+@app.get("/rate_limiter/stats")
+async def rate_limiter_stats():
+    if rate_limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, "models": rate_limiter.stats()}
+
+@app.get("/token_usage/stats")
+async def token_usage_stats():
+    return {"body_token_budget": body_budget.max_tokens, "body_budget_mode": body_budget.mode, **token_accountant.stats()}
+
+@app.get("/tracing/stats")
+async def tracing_stats():
+    return tracer.stats()
+
+@app.get("/embedding_cache/stats")
+async def embedding_cache_stats():
+    return embedding_cache.stats()
+
+@app.get("/verification/stats")
+async def verification_stats():
+    return verification_policy.stats()
+
+@app.get("/locate_products/stats")
+async def locate_products_stats():
+    return locate_products_processor.tier_stats()
+
+def merge_extraction_results(customer_message: CustomerMessage, results: list) -> CustomerMessage:
+    merged_updates = {}
+    for result in results:
+        if not isinstance(result, dict) or "customer_message" not in result:
+            continue
+            
+        cm = result["customer_message"]
+        
+        if hasattr(cm, "products_purchase") and cm.products_purchase:
+            merged_updates["products_purchase"] = cm.products_purchase
+            logger.info(f"Updated products_purchase with {len(cm.products_purchase)} items")
+        
+        if hasattr(cm, "products_inquiry") and cm.products_inquiry:
+            merged_updates["products_inquiry"] = cm.products_inquiry
+            logger.info(f"Updated products_inquiry with {len(cm.products_inquiry)} items")
+        
+        if hasattr(cm, "questions") and cm.questions:
+            merged_updates["questions"] = cm.questions
+            logger.info(f"Updated questions with {len(cm.questions)} items")
+        
+        if hasattr(cm, "first_name") and cm.first_name and cm.first_name.lower() != 'none':
+            merged_updates.update({
+                "first_name": cm.first_name,
+                "last_name": getattr(cm, "last_name", ""),
+                "title": getattr(cm, "title", "")
+            })
+            logger.info(f"Updated name/title: {cm.first_name} {getattr(cm, 'last_name', '')}")
+        
+        if hasattr(cm, "occasion") and cm.occasion and cm.occasion.strip():
+            merged_updates["occasion"] = cm.occasion.strip()
+            logger.info(f"Updated occasion: {cm.occasion}")
+    
+    if merged_updates:
+        logger.info(f"Applying updates: {list(merged_updates.keys())}")
+        updated_message = customer_message.model_copy(update=merged_updates)
+    else:
+        logger.info("No updates to apply")
+        updated_message = customer_message
+    return updated_message
+
+def record_category_label(customer_message: CustomerMessage):
+    with open(category_labels_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "subject": customer_message.subject,
+            "message": customer_message.body,
+            "category": customer_message.category.value
+        }) + "\n")
+
+async def classify_category_node(state: State) -> dict:
+    customer_message = state.get("customer_message", CustomerMessage())
+    try:
+        category, confidence = category_classifier.predict(customer_message.subject, customer_message.body)
+        if confidence >= category_classifier_threshold:
+            logger.info(f"Local classifier assigned category '{category.value}' with confidence {confidence:.3f}")
+            return {
+                "customer_message": customer_message.model_copy(update={"category": category, "category_source": "local"}),
+                "verification_result": VerificationResult(category=True)
+            }
+        logger.info(f"Local classifier not confident ({category.value}, {confidence:.3f}), using the LLM")
+        FALLBACKS.inc(kind="category_llm")
+    except Exception as e:
+        logger.error(f"Error in classify_category_node: {e}")
+    return {"customer_message": customer_message}
 
 async def extract_category_node(state: State) -> dict:
     try:
-        result = email_processor.extract_category(state)
+        result = await email_processor.extract_category(state)
+        result["customer_message"] = result["customer_message"].model_copy(update={"category_source": "llm"})
         return result
     except Exception as e:
         logger.debug(f"extract_category_node error: {e}")
@@ -102,7 +362,14 @@ async def extract_category_node(state: State) -> dict:
 
 async def verify_category_node(state: State) -> dict:
     try:
-        verification_result = verification_processor.verify_category(state)
+        verify, rule = verification_policy.decide("category", state["customer_message"])
+        if not verify:
+            return {"verification_result": VerificationResult(category=True)}
+        verification_result = await verification_processor.verify_category(state)
+        verification_policy.record_sample("category", rule, verification_result["verification_result"].category)
+        if category_labels_path and verification_result["verification_result"].category:
+            # Verified LLM categories become training data for the local classifier
+            await asyncio.to_thread(record_category_label, state["customer_message"])
         return verification_result
     except Exception as e:
         logger.error(f"Error in verify_category_node: {e}")
@@ -112,6 +379,7 @@ async def extract_additional_info_node(state: State) -> dict:
     try:
         customer_message = state.get("customer_message", CustomerMessage())
         category = customer_message.category.value.lower()
+        sku_matches = sku_matcher.find_matches(customer_message.subject, customer_message.body) if sku_matcher else []
         
         methods_to_call = [
             email_processor.extract_name_title,
@@ -119,7 +387,12 @@ async def extract_additional_info_node(state: State) -> dict:
             email_processor.extract_questions
         ]
         
-        if category == "order":
+        products_source = "llm"
+        # Replacing the extractor needs SKUs the customer actually asks about; bare mentions only seed
+        if any(match.intent for match in sku_matches) and sku_prepass_mode == "replace" and category in ["order", "inquiry", "order_inquiry"]:
+            logger.info(f"Using {len(sku_matches)} quoted SKUs instead of the product extractor")
+            products_source = "sku"
+        elif category == "order":
             methods_to_call.append(email_processor.extract_orders)
         elif category == "inquiry":
             methods_to_call.append(email_processor.extract_inquiries)
@@ -128,54 +401,31 @@ async def extract_additional_info_node(state: State) -> dict:
         
         logger.info(f"Processing category '{category}' with methods: {[method.__name__ for method in methods_to_call]}")
         
-        results = []
-        for method in methods_to_call:
-            try:
+        semaphore = asyncio.Semaphore(extractor_concurrency)
+
+        async def run_extractor(method):
+            async with semaphore:
                 logger.info(f"Calling {method.__name__}")
-                result = method(state)
-                results.append(result)
+                result = await asyncio.wait_for(method(state), timeout=extractor_timeout)
                 logger.info(f"{method.__name__} completed successfully")
-            except Exception as e:
-                logger.error(f"{method.__name__} failed: {e}")
-                continue
-        
-        merged_updates = {}
-        for result in results:
-            if not isinstance(result, dict) or "customer_message" not in result:
-                continue
-                
-            cm = result["customer_message"]
-            
-            if hasattr(cm, "products_purchase") and cm.products_purchase:
-                merged_updates["products_purchase"] = cm.products_purchase
-                logger.info(f"Updated products_purchase with {len(cm.products_purchase)} items")
-            
-            if hasattr(cm, "products_inquiry") and cm.products_inquiry:
-                merged_updates["products_inquiry"] = cm.products_inquiry
-                logger.info(f"Updated products_inquiry with {len(cm.products_inquiry)} items")
-            
-            if hasattr(cm, "questions") and cm.questions:
-                merged_updates["questions"] = cm.questions
-                logger.info(f"Updated questions with {len(cm.questions)} items")
-            
-            if hasattr(cm, "first_name") and cm.first_name and cm.first_name.lower() != 'none':
-                merged_updates.update({
-                    "first_name": cm.first_name,
-                    "last_name": getattr(cm, "last_name", ""),
-                    "title": getattr(cm, "title", "")
-                })
-                logger.info(f"Updated name/title: {cm.first_name} {getattr(cm, 'last_name', '')}")
-            
-            if hasattr(cm, "occasion") and cm.occasion and cm.occasion.strip():
-                merged_updates["occasion"] = cm.occasion.strip()
-                logger.info(f"Updated occasion: {cm.occasion}")
+                return result
+
+        # gather keeps results in methods_to_call order, so the merge below is deterministic
+        outcomes = await asyncio.gather(*(run_extractor(method) for method in methods_to_call), return_exceptions=True)
+
+        results = []
+        for method, outcome in zip(methods_to_call, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                logger.error(f"{method.__name__} timed out after {extractor_timeout}s")
+            elif isinstance(outcome, Exception):
+                logger.error(f"{method.__name__} failed: {outcome}")
+            else:
+                results.append(outcome)
         
-        if merged_updates:
-            logger.info(f"Applying updates: {list(merged_updates.keys())}")
-            updated_message = customer_message.model_copy(update=merged_updates)
-        else:
-            logger.info("No updates to apply")
-            updated_message = customer_message
+        updated_message = merge_extraction_results(customer_message, results)
+        updated_message = updated_message.model_copy(update={"products_source": products_source})
+        if sku_matches:
+            updated_message = sku_matcher.seed_products(updated_message, sku_matches)
         
         logger.info("Additional info extraction completed successfully")
         return {"customer_message": updated_message}
@@ -184,17 +434,37 @@ async def extract_additional_info_node(state: State) -> dict:
         logger.error(f"Error in extract_additional_info_node: {e}")
         return {"customer_message": state.get("customer_message", CustomerMessage())}
 
+async def extract_fused_node(state: State) -> dict:
+    try:
+        customer_message = state.get("customer_message", CustomerMessage())
+        result = await email_processor.extract_fused(state)
+        category = result["customer_message"].category
+        categorized_message = customer_message.model_copy(update={"category": category, "products_source": "llm"})
+        updated_message = merge_extraction_results(categorized_message, [result])
+        if sku_matcher:
+            sku_matches = sku_matcher.find_matches(customer_message.subject, customer_message.body)
+            updated_message = sku_matcher.seed_products(updated_message, sku_matches)
+        logger.info(f"Fused extraction completed for category '{category.value}'")
+        return {"customer_message": updated_message}
+    except Exception as e:
+        logger.error(f"Error in extract_fused_node: {e}")
+        return {"customer_message": state.get("customer_message", CustomerMessage())}
+
 async def verify_remaining_extracted_data_node(state: State) -> dict:
     try:
-        result = verification_processor.verify_remaining_extracted_data(state)
-        return result  
+        verify, rule = verification_policy.decide("extracted_data", state["customer_message"])
+        if not verify:
+            return {"verification_result": state.get("verification_result")}
+        result = await verification_processor.verify_remaining_extracted_data(state)
+        verification_policy.record_sample("extracted_data", rule, all(result["verification_result"].values()))
+        return result
     except Exception as e:
         logger.error(f"Error in verify_remaining_extracted_data_node: {e}")
         return {"verification_result": None}
     
 async def locate_product_id_node(state: State) -> dict:
     try:
-        result = locate_products_processor.locate_product_ids(state)
+        result = await locate_products_processor.locate_product_ids(state)
         return result  
     except Exception as e:
         logger.error(f"Error in locate_product_id_node: {e}")
@@ -210,24 +480,30 @@ async def check_inventory_node(state: State) -> dict:
         
 async def similar_products_node(state: State) -> dict:
     try:
-        result = product_similarity.generate_similar_products(state)
+        result = await product_similarity.generate_similar_products(state)
         logger.debug(f"similar_products_node type: {type(result)}")
         return result
     except Exception as e:
         logger.error(f"Error in similar_products_node: {e}")
         return {"customer_message": state.get("customer_message", CustomerMessage())}
         
-async def generate_response_node(state: State) -> dict:
+ERROR_RESPONSE = "Sorry, I encountered an error processing your request."
+
+async def generate_response_node(state: State, config: RunnableConfig) -> dict:
     try:
         customer_message = state.get("customer_message", CustomerMessage())
         category = customer_message.category.value.lower()
+        on_token = None
+        if config.get("configurable", {}).get("stream_tokens"):
+            writer = get_stream_writer()
+            on_token = lambda token: writer({"event": "token", "text": token})
         
         if category == "order":
-            result = response_processor.generate_order(state)
+            result = await response_processor.generate_order(state, on_token)
         elif category == "order_inquiry":
-            result = response_processor.generate_order_inquiry(state)
+            result = await response_processor.generate_order_inquiry(state, on_token)
         elif category == "inquiry":
-            result = response_processor.generate_inquiry(state)
+            result = await response_processor.generate_inquiry(state, on_token)
         elif category == "status":
             result = response_processor.generate_status(state)
         elif category == "complaint":
@@ -237,6 +513,8 @@ async def generate_response_node(state: State) -> dict:
         
         updated_message = result["customer_message"]
         logger.debug(f"Response: {updated_message.response}")
+        if on_token is not None and category in ["status", "complaint", "unknown"]:
+            on_token(updated_message.response)
         
         return {"customer_message": updated_message}
         
@@ -244,7 +522,7 @@ async def generate_response_node(state: State) -> dict:
         logger.error(f"Error in generate_response_node: {e}")
         
         customer_message = state.get("customer_message", CustomerMessage())
-        error_message = "Sorry, I encountered an error processing your request."
+        error_message = ERROR_RESPONSE
         
         updated_message = customer_message.model_copy(update={
             "response": error_message,
@@ -253,16 +531,53 @@ async def generate_response_node(state: State) -> dict:
         
         return {"customer_message": updated_message}
         
+def instrumented(name, node):
+    @functools.wraps(node)
+    async def timed_node(*args, **kwargs):
+        with NODE_LATENCY.time(node=name), tracer.span(f"node {name}", attributes={"graph.node": name}):
+            try:
+                return await node(*args, **kwargs)
+            except Exception:
+                NODE_ERRORS.inc(node=name)
+                raise
+    return timed_node
+
 workflow = StateGraph(State)
-workflow.add_node("extract_category", extract_category_node)
-workflow.add_node("verify_category", verify_category_node)
-workflow.add_node("extract_additional_info", extract_additional_info_node)
-workflow.add_node("verify_remaining_extracted_data", verify_remaining_extracted_data_node)
-workflow.add_node("locate_product_id", locate_product_id_node)
-workflow.add_node("check_inventory", check_inventory_node)
-workflow.add_node("similar_products", similar_products_node)
-workflow.add_node("generate_response", generate_response_node)
-workflow.set_entry_point("extract_category")
+
+def add_node(name, node):
+    workflow.add_node(name, instrumented(name, node))
+
+if extraction_mode == "fused":
+    add_node("extract_fused", extract_fused_node)
+    workflow.set_entry_point("extract_fused")
+else:
+    add_node("extract_category", extract_category_node)
+    add_node("verify_category", verify_category_node)
+    add_node("extract_additional_info", extract_additional_info_node)
+    if category_classifier is not None:
+        add_node("classify_category", classify_category_node)
+        workflow.set_entry_point("classify_category")
+    else:
+        workflow.set_entry_point("extract_category")
+add_node("verify_remaining_extracted_data", verify_remaining_extracted_data_node)
+add_node("locate_product_id", locate_product_id_node)
+add_node("check_inventory", check_inventory_node)
+add_node("similar_products", similar_products_node)
+add_node("generate_response", generate_response_node)
+
+def traced_route(source, router):
+    @functools.wraps(router)
+    def route(state: State):
+        with tracer.span(f"route after {source}", attributes={"graph.node": source}):
+            decision = router(state)
+            customer_message = state.get("customer_message")
+            set_attributes({
+                "route.decision": decision,
+                "route.verification_result": str(state.get("verification_result")),
+                "email.category": customer_message.category.value if customer_message is not None else None
+            })
+            return decision
+    return route
    
 def route_after_verify_category(state: State):
     passed = state["verification_result"].category if state["verification_result"] is not None else False
@@ -272,6 +587,11 @@ def route_after_verify_category(state: State):
     else:
         return "generate_response"
     
+def route_after_classify_category(state: State):
+    if state["customer_message"].category_source == "local":
+        return "extract_additional_info"
+    return "extract_category"
+
 def route_after_verify_extracted_data(state: State):
     category = state["customer_message"].category.value.lower()
     logger.debug(f"Routing category: {category}")
@@ -283,16 +603,28 @@ def route_after_verify_extracted_data(state: State):
         logger.warning(f"Unknown email category: {category}")
         return END
     
-workflow.add_edge("extract_category", "verify_category")
-workflow.add_conditional_edges("verify_category", route_after_verify_category,
-    {
-        "extract_additional_info": "extract_additional_info",
-        "generate_response": "generate_response"
-    }
-)
+if extraction_mode == "fused":
+    # One structured call replaces category extraction/verification and the per-field extractors
+    workflow.add_edge("extract_fused", "verify_remaining_extracted_data")
+else:
+    if category_classifier is not None:
+        # A confident local prediction skips both category LLM calls
+        workflow.add_conditional_edges("classify_category", traced_route("classify_category", route_after_classify_category),
+            {
+                "extract_additional_info": "extract_additional_info",
+                "extract_category": "extract_category"
+            }
+        )
+    workflow.add_edge("extract_category", "verify_category")
+    workflow.add_conditional_edges("verify_category", traced_route("verify_category", route_after_verify_category),
+        {
+            "extract_additional_info": "extract_additional_info",
+            "generate_response": "generate_response"
+        }
+    )
+    workflow.add_edge("extract_additional_info", "verify_remaining_extracted_data")
 
-workflow.add_edge("extract_additional_info", "verify_remaining_extracted_data")
-workflow.add_conditional_edges( "verify_remaining_extracted_data", route_after_verify_extracted_data,
+workflow.add_conditional_edges( "verify_remaining_extracted_data", traced_route("verify_remaining_extracted_data", route_after_verify_extracted_data),
     {
         "locate_product_id": "locate_product_id",
         "generate_response": "generate_response",
@@ -306,47 +638,357 @@ workflow.add_edge("generate_response", END)
 
 graph = workflow.compile()
 
+def initial_state(email: EmailRequest) -> State:
+    return {
+        "customer_message": CustomerMessage(
+            id=email.email_id,
+            subject=email.subject,
+            body=email.message
+        ),
+        "verification_result": None
+    }
+
+async def budgeted_state(email: EmailRequest) -> State:
+    # Oversized bodies are cut down once here rather than pasted whole into every prompt
+    state = initial_state(email)
+    customer_message = state["customer_message"]
+    body, action = await body_budget.apply(customer_message.body, email_processor.summarize_body)
+    if action:
+        logger.info(f"Email {email.email_id} body {action} to the {body_budget.max_tokens}-token budget")
+        token_accountant.counters[f"bodies_{action}"] += 1
+        state["customer_message"] = customer_message.model_copy(update={"body": body})
+    return state
+
+def record_finished_email(customer_message: CustomerMessage, usage):
+    token_accountant.finish_request(customer_message.category.value, usage)
+    set_attributes({
+        "email.category": customer_message.category.value,
+        "email.category_source": customer_message.category_source,
+        "llm.calls": usage.totals["calls"],
+        "llm.prompt_tokens": usage.totals["prompt_tokens"],
+        "llm.completion_tokens": usage.totals["completion_tokens"]
+    })
+    EMAILS.inc(category=customer_message.category.value, category_source=customer_message.category_source or "llm")
+
+def build_response_payload(customer_message: CustomerMessage, verification_result) -> dict:
+    return {
+        "email_id": customer_message.id,
+        "category": customer_message.category.value,
+        "response": customer_message.response,
+        "first_name": customer_message.first_name,
+        "last_name": customer_message.last_name,
+        "title": customer_message.title,
+        "history": customer_message.history,
+        "products_purchase": customer_message.products_purchase,
+        "products_inquiry": customer_message.products_inquiry,
+        "products_recommendations": customer_message.products_recommendations,
+        "verification_result": verification_result if verification_result else None
+    }
+
+def build_node_event(node: str, update: dict) -> dict:
+    event = {"node": node}
+    customer_message = update.get("customer_message") if isinstance(update, dict) else None
+    if customer_message is not None:
+        event.update({
+            "category": customer_message.category.value,
+            "first_name": customer_message.first_name,
+            "last_name": customer_message.last_name,
+            "title": customer_message.title,
+            "products_purchase": customer_message.products_purchase,
+            "products_inquiry": customer_message.products_inquiry,
+            "products_recommendations": customer_message.products_recommendations,
+            "order_details": customer_message.order_details
+        })
+    if isinstance(update, dict) and "verification_result" in update:
+        event["verification_result"] = update["verification_result"]
+    return event
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@app.post("/process_email/stream")
+async def process_email_stream(email: EmailRequest):
+    """Server-sent events: one 'node' event per completed graph node, 'token' events
+    while the response is generated, then a 'result' event with the /process_email payload."""
+    logger.debug(f"Received streaming request: email_id={email.email_id}")
+
+    async def events():
+        content_hash = content_key(email.subject, email.message)
+        if result_store is not None:
+            stored = await result_store.get(email.email_id, content_hash, force=email.force)
+            if stored is not None:
+                # Nothing runs for a stored result, so it is replayed as the final event alone
+                logger.info(f"Serving stored result for streamed email_id={email.email_id}")
+                yield sse_event("result", {**stored, "email_id": email.email_id})
+                return
+
+        # Same keys as run_email: a duplicate of a streamed run gets its events from the
+        # start, a duplicate of a /process_email run waits and gets the final result
+        keys = [f"id:{email.email_id}" if email.email_id else None, content_hash]
+        feed = EventFeed()
+        task, leader = single_flight.start(keys, lambda: stream_graph(email, feed))
+        if leader:
+            stream_feeds[task] = feed
+            task.add_done_callback(lambda done: stream_feeds.pop(done, None))
+        else:
+            feed = stream_feeds.get(task)
+        try:
+            if feed is not None:
+                async for event in feed.subscribe():
+                    yield event
+            final_state = await asyncio.shield(task)
+            payload = build_response_payload(final_state["customer_message"], final_state["verification_result"])
+            payload["email_id"] = email.email_id
+            if result_store is not None:
+                result_store.put(email.email_id, content_hash, jsonable_encoder(payload), degraded=final_state["degraded"])
+            yield sse_event("result", payload)
+        except Exception as e:
+            logger.error(f"Error in process_email_stream: {str(e)}")
+            logger.error(traceback.format_exc())
+            yield sse_event("error", {"detail": f"Error processing email: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+single_flight = SingleFlight()
+# Event feeds of the streamed runs in single_flight, by their task
+stream_feeds = {}
+result_store = ResultStore(
+    db_handler if result_store_backend == "mongo" else None,
+    os.getenv('MONGO_COLLECTION_RESULTS_NAME', 'email_results'),
+    hot_entries=int(os.getenv('RESULT_STORE_HOT_ENTRIES', '1024')),
+    flush_interval=float(os.getenv('RESULT_STORE_FLUSH_SECONDS', '1.0')),
+    flush_size=int(os.getenv('RESULT_STORE_FLUSH_SIZE', '100'))
+) if result_store_backend != "none" else None
+
+def is_degraded(customer_message: CustomerMessage, usage) -> bool:
+    # A failed LLM call leaves a fallback (template or empty) response that a retry could improve on
+    return not customer_message.response or customer_message.response == ERROR_RESPONSE or usage.failed_calls > 0
+
+async def invoke_graph(email: EmailRequest) -> dict:
+    usage = token_accountant.begin_request()
+    config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+    logger.debug(f"Config: {config}")
+    with EMAILS_IN_FLIGHT.track_inprogress(), tracer.span("process_email", attributes={"email.id": email.email_id}):
+        final_state = await graph.ainvoke(await budgeted_state(email), config)
+        record_finished_email(final_state["customer_message"], usage)
+    logger.debug(f"Final state: {final_state['customer_message']}")
+    return {**final_state, "degraded": is_degraded(final_state["customer_message"], usage)}
+
+async def stream_graph(email: EmailRequest, feed: EventFeed) -> dict:
+    """invoke_graph, publishing node and token events to feed as the graph runs."""
+    usage = token_accountant.begin_request()
+    config = {"configurable": {"thread_id": str(uuid.uuid4()), "stream_tokens": True}}
+    try:
+        with EMAILS_IN_FLIGHT.track_inprogress(), tracer.span("process_email", attributes={"email.id": email.email_id, "email.streamed": True}):
+            state = await budgeted_state(email)
+            final_state = dict(state)
+            async for mode, chunk in graph.astream(state, config, stream_mode=["updates", "custom"]):
+                if mode == "custom":
+                    feed.publish(sse_event(chunk.get("event", "custom"), chunk))
+                    continue
+                for node, update in chunk.items():
+                    if isinstance(update, dict):
+                        final_state.update(update)
+                    feed.publish(sse_event("node", build_node_event(node, update)))
+            record_finished_email(final_state["customer_message"], usage)
+    finally:
+        feed.close()
+    return {**final_state, "degraded": is_degraded(final_state["customer_message"], usage)}
+
+async def run_email(email: EmailRequest) -> dict:
+    # Retries and double deliveries of an email already in flight share its run, so
+    # the LLM calls and the stock reservation happen once
+    content_hash = content_key(email.subject, email.message)
+    if result_store is not None:
+        stored = await result_store.get(email.email_id, content_hash, force=email.force)
+        if stored is not None:
+            logger.info(f"Serving stored result for email_id={email.email_id}")
+            return {**stored, "email_id": email.email_id}
+
+    keys = [f"id:{email.email_id}" if email.email_id else None, content_hash]
+    final_state = await single_flight.do(keys, lambda: invoke_graph(email))
+    payload = build_response_payload(final_state["customer_message"], final_state["verification_result"])
+    payload["email_id"] = email.email_id
+    if result_store is not None:
+        result_store.put(email.email_id, content_hash, jsonable_encoder(payload), degraded=final_state["degraded"])
+    return payload
+
+@app.get("/results/stats")
+async def result_store_stats():
+    if result_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_store.stats()}
+
+@app.get("/single_flight/stats")
+async def single_flight_stats():
+    return single_flight.stats()
+
+job_queue = JobQueue(run_email, workers=job_workers, max_queue_size=job_queue_max_size, result_ttl_seconds=job_result_ttl)
+
+@app.on_event("startup")
+async def start_job_workers():
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await job_queue.stop()
+
+# Registered after the job workers so their last results are flushed on shutdown
+@app.on_event("startup")
+async def start_result_store():
+    if result_store is not None:
+        await result_store.start()
+
+@app.on_event("shutdown")
+async def flush_result_store():
+    if result_store is not None:
+        await result_store.stop()
+
+@app.post("/jobs", status_code=202)
+async def submit_job(email: EmailRequest):
+    try:
+        job = job_queue.submit(email)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later")
+    return {"job_id": job.id, "status": job.status}
+
+# Declared before /jobs/{job_id} so "stats" is not taken for a job ID
+@app.get("/jobs/stats")
+async def job_stats():
+    return job_queue.stats()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+def component_metrics():
+    """Counters the components already keep, read at scrape time rather than on the request path."""
+    if llm_cache is not None:
+        llm_cache_stats = llm_cache.stats()
+        yield ("llm_cache_lookups_total", "counter", "LLM response cache lookups by result", [
+            ({"result": result}, llm_cache_stats[result]) for result in ("memory_hits", "persistent_hits", "misses")
+        ])
+    embedding_stats = embedding_cache.stats()
+    yield ("embedding_cache_lookups_total", "counter", "Embedding cache lookups by result", [
+        ({"result": result}, embedding_stats[result]) for result in ("memory_hits", "disk_hits", "misses")
+    ])
+    yield ("product_resolution_total", "counter", "Product IDs resolved by each tier", [
+        ({"tier": tier}, hits) for tier, hits in locate_products_processor.tier_hits.items()
+    ])
+    verification_samples = []
+    for stage, counters in verification_policy.stats().items():
+        if isinstance(counters, dict):
+            verification_samples.append(({"stage": stage, "outcome": "verified"}, counters["verified"]))
+            verification_samples.extend(
+                ({"stage": stage, "outcome": f"skipped_{rule}"}, skipped) for rule, skipped in counters["skipped"].items()
+            )
+    yield ("verification_decisions_total", "counter", "Verification calls made or skipped by rule", verification_samples)
+    yield ("single_flight_total", "counter", "Graph executions and requests coalesced onto them", [
+        ({"outcome": "executed"}, single_flight.leaders), ({"outcome": "coalesced"}, single_flight.coalesced)
+    ])
+    if result_store is not None:
+        store_stats = result_store.stats()
+        yield ("result_store_lookups_total", "counter", "Stored result lookups by outcome", [
+            ({"outcome": outcome}, store_stats[outcome]) for outcome in ("hot_hits", "store_hits", "misses", "content_mismatches", "forced")
+        ])
+        yield ("result_store_buffered", "gauge", "Results waiting for the next bulk write", [({}, store_stats["buffered"])])
+    queue_stats = job_queue.stats()
+    yield ("job_queue_depth", "gauge", "Jobs waiting for a worker", [({}, queue_stats["queue_depth"])])
+    yield ("job_workers_busy", "gauge", "Job workers currently running a job", [({}, queue_stats["busy_workers"])])
+    yield ("jobs_total", "counter", "Jobs by outcome", [
+        ({"outcome": outcome}, queue_stats[outcome]) for outcome in ("submitted", "succeeded", "failed", "rejected")
+    ])
+    if rate_limiter is not None:
+        limits = rate_limiter.stats()
+        yield ("llm_concurrency_limit", "gauge", "Adaptive LLM concurrency limit", [
+            ({"model": model}, model_stats["concurrency_limit"]) for model, model_stats in limits.items()
+        ])
+        yield ("llm_rate_limiter_events_total", "counter", "Rate limiter retries, throttles and deadline misses", [
+            ({"model": model, "event": event}, model_stats[event])
+            for model, model_stats in limits.items()
+            for event in ("retries", "throttled", "server_errors", "failed", "deadline_exceeded")
+        ])
+    yield ("llm_tokens_total", "counter", "LLM tokens by email category", [
+        ({"category": category, "kind": kind}, counters[f"{kind}_tokens"])
+        for category, counters in token_accountant.by_category.items()
+        for kind in ("prompt", "completion")
+    ])
+    yield ("email_bodies_budgeted_total", "counter", "Email bodies cut down to the token budget", [
+        ({"action": "truncated"}, token_accountant.counters["bodies_truncated"]),
+        ({"action": "summarized"}, token_accountant.counters["bodies_summarized"])
+    ])
+
+REGISTRY.register_collector(component_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/process_emails")
+async def process_emails(request: Request, concurrency: int = 0):
+    """Run every row of a CSV or JSONL request body through the graph.
+
+    Streams one NDJSON line per email in completion order, then a summary line.
+    concurrency defaults to BULK_CONCURRENCY and is capped by it.
+    """
+    content = await request.body()
+    rows = list(parse_email_rows(
+        content, request.headers.get("content-type", ""), request.query_params.get("filename", "")
+    ))
+    limit = min(concurrency, bulk_concurrency) if concurrency > 0 else bulk_concurrency
+    semaphore = asyncio.Semaphore(limit)
+    logger.info(f"Bulk request with {len(rows)} rows, concurrency {limit}")
+
+    async def run_row(row_number, fields, error):
+        email_id = fields["email_id"] if fields else None
+        if error is not None:
+            return {"row": row_number, "email_id": email_id, "status": "error", "error": error}
+        try:
+            async with semaphore:
+                result = await run_email(EmailRequest(**fields))
+            return {"row": row_number, "email_id": email_id, "status": "ok", "result": result}
+        except Exception as e:
+            logger.error(f"Bulk row {row_number} ({email_id}) failed: {e}")
+            return {"row": row_number, "email_id": email_id, "status": "error", "error": str(e)}
+
+    async def results():
+        tasks = [asyncio.create_task(run_row(*row)) for row in rows]
+        succeeded = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                outcome = await next_result
+                succeeded += outcome["status"] == "ok"
+                yield json.dumps(jsonable_encoder(outcome)) + "\n"
+            yield json.dumps({"summary": {"total": len(rows), "succeeded": succeeded, "failed": len(rows) - succeeded}}) + "\n"
+        finally:
+            # The client went away mid-stream: don't keep spending on rows nobody will read
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.post("/process_email")
 async def process_email(email: EmailRequest):
     logger.debug(f"Received request: email_id={email.email_id}, subject={email.subject}, message={email.message}")
     try:
-        state: State = {
-            "customer_message": CustomerMessage(
-                id=email.email_id,
-                subject=email.subject,
-                body=email.message
-            ),
-            "verification_result": None
-        }
-        logger.debug("State initialized and populated")
-
-        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
-        logger.debug(f"Config: {config}")
-        final_state = await graph.ainvoke(state, config)
-        logger.debug(f"Final state: {final_state['customer_message']}")
+        payload = await run_email(email)
         
-        resp =  {"response": final_state["customer_message"].response}
+        resp =  {"response": payload["response"]}
         print(f"  response {resp}  ")
-        logger.debug(f"Response: {final_state["customer_message"].products_purchase}")
+        logger.debug(f"Response: {payload['products_purchase']}")
         
-        print(f"PRODUCTS_PURCHASE: {final_state['customer_message'].products_purchase}")
-        print(f"PRODUCTS_INQUIRY: {final_state['customer_message'].products_inquiry}")
-        print(f"PRODUCTS_ISUGGESTIONS: {final_state['customer_message'].products_recommendations}")
+        print(f"PRODUCTS_PURCHASE: {payload['products_purchase']}")
+        print(f"PRODUCTS_INQUIRY: {payload['products_inquiry']}")
+        print(f"PRODUCTS_ISUGGESTIONS: {payload['products_recommendations']}")
         
-        return {
-            "email_id": final_state["customer_message"].id,
-            "category": final_state["customer_message"].category.value,
-            "response": final_state["customer_message"].response,
-            "first_name": final_state["customer_message"].first_name,
-            "last_name": final_state["customer_message"].last_name,
-            "title": final_state["customer_message"].title,
-            "history": final_state["customer_message"].history,
-            "products_purchase": final_state["customer_message"].products_purchase,
-            "products_inquiry": final_state["customer_message"].products_inquiry,
-            "products_recommendations": final_state["customer_message"].products_recommendations,
-            "verification_result": final_state["verification_result"] if final_state["verification_result"] else None
-            
-        }
+        return payload
     except ValueError as ve:
         logger.error(f"ValueError in process_email: {str(ve)}")
         raise HTTPException(status_code=400, detail=f"Unknown email category: {str(ve)}")
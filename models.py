@@ -4,4 +4,5 @@ from pydantic import BaseModel
 class EmailRequest(BaseModel):
     email_id: str
     subject: str
-    message: str
\ No newline at end of file
+    message: str
+    force: bool = False
\ No newline at end of file
@@ -5,22 +5,24 @@ import certifi
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, UpdateOne
 from pymongo.errors import ConnectionFailure
 
+from metrics import FALLBACKS, MONGO_LATENCY, VECTOR_SEARCH_LATENCY
+from tracing import SPAN_KIND_CLIENT, set_attributes, tracer
+
 logger = logging.getLogger(__name__)
 
 class MongoDBHandler:
     def __init__(self, uri, db):
         load_dotenv()
         self.uri = uri
-        self.client = MongoClient(
-            self.uri,
-            tls=True,
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=30000
-        )
-        self.db = self.client[db]
+        self.db_name = db
+        self._connect()
+        self.vector_search_backend = os.getenv('VECTOR_SEARCH_BACKEND', 'local').lower()
+        self.vector_indexes = {}
+        self.catalogs = {}
+        self.row_positions = {}
         try:
             self.client.admin.command('ping')
             logger.info("MongoDB connection established successfully")
@@ -28,6 +30,20 @@ class MongoDBHandler:
             logger.error(f"MongoDB connection failed: {e}")
             raise
 
+    def _connect(self):
+        self.client = MongoClient(
+            self.uri,
+            tls=True,
+            tlsCAFile=certifi.where(),
+            serverSelectionTimeoutMS=30000
+        )
+        self.db = self.client[self.db_name]
+
+    def reconnect(self):
+        """Open a new client; PyMongo clients must not be reused across fork()."""
+        self._connect()
+        logger.info("MongoDB client reconnected")
+
     def create_collection(self, collection_name):
         try:
             self.db.create_collection(collection_name)
@@ -47,6 +63,8 @@ class MongoDBHandler:
             logger.error(f"Error inserting data into '{collection_name}': {e}")
             raise
 
+    @MONGO_LATENCY.timed(operation="insert")
+    @tracer.traced("mongo.insert_document", SPAN_KIND_CLIENT, {"db.operation": "insert"})
     def insert_document(self, collection_name, document):
         try:
             collection = self.db[collection_name]
@@ -57,6 +75,8 @@ class MongoDBHandler:
             logger.error(f"Error inserting document in {collection_name}: {e}")
             raise
 
+    @MONGO_LATENCY.timed(operation="insert")
+    @tracer.traced("mongo.insert_documents", SPAN_KIND_CLIENT, {"db.operation": "insert"})
     def insert_documents(self, collection_name, documents):
         try:
             collection = self.db[collection_name]
@@ -67,16 +87,67 @@ class MongoDBHandler:
             logger.error(f"Error inserting documents in {collection_name}: {e}")
             raise
 
-    def find_documents(self, collection_name, query={}, limit=0):
+    @MONGO_LATENCY.timed(operation="find")
+    @tracer.traced("mongo.find_documents", SPAN_KIND_CLIENT, {"db.operation": "find"})
+    def find_documents(self, collection_name, query={}, limit=0, projection=None):
         try:
             collection = self.db[collection_name]
-            cursor = collection.find(query).limit(limit)
+            cursor = collection.find(query, projection).limit(limit)
             return list(cursor)
         except Exception as e:
             logger.error(f"Error finding documents in {collection_name}: {e}")
             raise
 
+    def register_vector_index(self, collection_name, index):
+        self.vector_indexes[collection_name] = index
+
+    def register_catalog(self, collection_name, catalog_df):
+        """Keep the loaded catalog and an _id/product_id -> row position map for search results."""
+        self.catalogs[collection_name] = catalog_df
+        positions = {str(_id): position for position, _id in enumerate(catalog_df['_id'])}
+        positions.update({product_id: position for position, product_id in enumerate(catalog_df['product_id'])})
+        self.row_positions[collection_name] = positions
+
+    def get_catalog(self, collection_name):
+        if collection_name not in self.catalogs:
+            logger.warning(f"Catalog for {collection_name} not registered, loading it once")
+            self.register_catalog(collection_name, pd.DataFrame(self.find_documents(collection_name, projection={"embedding": 0})))
+        return self.catalogs[collection_name]
+
+    @tracer.traced("vector_search")
     def vector_search(self, collection_name, query_embedding, k=1, exclude_product_ids=None, min_stock=0, num_candidates=100):
+        index = self.vector_indexes.get(collection_name)
+        set_attributes({"db.collection": collection_name, "vector_search.k": k, "vector_search.queries": 1})
+        if index is not None and self.vector_search_backend == "local":
+            try:
+                set_attributes({"vector_search.backend": "local"})
+                with VECTOR_SEARCH_LATENCY.time(backend="local", mode="single"):
+                    return index.search(query_embedding, k=k, exclude_product_ids=exclude_product_ids, min_stock=min_stock)
+            except Exception as e:
+                FALLBACKS.inc(kind="vector_search_atlas")
+                logger.error(f"Local vector search failed for {collection_name}, falling back to Atlas: {e}")
+        return self.atlas_vector_search(collection_name, query_embedding, k, exclude_product_ids, min_stock, num_candidates)
+
+    @tracer.traced("vector_search")
+    def vector_search_many(self, collection_name, query_embeddings, k=1, exclude_product_ids=None, min_stock=0, num_candidates=100):
+        index = self.vector_indexes.get(collection_name)
+        set_attributes({"db.collection": collection_name, "vector_search.k": k, "vector_search.queries": len(query_embeddings)})
+        if index is not None and self.vector_search_backend == "local":
+            try:
+                set_attributes({"vector_search.backend": "local"})
+                with VECTOR_SEARCH_LATENCY.time(backend="local", mode="batch"):
+                    return index.search_many(query_embeddings, k=k, exclude_product_ids=exclude_product_ids, min_stock=min_stock)
+            except Exception as e:
+                FALLBACKS.inc(kind="vector_search_atlas")
+                logger.error(f"Local batched vector search failed for {collection_name}, falling back to Atlas: {e}")
+        return [
+            self.atlas_vector_search(collection_name, query_embedding, k, exclude_product_ids, min_stock, max(num_candidates, k))
+            for query_embedding in query_embeddings
+        ]
+
+    @VECTOR_SEARCH_LATENCY.timed(backend="atlas", mode="single")
+    @tracer.traced("mongo.atlas_vector_search", SPAN_KIND_CLIENT, {"db.operation": "aggregate"})
+    def atlas_vector_search(self, collection_name, query_embedding, k=1, exclude_product_ids=None, min_stock=0, num_candidates=100):
         query_embedding = np.array(query_embedding).astype("float32")
         norm = np.linalg.norm(query_embedding)
         if norm > 0:
@@ -118,9 +189,13 @@ class MongoDBHandler:
             if not results:
                 logger.warning(f"No products found in vector search in {collection_name}")
                 return [], [], []
-            df = pd.DataFrame(self.find_documents(collection_name))
-            df['_id'] = df['_id'].astype(str)
-            indices = [df.index[df['_id'] == str(result['_id'])].tolist()[0] for result in results]
+            self.get_catalog(collection_name)
+            positions = self.row_positions[collection_name]
+            results = [result for result in results if str(result['_id']) in positions]
+            if not results:
+                logger.warning(f"Vector search results not found in the loaded {collection_name} catalog")
+                return [], [], []
+            indices = [positions[str(result['_id'])] for result in results]
             distances = [1 - result['score'] for result in results]
             product_ids = [result['product_id'] for result in results]
             logger.debug(f"Vector search results: {results}")
@@ -129,6 +204,8 @@ class MongoDBHandler:
             logger.error(f"Error in vector search in {collection_name}: {e}")
             return [], [], []
 
+    @MONGO_LATENCY.timed(operation="update")
+    @tracer.traced("mongo.update_document", SPAN_KIND_CLIENT, {"db.operation": "update"})
     def update_document(self, collection_name, query, update_data):
         try:
             collection = self.db[collection_name]
@@ -139,6 +216,64 @@ class MongoDBHandler:
             logger.error(f"Error updating document in {collection_name}: {e}")
             raise
 
+    @MONGO_LATENCY.timed(operation="upsert")
+    @tracer.traced("mongo.upsert_document", SPAN_KIND_CLIENT, {"db.operation": "upsert"})
+    def upsert_document(self, collection_name, query, document):
+        try:
+            collection = self.db[collection_name]
+            result = collection.replace_one(query, document, upsert=True)
+            logger.debug(f"Upserted document in {collection_name} (matched {result.matched_count})")
+            return result.upserted_id
+        except Exception as e:
+            logger.error(f"Error upserting document in {collection_name}: {e}")
+            raise
+
+    @MONGO_LATENCY.timed(operation="update")
+    @tracer.traced("mongo.bulk_update", SPAN_KIND_CLIENT, {"db.operation": "update"})
+    def bulk_update(self, collection_name, updates, ordered=False):
+        """Apply (query, update_data) pairs as $set updates in a single bulk_write."""
+        if not updates:
+            return 0
+        try:
+            collection = self.db[collection_name]
+            operations = [UpdateOne(query, {'$set': update_data}) for query, update_data in updates]
+            result = collection.bulk_write(operations, ordered=ordered)
+            logger.debug(f"Bulk updated {result.modified_count} documents in {collection_name}")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error bulk updating documents in {collection_name}: {e}")
+            raise
+
+    @MONGO_LATENCY.timed(operation="upsert")
+    @tracer.traced("mongo.bulk_upsert", SPAN_KIND_CLIENT, {"db.operation": "upsert"})
+    def bulk_upsert(self, collection_name, documents, ordered=False):
+        """Replace-or-insert (query, document) pairs in a single bulk_write."""
+        if not documents:
+            return 0
+        try:
+            collection = self.db[collection_name]
+            operations = [ReplaceOne(query, document, upsert=True) for query, document in documents]
+            result = collection.bulk_write(operations, ordered=ordered)
+            logger.debug(f"Bulk upserted {len(operations)} documents in {collection_name}")
+            return result.upserted_count + result.modified_count
+        except Exception as e:
+            logger.error(f"Error bulk upserting documents in {collection_name}: {e}")
+            raise
+
+    @MONGO_LATENCY.timed(operation="delete")
+    @tracer.traced("mongo.delete_documents", SPAN_KIND_CLIENT, {"db.operation": "delete"})
+    def delete_documents(self, collection_name, query):
+        try:
+            collection = self.db[collection_name]
+            result = collection.delete_many(query)
+            logger.debug(f"Deleted {result.deleted_count} documents in {collection_name}")
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Error deleting documents in {collection_name}: {e}")
+            raise
+
+    @MONGO_LATENCY.timed(operation="delete")
+    @tracer.traced("mongo.delete_document", SPAN_KIND_CLIENT, {"db.operation": "delete"})
     def delete_document(self, collection_name, query):
         try:
             collection = self.db[collection_name]
@@ -1,5 +1,7 @@
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
 import pandas as pd
@@ -18,6 +20,9 @@ class ProductCatalogProcessor:
         self.client = OpenAI(api_key=api_key)
         self.product_catalog_df = None
         self.embeddings = None
+        self.batch_size = int(os.getenv('CATALOG_EMBEDDING_BATCH_SIZE', '256'))
+        self.max_workers = int(os.getenv('CATALOG_EMBEDDING_WORKERS', '4'))
+        self.max_retries = int(os.getenv('CATALOG_EMBEDDING_RETRIES', '3'))
 
     def embed_product_description(self, description):
         try:
@@ -32,34 +37,84 @@ class ProductCatalogProcessor:
             logger.error(f"Error embedding product description: {e}")
             return None
 
+    def embed_product_descriptions(self, descriptions):
+        """Embed a batch of descriptions in one request, retrying with exponential backoff."""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                response = self.client.embeddings.create(
+                    input=descriptions, model=os.getenv('OPEN_AI_EMBEDDING_MODEL')
+                )
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Error embedding batch of {len(descriptions)} product descriptions: {e}")
+                    return None
+                delay = 2 ** (attempt - 1)
+                logger.warning(f"Embedding batch failed (attempt {attempt}/{self.max_retries}), retrying in {delay}s: {e}")
+                time.sleep(delay)
+
     def process_catalog(self):
         documents = self.db_handler.find_documents(self.collection_products)
         if not documents:
             raise ValueError(f"No products found in MongoDB {self.collection_products} collection")
 
         self.product_catalog_df = pd.DataFrame(documents)
-        
-        self.embeddings = []
-        for idx, row in self.product_catalog_df.iterrows():
-            if not row['embedding']:
-                embedding = self.embed_product_description(row['description'])
-                if embedding:
-                    self.db_handler.update_document(
-                        self.collection_products,
-                        {"_id": row['_id']},
-                        {"embedding": embedding}
-                    )
-                    self.embeddings.append(embedding)
-                else:
-                    self.embeddings.append([])
-            else:
-                self.embeddings.append(row['embedding'])
-        
+        if 'embedding' not in self.product_catalog_df.columns:
+            self.product_catalog_df['embedding'] = None
+
+        self.embeddings = [
+            embedding if isinstance(embedding, list) and embedding else []
+            for embedding in self.product_catalog_df['embedding']
+        ]
+        missing = [
+            position for position, (embedding, description)
+            in enumerate(zip(self.embeddings, self.product_catalog_df['description']))
+            if not embedding and isinstance(description, str) and description
+        ]
+        if missing:
+            self._embed_missing(missing)
+
         self.product_catalog_df['embedding'] = self.embeddings
-        
+
         norms = [np.linalg.norm(emb) for emb in self.embeddings if emb]
         if not norms:
             raise ValueError("No valid embeddings found or generated")
 
+    def _embed_missing(self, positions):
+        descriptions = self.product_catalog_df['description']
+        ids = self.product_catalog_df['_id']
+        batches = [positions[start:start + self.batch_size] for start in range(0, len(positions), self.batch_size)]
+        logger.info(f"Embedding {len(positions)} products in {len(batches)} batches with {self.max_workers} workers")
+
+        started = time.perf_counter()
+        embedded = 0
+        updates = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.embed_product_descriptions, [descriptions.iat[position] for position in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                batch_embeddings = future.result()
+                if batch_embeddings is None:
+                    continue
+                for position, embedding in zip(batch, batch_embeddings):
+                    self.embeddings[position] = embedding
+                    updates.append(({"_id": ids.iat[position]}, {"embedding": embedding}))
+                embedded += len(batch)
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"Embedded {embedded}/{len(positions)} products "
+                    f"({embedded / elapsed if elapsed > 0 else 0:.1f} products/s)"
+                )
+
+        if updates:
+            modified = self.db_handler.bulk_update(self.collection_products, updates)
+            logger.info(f"Wrote {modified} product embeddings back to {self.collection_products}")
+        failed = len(positions) - embedded
+        if failed:
+            logger.error(f"Failed to embed {failed} products")
+
     def get_product_catalog(self):
-        return self.product_catalog_df
\ No newline at end of file
+        return self.product_catalog_df
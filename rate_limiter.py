@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(Exception):
+    pass
+
+def status_code_of(error):
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code
+
+def is_throttle(error):
+    return status_code_of(error) == 429
+
+def is_retryable(error):
+    """429s, 5xx responses, timeouts and connection errors are worth retrying; other 4xx are not."""
+    status_code = status_code_of(error)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "TimeoutException")
+
+def retry_after_seconds(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Refills capacity units per minute continuously; acquire() waits for enough units."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount, deadline):
+        # A single request larger than the bucket would wait forever; let it through once the bucket is full
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+                if time.monotonic() + wait > deadline:
+                    raise DeadlineExceeded(f"rate limit wait of {wait:.1f}s exceeds the request deadline")
+                await asyncio.sleep(wait)
+
+    def adjust(self, amount):
+        """Debit (positive) or refund (negative) units once the real usage is known."""
+        self._refill()
+        self.available = min(self.capacity, self.available - amount)
+
+class AIMDConcurrency:
+    """In-flight limit that grows by one per window of successes and shrinks multiplicatively on throttling."""
+
+    def __init__(self, initial, minimum=1, maximum=64, decrease_factor=0.5, cooldown_seconds=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, deadline):
+        async with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise DeadlineExceeded("no concurrency slot before the request deadline")
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded("no concurrency slot before the request deadline")
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_throttle(self):
+        now = time.monotonic()
+        # One burst of 429s from requests already in flight counts as a single signal
+        if now - self.last_decrease >= self.cooldown_seconds:
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            self.last_decrease = now
+            logger.warning(f"Throttled: concurrency limit reduced to {int(self.limit)}")
+
+class ModelLimiter:
+    def __init__(self, model, rpm, tpm, concurrency):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.counters = {"calls": 0, "succeeded": 0, "retries": 0, "throttled": 0, "server_errors": 0, "failed": 0, "deadline_exceeded": 0}
+
+    def stats(self):
+        self.requests._refill()
+        self.tokens._refill()
+        return {
+            **self.counters,
+            "rpm_limit": self.requests.capacity,
+            "tpm_limit": self.tokens.capacity,
+            "requests_available": round(self.requests.available, 1),
+            "tokens_available": round(self.tokens.available, 1),
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight
+        }
+
+class RateLimiter:
+    """Shared per-model request/token budgets, adaptive concurrency and deadline-bounded retries.
+
+    overrides maps a model name to {"rpm": ..., "tpm": ..., "concurrency": ...} for models
+    whose limits differ from the defaults.
+    """
+
+    def __init__(self, rpm=500, tpm=200000, concurrency=32, min_concurrency=1, max_concurrency=128,
+                 max_retries=5, base_delay=0.5, max_delay=20.0, deadline_seconds=60.0, overrides=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline_seconds = deadline_seconds
+        self.overrides = overrides or {}
+        self.models = {}
+
+    @classmethod
+    def from_env(cls, getenv):
+        return cls(
+            rpm=float(getenv('LLM_RPM_LIMIT', '500')),
+            tpm=float(getenv('LLM_TPM_LIMIT', '200000')),
+            concurrency=int(getenv('LLM_CONCURRENCY_INITIAL', '32')),
+            min_concurrency=int(getenv('LLM_CONCURRENCY_MIN', '1')),
+            max_concurrency=int(getenv('LLM_CONCURRENCY_MAX', '128')),
+            max_retries=int(getenv('LLM_MAX_RETRIES', '5')),
+            base_delay=float(getenv('LLM_RETRY_BASE_SECONDS', '0.5')),
+            max_delay=float(getenv('LLM_RETRY_MAX_SECONDS', '20')),
+            deadline_seconds=float(getenv('LLM_REQUEST_DEADLINE_SECONDS', '60')),
+            overrides=json.loads(getenv('LLM_RATE_LIMITS', '{}') or '{}')
+        )
+
+    def for_model(self, model):
+        limiter = self.models.get(model)
+        if limiter is None:
+            override = self.overrides.get(model, {})
+            limiter = ModelLimiter(
+                model,
+                rpm=override.get("rpm", self.rpm),
+                tpm=override.get("tpm", self.tpm),
+                concurrency=AIMDConcurrency(
+                    override.get("concurrency", self.concurrency), self.min_concurrency, self.max_concurrency
+                )
+            )
+            self.models[model] = limiter
+        return limiter
+
+    def _backoff(self, attempt, error):
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        # Full jitter keeps throttled callers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, model, estimated_tokens, request, actual_tokens=None):
+        """Await request() within the model's budgets, retrying retryable errors until the deadline.
+
+        actual_tokens(result), when given, reports the real usage so the token bucket
+        can be corrected for the estimate.
+        """
+        limiter = self.for_model(model)
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            limiter.counters["calls"] += 1
+            try:
+                await limiter.requests.acquire(1, deadline)
+                await limiter.tokens.acquire(estimated_tokens, deadline)
+                await limiter.concurrency.acquire(deadline)
+            except DeadlineExceeded:
+                limiter.counters["deadline_exceeded"] += 1
+                raise
+            error = None
+            try:
+                result = await request()
+            except Exception as e:
+                error = e
+            finally:
+                await limiter.concurrency.release()
+
+            if error is None:
+                limiter.concurrency.on_success()
+                limiter.counters["succeeded"] += 1
+                if actual_tokens is not None:
+                    try:
+                        used = actual_tokens(result)
+                        if used is not None:
+                            limiter.tokens.adjust(used - estimated_tokens)
+                    except Exception as e:
+                        logger.debug(f"Could not read token usage for {model}: {e}")
+                return result
+
+            if is_throttle(error):
+                limiter.counters["throttled"] += 1
+                limiter.concurrency.on_throttle()
+            elif (status_code_of(error) or 0) >= 500:
+                limiter.counters["server_errors"] += 1
+            if not is_retryable(error) or attempt >= self.max_retries:
+                limiter.counters["failed"] += 1
+                raise error
+            delay = self._backoff(attempt, error)
+            if time.monotonic() + delay > deadline:
+                limiter.counters["deadline_exceeded"] += 1
+                raise error
+            attempt += 1
+            limiter.counters["retries"] += 1
+            logger.warning(f"{model} call failed ({error}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        return {model: limiter.stats() for model, limiter in self.models.items()}
@@ -1,8 +1,5 @@
 import json
 import logging
-import os
-
-import openai
 
 from bedrock_api import BedrockAPI
 from global_state import (Category, CustomerMessage, Product, State,
@@ -11,8 +8,9 @@ from global_state import (Category, CustomerMessage, Product, State,
 logger = logging.getLogger(__name__)
 
 class ResponseGenerator:
-    def __init__(self, prompts, db_handler):
+    def __init__(self, prompts, db_handler, llm_client):
         self.prompts = prompts
+        self.llm_client = llm_client
         self.db_handler = db_handler
         
     def generate_complaint(self, state: State) -> dict:
@@ -64,7 +62,7 @@ class ResponseGenerator:
         return {"customer_message": updated_message}
     
     
-    def generate_order(self, state: State) -> dict:
+    async def generate_order(self, state: State, on_token=None) -> dict:
         try:
             customer_message = state.get("customer_message", CustomerMessage())
             system_prompt_doc = self.prompts.get("response_system")
@@ -116,7 +114,7 @@ class ResponseGenerator:
                 "{questions_list}", questions_text
             )
 
-            response = self._call_openai(system_prompt, user_prompt)
+            response = await self._call_openai(system_prompt, user_prompt, on_token, prompt_name="order_response")
             if response:
                 updated_message = customer_message.model_copy(update={
                     "response": response,
@@ -132,7 +130,7 @@ class ResponseGenerator:
             logger.error(f"Error in generate_order: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
     
-    def generate_inquiry(self, state: State) -> dict:
+    async def generate_inquiry(self, state: State, on_token=None) -> dict:
         try:
             customer_message = state.get("customer_message", CustomerMessage())
             system_prompt_doc = self.prompts.get("response_system")
@@ -184,7 +182,7 @@ class ResponseGenerator:
                 "{questions_list}", questions_text
             )
 
-            response = self._call_openai(system_prompt, user_prompt)
+            response = await self._call_openai(system_prompt, user_prompt, on_token, prompt_name="inquiry_response")
             if response:
                 updated_message = customer_message.model_copy(update={
                     "response": response,
@@ -200,7 +198,7 @@ class ResponseGenerator:
             logger.error(f"Error in generate_inquiry: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}
     
-    def generate_order_inquiry(self, state: State) -> dict:
+    async def generate_order_inquiry(self, state: State, on_token=None) -> dict:
         try:
             customer_message = state.get("customer_message", CustomerMessage())
             system_prompt_doc = self.prompts.get("response_system")
@@ -259,7 +257,7 @@ class ResponseGenerator:
                 "{questions_list}", questions_text
             )
 
-            response = self._call_openai(system_prompt, user_prompt)
+            response = await self._call_openai(system_prompt, user_prompt, on_token, prompt_name="orders_inquiry_response")
             if response:
                 updated_message = customer_message.model_copy(update={
                     "response": response,
@@ -275,19 +273,10 @@ class ResponseGenerator:
             logger.error(f"Error in generate_order_inquiry: {e}")
             return {"customer_message": state.get("customer_message", CustomerMessage())}    
 
-    def _call_openai(self, system_prompt, user_prompt):
+    async def _call_openai(self, system_prompt, user_prompt, on_token=None, prompt_name=None):
         try:
-            response = openai.chat.completions.create(
-                model=os.getenv('OPEN_AI_CHAT_MODEL'),
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.0,
-            )
             # Return plain text, not JSON
-            return response.choices[0].message.content.strip()
+            return await self.llm_client.chat(system_prompt, user_prompt, max_tokens=500, temperature=0.0, on_token=on_token, prompt_name=prompt_name)
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {e}")
             return None
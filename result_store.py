@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class ResultStore:
+    """Completed email results keyed by email_id: an in-memory LRU hot tier in front of a
+    MongoDB collection that is written in buffered bulk upserts off the request path.
+
+    A stored result is only served for the same content hash, so a reused email_id
+    with a different subject or message is processed again.
+    """
+
+    def __init__(self, db_handler=None, collection_name=None, hot_entries=1024, flush_interval=1.0, flush_size=100, max_buffer=10000):
+        self.db_handler = db_handler
+        self.collection_name = collection_name
+        self.hot_entries = hot_entries
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self._hot = OrderedDict()
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._flush_requested = None
+        self._flusher = None
+        self.counters = {
+            "hot_hits": 0, "store_hits": 0, "misses": 0, "content_mismatches": 0, "forced": 0,
+            "written": 0, "degraded_skipped": 0, "write_errors": 0
+        }
+
+    @property
+    def persistent(self):
+        return self.db_handler is not None and bool(self.collection_name)
+
+    async def start(self):
+        if self.persistent:
+            self._flush_requested = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def get(self, email_id, content_hash, force=False):
+        """The stored payload for this email_id and content, or None; force always misses."""
+        if not email_id:
+            return None
+        if force:
+            self.counters["forced"] += 1
+            return None
+        with self._lock:
+            document = self._hot.get(email_id)
+            if document is not None:
+                self._hot.move_to_end(email_id)
+        tier = "hot_hits"
+        if document is None and self.persistent:
+            try:
+                documents = await asyncio.to_thread(
+                    self.db_handler.find_documents, self.collection_name, {"_id": email_id}, 1
+                )
+            except Exception as e:
+                logger.error(f"Error reading stored result for {email_id}: {e}")
+                documents = []
+            document = documents[0] if documents else None
+            if document is not None:
+                self._remember(document)
+            tier = "store_hits"
+        if document is None:
+            self.counters["misses"] += 1
+            return None
+        if document["content_hash"] != content_hash:
+            self.counters["content_mismatches"] += 1
+            return None
+        self.counters[tier] += 1
+        return document["payload"]
+
+    def put(self, email_id, content_hash, payload, degraded=False):
+        """Remember a JSON-serialisable payload; the Mongo write happens on the next flush.
+
+        A degraded result (one that fell back after a failed LLM call) is not stored, so a
+        retry of the email runs again instead of being served the fallback.
+        """
+        if not email_id:
+            return
+        if degraded:
+            self.counters["degraded_skipped"] += 1
+            logger.warning(f"Not storing degraded result for email_id={email_id}")
+            return
+        document = {"_id": email_id, "content_hash": content_hash, "payload": payload, "stored_at": time.time()}
+        self._remember(document)
+        if not self.persistent:
+            return
+        with self._lock:
+            self._buffer.append(document)
+            buffered = len(self._buffer)
+        if buffered >= self.flush_size and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    def _remember(self, document):
+        with self._lock:
+            self._hot[document["_id"]] = document
+            self._hot.move_to_end(document["_id"])
+            while len(self._hot) > self.hot_entries:
+                self._hot.popitem(last=False)
+
+    async def _flush_periodically(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch or not self.persistent:
+            return
+        # The last write for an email_id wins within a batch
+        latest = {document["_id"]: document for document in batch}
+        try:
+            await asyncio.to_thread(
+                self.db_handler.bulk_upsert,
+                self.collection_name,
+                [({"_id": email_id}, document) for email_id, document in latest.items()]
+            )
+            self.counters["written"] += len(latest)
+        except Exception as e:
+            self.counters["write_errors"] += 1
+            with self._lock:
+                # Keep the batch for the next flush unless the backlog has grown too large
+                if len(self._buffer) + len(batch) <= self.max_buffer:
+                    self._buffer = batch + self._buffer
+                else:
+                    logger.error(f"Dropping {len(batch)} results after a failed write: {e}")
+
+    def stats(self):
+        with self._lock:
+            hot = len(self._hot)
+            buffered = len(self._buffer)
+        return {
+            **self.counters,
+            "hot_entries": hot,
+            "max_hot_entries": self.hot_entries,
+            "buffered": buffered,
+            "collection": self.collection_name if self.persistent else None
+        }
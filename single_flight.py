@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+def content_key(subject, message):
+    digest = hashlib.sha256(f"{subject}\0{message}".encode("utf-8")).hexdigest()
+    return f"content:{digest}"
+
+class SingleFlight:
+    """Coalesces concurrent calls that share any key onto one running task.
+
+    The shared task is shielded, so a caller that is cancelled (e.g. a client that
+    disconnects) does not cancel the work the other callers are waiting on.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def start(self, keys, factory):
+        """Return (task, leader): the in-flight task sharing any of keys, or a new one running factory()."""
+        keys = [key for key in keys if key]
+        for key in keys:
+            task = self._inflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+                logger.info(f"Coalescing duplicate request onto in-flight {key}")
+                return task, False
+
+        task = asyncio.ensure_future(factory())
+        self.leaders += 1
+        for key in keys:
+            self._inflight[key] = task
+        task.add_done_callback(lambda done: self._release(keys, done))
+        return task, True
+
+    async def do(self, keys, factory):
+        task, _ = self.start(keys, factory)
+        return await asyncio.shield(task)
+
+    def _release(self, keys, task):
+        for key in keys:
+            if self._inflight.get(key) is task:
+                del self._inflight[key]
+
+    def stats(self):
+        total = self.leaders + self.coalesced
+        return {
+            "in_flight": len(set(map(id, self._inflight.values()))),
+            "executions": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / total if total else 0.0
+        }
+
+class EventFeed:
+    """Events published by one run, replayed from the first to every subscriber, so a
+    duplicate that joins late still sees the whole run."""
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def publish(self, event):
+        self.events.append(event)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.closed:
+                return
+            await self._changed.wait()
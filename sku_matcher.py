@@ -0,0 +1,295 @@
+import logging
+import re
+from collections import deque
+
+from global_state import Category, CustomerMessage, Product
+
+logger = logging.getLogger(__name__)
+
+_UPPERCASE_ASCII = str.maketrans("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+    "dozen": 12, "a dozen": 12, "a couple of": 2, "a pair of": 2, "couple of": 2, "pair of": 2
+}
+_NUMBER_PATTERN = "|".join(sorted((re.escape(word) for word in _NUMBER_WORDS), key=len, reverse=True))
+
+_QUANTITY_BEFORE = re.compile(
+    r"(?:^|[^\w.])(?P<quantity>\d{1,4}|" + _NUMBER_PATTERN + r")\s*(?:x|×)?\s*"
+    r"(?:(?:units?|pieces?|pcs|pairs?|sets?|packs?|items?)\s+)?(?:of\s+)?(?:the\s+|your\s+|those\s+|these\s+)?$",
+    re.IGNORECASE
+)
+# "three to four", "3-4", "2 or 3": a range is no single quantity, so the extractor's value stands
+_RANGE_BEFORE = re.compile(
+    r"(?:^|[^\w.])(?:\d{1,4}|" + _NUMBER_PATTERN + r")\s*(?:-|–|to|or)\s*$",
+    re.IGNORECASE
+)
+_ALL_BEFORE = re.compile(
+    r"\ball\s+(?:of\s+)?(?:the\s+|your\s+)?(?:remaining\s+|available\s+|in-stock\s+)?(?:stock\s+of\s+)?(?:the\s+|your\s+)?$",
+    re.IGNORECASE
+)
+_QUANTITY_AFTER = re.compile(
+    r"^\s*(?:[x×]\s*(?P<times>\d{1,4})\b|\(\s*(?:qty|quantity)?\s*:?\s*(?P<paren>\d{1,4})\s*\)|,?\s*(?:qty|quantity)\s*:?\s*(?P<label>\d{1,4})\b)",
+    re.IGNORECASE
+)
+_PURCHASE_CUES = re.compile(
+    r"\b(?:order|buy|purchase|want|need|take|get|send|ship|reserve|add)\b", re.IGNORECASE
+)
+_INQUIRY_CUES = re.compile(
+    r"\?|\b(?:tell me|information|info|details|wondering|curious|question|does|is it|are they|how|what|which|whether)\b",
+    re.IGNORECASE
+)
+# Past purchases and products the customer already owns are mentions, not requests
+_HISTORY_CUES = re.compile(
+    r"\b(?:bought|purchased|ordered|received|got|owned|previously|used to|in the past|last (?:time|year|month|week|season))\b",
+    re.IGNORECASE
+)
+_SENTENCE_BREAK = re.compile(r"[.!?\n]")
+
+class AhoCorasick:
+    """Multi-pattern exact matcher: one pass over the text finds every occurrence of every pattern."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern):
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            state = next_state
+        self.outputs[state].append(pattern)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                # Depth-1 states would otherwise fail back to themselves
+                self.fail[next_state] = target if target != next_state else 0
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def find_all(self, text):
+        """Yield (start, end, pattern) for every match in text."""
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern in self.outputs[state]:
+                yield position - len(pattern) + 1, position + 1, pattern
+
+class SkuMatch:
+    __slots__ = ("product_id", "quantity", "intent", "start")
+
+    def __init__(self, product_id, quantity, intent, start):
+        self.product_id = product_id
+        self.quantity = quantity
+        self.intent = intent
+        self.start = start
+
+    def __repr__(self):
+        return f"SkuMatch(product_id={self.product_id!r}, quantity={self.quantity}, intent={self.intent!r})"
+
+class SkuMatcher:
+    """Finds catalog product IDs quoted verbatim in an email and seeds the product lists with them."""
+
+    def __init__(self, catalog_store, lexical_index=None):
+        self.catalog_store = catalog_store
+        self.lexical_index = lexical_index
+        self._ids_by_key = {}
+        for record in catalog_store.records:
+            product_id = str(record.product_id).strip()
+            if product_id:
+                self._ids_by_key.setdefault(product_id.translate(_UPPERCASE_ASCII), record.product_id)
+        self.automaton = AhoCorasick(self._ids_by_key.keys())
+        logger.info(f"SKU matcher built for {len(self._ids_by_key)} product IDs")
+
+    def find_matches(self, subject, body):
+        matches = {}
+        # Body first so its quantities and intent win over a bare mention in the subject
+        for text in (body or "", subject or ""):
+            key_text = text.translate(_UPPERCASE_ASCII)
+            for start, end, key in self.automaton.find_all(key_text):
+                if (start > 0 and key_text[start - 1].isalnum()) or (end < len(key_text) and key_text[end].isalnum()):
+                    continue
+                product_id = self._ids_by_key[key]
+                if product_id in matches:
+                    continue
+                matches[product_id] = SkuMatch(
+                    product_id, self._quantity(text, start, end, product_id), self._intent(text, start, end), start
+                )
+        return list(matches.values())
+
+    def _quantity(self, text, start, end, product_id):
+        before = text[max(0, start - 40):start]
+        before = _SENTENCE_BREAK.split(before)[-1]
+        if _ALL_BEFORE.search(before):
+            return max(self.catalog_store.get(product_id).stock, 0)
+        match = _QUANTITY_BEFORE.search(before)
+        if match:
+            if _RANGE_BEFORE.search(before[:match.start("quantity")]):
+                return 0
+            return self._to_number(match.group("quantity"))
+        match = _QUANTITY_AFTER.match(text[end:end + 30])
+        if match:
+            return int(match.group("times") or match.group("paren") or match.group("label"))
+        return 0
+
+    @staticmethod
+    def _to_number(value):
+        if value.isdigit():
+            return int(value)
+        return _NUMBER_WORDS.get(" ".join(value.lower().split()), 0)
+
+    @staticmethod
+    def _intent(text, start, end):
+        sentence_start = max((match.end() for match in _SENTENCE_BREAK.finditer(text, 0, start)), default=0)
+        sentence_end_match = _SENTENCE_BREAK.search(text, end)
+        sentence_end = sentence_end_match.end() if sentence_end_match else len(text)
+        sentence = text[sentence_start:sentence_end]
+        if _HISTORY_CUES.search(sentence):
+            return None
+        if _PURCHASE_CUES.search(sentence):
+            return "purchase"
+        if _INQUIRY_CUES.search(sentence):
+            return "inquiry"
+        return None
+
+    def seed_products(self, customer_message: CustomerMessage, matches) -> CustomerMessage:
+        """Merge SKU matches into the product lists the message's category uses.
+
+        Items the extractor already produced keep their fields; a match only fills in a
+        missing product_id or quantity. A match goes to, in order: the item with the same ID,
+        the unresolved item whose name/description lexically matches the catalog record, the
+        only unresolved item left in its target list (when it is the only match left for that
+        list), and otherwise a new product. Matches without an explicit purchase or inquiry
+        cue (intent None) only ever fill an item with the same ID or a lexical match.
+        """
+        category = customer_message.category
+        if not matches or category not in (Category.ORDER, Category.INQUIRY, Category.ORDER_INQUIRY):
+            return customer_message
+
+        products_purchase = list(customer_message.products_purchase)
+        products_inquiry = list(customer_message.products_inquiry)
+        extracted_ids = {
+            product.product_id.strip().upper() for product in products_purchase + products_inquiry
+            if not self._unresolved(product)
+        }
+        product_lists = (products_purchase, products_inquiry)
+        remaining = []
+        for match in matches:
+            record = self.catalog_store.get(match.product_id)
+            if record is None:
+                continue
+            if not self._merge_same_id(product_lists, match, record):
+                remaining.append((match, record))
+
+        # Lexical matches first, so the elimination below only sees SKUs nothing else claimed
+        unclaimed = [(match, record) for match, record in remaining if not self._merge_lexical(product_lists, match, record)]
+
+        by_target = {}
+        for match, record in unclaimed:
+            if match.intent is None:
+                continue
+            if category == Category.ORDER or (category == Category.ORDER_INQUIRY and match.intent == "purchase"):
+                target = products_purchase
+            else:
+                target = products_inquiry
+            by_target.setdefault(id(target), (target, []))[1].append((match, record))
+        for target, pending in by_target.values():
+            unresolved = [position for position, product in enumerate(target) if self._unresolved(product)]
+            if len(pending) == 1 and len(unresolved) == 1:
+                match, record = pending[0]
+                if not self._names_other_product(target[unresolved[0]], record):
+                    self._fill(target, unresolved[0], match, record)
+                    continue
+            for match, record in pending:
+                target.append(Product(
+                    product_name=record.name,
+                    product_description=record.description,
+                    quantity=match.quantity,
+                    product_id=record.product_id
+                ))
+
+        # IDs the extractor did not produce itself, so verification does not take them as settled
+        seeded_ids = [
+            product.product_id for product in products_purchase + products_inquiry
+            if not self._unresolved(product) and product.product_id.strip().upper() not in extracted_ids
+        ]
+        return customer_message.model_copy(update={
+            "products_purchase": products_purchase,
+            "products_inquiry": products_inquiry,
+            "seeded_product_ids": list(customer_message.seeded_product_ids) + seeded_ids
+        })
+
+    @staticmethod
+    def _unresolved(product):
+        return not product.product_id or product.product_id.strip().lower() == "none"
+
+    @staticmethod
+    def _fill(products, position, match, record):
+        product = products[position]
+        update = {"product_id": record.product_id}
+        if product.quantity <= 0 and match.quantity > 0 and match.intent is not None:
+            update["quantity"] = match.quantity
+        products[position] = product.model_copy(update=update)
+
+    def _merge_same_id(self, product_lists, match, record):
+        for products in product_lists:
+            for position, product in enumerate(products):
+                if product.product_id and product.product_id.strip().upper() == str(record.product_id).upper():
+                    self._fill(products, position, match, record)
+                    return True
+        return False
+
+    def _lexical_score(self, product, record):
+        if product.product_name.strip().lower() == str(record.name).strip().lower():
+            return 1.0
+        if self.lexical_index is None:
+            return 0.0
+        row = self.catalog_store.row_of(record.product_id)
+        if row is None:
+            return 0.0
+        return float(self.lexical_index.scores(product.product_name, product.product_description)[row])
+
+    def _names_other_product(self, product, record):
+        """True when the item's name or description identifies a different catalog product."""
+        named = self.catalog_store.find_by_name(product.product_name)
+        if named is not None:
+            return named.product_id != record.product_id
+        if self.lexical_index is None:
+            return False
+        best = self.lexical_index.best_match(product.product_name, product.product_description)
+        return best is not None and best != record.product_id
+
+    def _merge_lexical(self, product_lists, match, record):
+        threshold = self.lexical_index.threshold if self.lexical_index is not None else 1.0
+        best = None
+        for products in product_lists:
+            for position, product in enumerate(products):
+                if not self._unresolved(product):
+                    continue
+                score = self._lexical_score(product, record)
+                if score >= threshold and (best is None or score > best[0]):
+                    best = (score, products, position)
+        if best is None:
+            return False
+        self._fill(best[1], best[2], match, record)
+        return True
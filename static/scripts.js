@@ -1,3 +1,26 @@
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 function populateOrdersContainer(products_purchase) {
   const ordersContainer = document.getElementById("ordersContainer");
   const orderTotal = document.getElementById("orderTotal");
@@ -256,14 +279,14 @@ document.addEventListener("DOMContentLoaded", () => {
     };
 
     try {
-      const response = await fetch("http://3.20.206.137:8000/process_email", {
+      const response = await fetch("http://3.20.206.137:8000/process_email/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(emailData),
       });
 
       /*try {
-      const response = await fetch("http://localhost:8000/process_email", {
+      const response = await fetch("http://localhost:8000/process_email/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(emailData),
@@ -273,11 +296,33 @@ document.addEventListener("DOMContentLoaded", () => {
         throw new Error(`HTTP error! Status: ${response.status}`);
       }
 
-      const data = await response.json();
+      responseEmailId.textContent = emailData.email_id;
+      responseCategory.textContent = "";
+      responseText.textContent = "";
+      responseCard.classList.remove("d-none");
+
+      let data = null;
+      await readEventStream(response, (event, payload) => {
+        if (event === "node") {
+          console.log(`Node ${payload.node} completed`, payload);
+          if (payload.category) responseCategory.textContent = payload.category;
+          if (payload.node === "check_inventory") populateOrdersContainer(payload.products_purchase);
+          if (payload.node === "similar_products") populateSuggestionsContainer(payload.products_recommendations);
+        } else if (event === "token") {
+          responseText.textContent += payload.text;
+        } else if (event === "result") {
+          data = payload;
+        } else if (event === "error") {
+          throw new Error(payload.detail);
+        }
+      });
+      if (!data) {
+        throw new Error("Stream ended without a result");
+      }
+
       responseEmailId.textContent = data.email_id;
       responseCategory.textContent = data.category;
       responseText.textContent = data.response;
-      responseCard.classList.remove("d-none");
       populateOrdersContainer(data.products_purchase);
       populateSuggestionsContainer(data.products_recommendations);
       emailForm.reset();
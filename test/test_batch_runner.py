@@ -0,0 +1,98 @@
+import json
+import sys
+import types
+
+import pytest
+
+from batch_runner import checkpoint_key, load_checkpoint, run_batch
+
+def fake_main(failing_ids=()):
+    """Stands in for main in the forked workers: run_email echoes the email back."""
+    module = types.ModuleType("main")
+    module.result_store = None
+    module.failing_ids = set(failing_ids)
+    module.db_handler = types.SimpleNamespace(client=types.SimpleNamespace(close=lambda: None))
+    module.reconnect_after_fork = lambda: None
+    module.tracer = types.SimpleNamespace(shutdown=lambda: None)
+
+    async def aclose():
+        pass
+
+    async def run_email(email):
+        if email.email_id in module.failing_ids:
+            raise RuntimeError(f"{email.email_id} failed")
+        return {"email_id": email.email_id, "response": email.message.upper()}
+
+    module.llm_client = types.SimpleNamespace(aclose=aclose)
+    module.run_email = run_email
+    return module
+
+def read_outcomes(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture
+def batch_files(tmp_path):
+    input_path = tmp_path / "emails.jsonl"
+    rows = [
+        {"email_id": "E001", "subject": "Hi", "message": "order one"},
+        {"email_id": "E002", "subject": "Hi", "message": "order two"},
+        "not json",
+        {"request_id": "E004", "title": "Hi", "body": "order four"},
+        {"email_id": "E005", "subject": "Hi", "message": ""},
+    ]
+    input_path.write_text("\n".join(row if isinstance(row, str) else json.dumps(row) for row in rows) + "\n")
+    return str(input_path), str(tmp_path / "results.jsonl"), str(tmp_path / "results.jsonl.checkpoint")
+
+def test_checkpoint_keys_round_trip(tmp_path):
+    path = tmp_path / "checkpoint"
+    path.write_text(checkpoint_key(1, "E001") + "\n\n" + checkpoint_key(2, "E001") + "\n")
+    assert load_checkpoint(str(path)) == {"1\tE001", "2\tE001"}
+    assert load_checkpoint(str(tmp_path / "missing")) == set()
+    assert load_checkpoint(None) == set()
+
+def test_batch_writes_every_row_and_checkpoints_successes(monkeypatch, batch_files):
+    input_path, output_path, checkpoint_path = batch_files
+    monkeypatch.setitem(sys.modules, "main", fake_main(failing_ids={"E002"}))
+
+    assert run_batch(input_path, output_path, checkpoint_path, workers=2, concurrency=2) == (2, 1)
+
+    outcomes = {outcome["row"]: outcome for outcome in read_outcomes(output_path)}
+    assert sorted(outcomes) == [1, 2, 3, 4, 5]
+    assert outcomes[1]["result"] == {"email_id": "E001", "response": "ORDER ONE"}
+    assert outcomes[4]["status"] == "ok"
+    assert [outcomes[row]["status"] for row in (2, 3, 5)] == ["error", "error", "error"]
+    assert outcomes[2]["error"] == "E002 failed"
+    assert load_checkpoint(checkpoint_path) == {checkpoint_key(1, "E001"), checkpoint_key(4, "E004")}
+
+def test_resumed_batch_only_retries_unfinished_rows(monkeypatch, batch_files):
+    input_path, output_path, checkpoint_path = batch_files
+    monkeypatch.setitem(sys.modules, "main", fake_main(failing_ids={"E002"}))
+    run_batch(input_path, output_path, checkpoint_path, workers=1, concurrency=1)
+    first_run = len(read_outcomes(output_path))
+
+    monkeypatch.setitem(sys.modules, "main", fake_main())
+    assert run_batch(input_path, output_path, checkpoint_path, workers=1, concurrency=1) == (1, 0)
+
+    resumed = read_outcomes(output_path)[first_run:]
+    # Unparseable rows are reported again; completed rows are not rerun
+    assert sorted((outcome["row"], outcome["status"]) for outcome in resumed) == [(2, "ok"), (3, "error"), (5, "error")]
+    assert load_checkpoint(checkpoint_path) == {
+        checkpoint_key(1, "E001"), checkpoint_key(2, "E002"), checkpoint_key(4, "E004")
+    }
+
+def test_fully_checkpointed_batch_runs_nothing(monkeypatch, batch_files):
+    input_path, output_path, checkpoint_path = batch_files
+    monkeypatch.setitem(sys.modules, "main", fake_main())
+    run_batch(input_path, output_path, checkpoint_path, workers=1, concurrency=1)
+    assert run_batch(input_path, output_path, checkpoint_path, workers=1, concurrency=1) == (0, 0)
+
+def test_changed_email_id_on_a_row_is_rerun(monkeypatch, batch_files, tmp_path):
+    input_path, output_path, checkpoint_path = batch_files
+    monkeypatch.setitem(sys.modules, "main", fake_main())
+    run_batch(input_path, output_path, checkpoint_path, workers=1, concurrency=1)
+
+    edited_path = tmp_path / "edited.jsonl"
+    edited_path.write_text(json.dumps({"email_id": "E101", "subject": "Hi", "message": "order one"}) + "\n")
+    assert run_batch(str(edited_path), output_path, checkpoint_path, workers=1, concurrency=1) == (1, 0)
+    assert checkpoint_key(1, "E101") in load_checkpoint(checkpoint_path)
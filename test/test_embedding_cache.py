@@ -0,0 +1,75 @@
+import asyncio
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, normalize_text
+from llm_client import LLMClient
+
+def test_normalize_text_folds_case_and_whitespace():
+    assert normalize_text("  Warm\tWinter  HAT\n") == "warm winter hat"
+
+def test_memory_hits_and_misses():
+    cache = EmbeddingCache()
+    cache.put_many("model", ["a"], [[1.0, 2.0]])
+    vectors = cache.get_many("model", ["a", "b"])
+    assert vectors[0].tolist() == [1.0, 2.0]
+    assert vectors[0].dtype == np.float32
+    assert vectors[1] is None
+    assert (cache.memory_hits, cache.misses) == (1, 1)
+
+def test_keys_include_the_model():
+    cache = EmbeddingCache()
+    cache.put_many("small", ["a"], [[1.0]])
+    assert cache.get_many("large", ["a"]) == [None]
+
+def test_cached_vectors_are_read_only():
+    cache = EmbeddingCache()
+    cache.put_many("model", ["a"], [[1.0]])
+    assert not cache.get_many("model", ["a"])[0].flags.writeable
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    cache.put_many("model", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("model", ["a"])
+    cache.put_many("model", ["c"], [[3.0]])
+    assert [vector is not None for vector in cache.get_many("model", ["a", "b", "c"])] == [True, False, True]
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put_many("model", ["a"], [[1.0, 2.0]])
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    assert reopened.get_many("model", ["a"])[0].tolist() == [1.0, 2.0]
+    assert reopened.get_many("model", ["a"])[0].tolist() == [1.0, 2.0]
+    assert (reopened.disk_hits, reopened.memory_hits) == (1, 1)
+    reopened.close()
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), max_entries=1, max_disk_entries=2)
+    for text in ("a", "b", "c"):
+        cache.put_many("model", [text], [[1.0]])
+    assert cache.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] == 2
+    cache.close()
+
+def test_client_only_embeds_uncached_texts_once():
+    client = LLMClient("test-key", embedding_cache=EmbeddingCache())
+    requests = []
+
+    async def create_embeddings(texts):
+        requests.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    client._create_embeddings = create_embeddings
+
+    async def main():
+        first = await client.embed_many(["Warm hat", "warm  HAT", "scarf"])
+        second = await client.embed_many(["scarf", "gloves"])
+        await client.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert requests == [["scarf", "warm hat"], ["gloves"]]
+    assert [vector[0] for vector in first] == [8.0, 8.0, 5.0]
+    assert [vector[0] for vector in second] == [5.0, 6.0]
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from job_queue import JobQueue
+
+async def echo(request):
+    await asyncio.sleep(0)
+    if request == "bad":
+        raise ValueError("bad request")
+    return {"echo": request}
+
+async def drain(job_queue):
+    await job_queue.queue.join()
+
+def test_jobs_run_and_keep_their_results():
+    async def main():
+        job_queue = JobQueue(echo, workers=2)
+        await job_queue.start()
+        good = job_queue.submit("hello")
+        bad = job_queue.submit("bad")
+        assert good.status == "queued"
+        await drain(job_queue)
+        await job_queue.stop()
+        return job_queue, job_queue.get(good.id).to_dict(), job_queue.get(bad.id).to_dict()
+
+    job_queue, good, bad = asyncio.run(main())
+    assert (good["status"], good["result"], good["error"]) == ("succeeded", {"echo": "hello"}, None)
+    assert (bad["status"], bad["result"], bad["error"]) == ("failed", None, "bad request")
+    assert good["started_at"] <= good["finished_at"]
+    stats = job_queue.stats()
+    assert (stats["submitted"], stats["succeeded"], stats["failed"], stats["busy_workers"]) == (2, 1, 1, 0)
+
+def test_full_queue_rejects_submissions():
+    async def main():
+        job_queue = JobQueue(echo, workers=1, max_queue_size=1)
+        # Not started workers leave the first job queued
+        job_queue.queue = asyncio.Queue(maxsize=1)
+        job_queue.submit("first")
+        with pytest.raises(asyncio.QueueFull):
+            job_queue.submit("second")
+        return job_queue.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["submitted"], stats["rejected"], stats["tracked_jobs"], stats["queue_depth"]) == (1, 1, 1, 1)
+
+def test_workers_bound_concurrency():
+    running = 0
+    peak = 0
+
+    async def slow(request):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return request
+
+    async def main():
+        job_queue = JobQueue(slow, workers=3)
+        await job_queue.start()
+        for number in range(10):
+            job_queue.submit(number)
+        await drain(job_queue)
+        await job_queue.stop()
+
+    asyncio.run(main())
+    assert peak == 3
+
+def test_expired_and_excess_results_are_pruned():
+    async def main():
+        job_queue = JobQueue(echo, workers=1, result_ttl_seconds=60, max_jobs=2)
+        await job_queue.start()
+        first = job_queue.submit("first")
+        second = job_queue.submit("second")
+        await drain(job_queue)
+        first.finished_at -= 120
+        third = job_queue.submit("third")
+        fourth = job_queue.submit("fourth")
+        await drain(job_queue)
+        await job_queue.stop()
+        return [job_queue.get(job.id) is not None for job in (first, second, third, fourth)]
+
+    assert asyncio.run(main()) == [False, False, True, True]
+
+def test_finished_jobs_release_their_request():
+    async def main():
+        job_queue = JobQueue(echo, workers=1)
+        await job_queue.start()
+        job = job_queue.submit("hello")
+        await drain(job_queue)
+        await job_queue.stop()
+        return job
+
+    assert asyncio.run(main()).request is None
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog_store import CatalogStore
+from lexical_index import LexicalIndex
+
+CATALOG = pd.DataFrame([
+    {"product_id": "LTH0976", "name": "Leather Bifold Wallet", "description": "Slim leather wallet with six card slots", "stock": 4},
+    {"product_id": "LTH1234", "name": "Leather Bifold Wallet Deluxe", "description": "Leather wallet with a coin pocket", "stock": 2},
+    {"product_id": "VBT2345", "name": "Vibrant Tote", "description": "Colourful canvas tote bag for the beach", "stock": 10},
+    {"product_id": "CSH1098", "name": "Cozy Shawl", "description": "Soft knitted shawl for chilly evenings", "stock": 3},
+    {"product_id": "FZZ1098", "name": "Fuzzy Slippers", "description": "Warm fleece slippers", "stock": 7},
+])
+
+@pytest.fixture(scope="module")
+def index():
+    return LexicalIndex(CatalogStore(CATALOG))
+
+def test_exact_name_scores_one(index):
+    scores = index.scores("Cozy Shawl")
+    assert scores[3] == pytest.approx(1.0)
+    assert scores.max() <= 1.0
+
+def test_search_ranks_best_first(index):
+    results = index.search("cozy shawl", k=3)
+    assert results[0][0] == "CSH1098"
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+def test_typos_still_rank_the_intended_product_first(index):
+    assert index.search("Fuzy Slipers")[0][0] == "FZZ1098"
+    assert index.search("vibrnt tote")[0][0] == "VBT2345"
+
+def test_description_words_match_the_catalog_description(index):
+    assert index.search(description="a canvas bag to take to the beach")[0][0] == "VBT2345"
+
+def test_search_returns_only_scoring_products(index):
+    assert index.search("zzzz") == []
+    assert index.search() == []
+
+def test_excluded_products_are_not_returned(index):
+    assert "CSH1098" not in [product_id for product_id, _ in index.search("Cozy Shawl", exclude_product_ids={"CSH1098"})]
+
+def test_best_match_needs_the_threshold(index):
+    assert index.best_match("Cozy Shawl") == "CSH1098"
+    assert index.best_match("shawl thing") is None
+
+def test_best_match_needs_a_margin_over_the_runner_up():
+    index = LexicalIndex(CatalogStore(CATALOG), margin=0.2)
+    # Both wallets score close together for a generic query
+    assert index.best_match("leather bifold wallets") is None
+    assert index.best_match("bifold wallet deluxe") == "LTH1234"
+
+def test_best_match_falls_to_the_runner_up_when_the_top_is_excluded(index):
+    assert index.best_match("Fuzzy Slippers", exclude_product_ids={"FZZ1098"}) is None
+
+def test_threshold_and_margin_are_configurable():
+    index = LexicalIndex(CatalogStore(CATALOG), threshold=0.3, margin=0.0)
+    assert index.best_match("shawl thing") == "CSH1098"
+
+def test_scores_cover_every_row(index):
+    scores = index.scores("wallet", "leather")
+    assert scores.shape == (len(CATALOG),)
+    assert np.all((scores >= 0.0) & (scores <= 1.0))
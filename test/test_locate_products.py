@@ -0,0 +1,111 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+from catalog_store import CatalogStore
+from global_state import Category, CustomerMessage, Product
+from lexical_index import LexicalIndex
+from locate_products import LocateProductByDescription
+from vector_index import LocalVectorIndex
+
+CATALOG = pd.DataFrame([
+    {"product_id": "LTH0976", "name": "Leather Bifold Wallet", "description": "Slim leather wallet", "stock": 4, "price": 21},
+    {"product_id": "VBT2345", "name": "Vibrant Tote", "description": "Colourful canvas tote bag", "stock": 10, "price": 39},
+    {"product_id": "CSH1098", "name": "Cozy Shawl", "description": "Soft knitted shawl", "stock": 3, "price": 29},
+])
+EMBEDDINGS = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
+
+# Query descriptions point at a catalog vector without sharing any of its words
+QUERY_EMBEDDINGS = {
+    "something to keep my cards in": [0.9, 0.1, 0.0],
+    "a bag for the beach": [0.1, 0.9, 0.0],
+    "a gift for my grandmother": [0.2, 0.0, 0.8],
+}
+
+class FakeLLMClient:
+    def __init__(self):
+        self.embed_many_calls = []
+        self.embed_calls = []
+
+    async def embed_many(self, texts):
+        self.embed_many_calls.append(list(texts))
+        return [QUERY_EMBEDDINGS[text] for text in texts]
+
+    async def embed(self, text):
+        self.embed_calls.append(text)
+        return QUERY_EMBEDDINGS[text]
+
+class FakeDBHandler:
+    def __init__(self, index):
+        self.index = index
+        self.searches = 0
+
+    def vector_search(self, collection_name, query_embedding, k=1, exclude_product_ids=None, min_stock=0):
+        self.searches += 1
+        return self.index.search(query_embedding, k=k, exclude_product_ids=exclude_product_ids, min_stock=min_stock)
+
+    def vector_search_many(self, collection_name, query_embeddings, k=1, exclude_product_ids=None, min_stock=0):
+        self.searches += 1
+        return self.index.search_many(query_embeddings, k=k, exclude_product_ids=exclude_product_ids, min_stock=min_stock)
+
+@pytest.fixture
+def locator():
+    store = CatalogStore(CATALOG)
+    index = LocalVectorIndex(CATALOG, EMBEDDINGS, store)
+    return LocateProductByDescription(
+        "test-key", FakeDBHandler(index), CATALOG, EMBEDDINGS, FakeLLMClient(), store, LexicalIndex(store)
+    )
+
+def product(name, description, product_id="none", quantity=0):
+    return Product(product_name=name, product_description=description, quantity=quantity, product_id=product_id)
+
+def locate(locator, purchase=(), inquiry=()):
+    message = CustomerMessage(category=Category.ORDER_INQUIRY, products_purchase=list(purchase), products_inquiry=list(inquiry))
+    return asyncio.run(locator.locate_product_ids({"customer_message": message}))["customer_message"]
+
+def test_unresolved_items_share_one_embedding_request_and_one_search(locator):
+    located = locate(
+        locator,
+        purchase=[product("none", "something to keep my cards in"), product("none", "a bag for the beach", quantity=2)],
+        inquiry=[product("none", "a gift for my grandmother")]
+    )
+    assert [(item.product_id, item.quantity) for item in located.products_purchase] == [("LTH0976", 1), ("VBT2345", 2)]
+    assert [item.product_id for item in located.products_inquiry] == ["CSH1098"]
+    assert locator.llm_client.embed_many_calls == [
+        ["something to keep my cards in", "a bag for the beach", "a gift for my grandmother"]
+    ]
+    assert locator.llm_client.embed_calls == []
+    assert locator.db_handler.searches == 1
+    assert locator.tier_hits["embedding"] == 3
+
+def test_name_and_lexical_matches_skip_the_embedding(locator):
+    located = locate(locator, purchase=[product("Cozy Shawl", ""), product("vibrant tote bag", "colourful tote")])
+    assert [item.product_id for item in located.products_purchase] == ["CSH1098", "VBT2345"]
+    assert locator.llm_client.embed_many_calls == []
+    assert (locator.tier_hits["exact"], locator.tier_hits["lexical"]) == (1, 1)
+
+def test_items_never_resolve_to_a_product_already_claimed(locator):
+    located = locate(
+        locator,
+        purchase=[product("Leather Bifold Wallet", "", product_id="LTH0976")],
+        inquiry=[product("none", "something to keep my cards in")]
+    )
+    assert [item.product_id for item in located.products_inquiry] != ["LTH0976"]
+    assert located.products_inquiry[0].product_id in ("VBT2345", "CSH1098")
+
+def test_duplicate_descriptions_are_embedded_once(locator):
+    located = locate(
+        locator,
+        purchase=[product("none", "A bag for the beach ")],
+        inquiry=[product("none", "a bag for the beach")]
+    )
+    assert locator.llm_client.embed_many_calls == [["a bag for the beach"]]
+    # The second item falls through to the next-best unclaimed candidate
+    assert located.products_purchase[0].product_id == "VBT2345"
+    assert located.products_inquiry[0].product_id != "VBT2345"
+
+def test_located_items_take_catalog_fields(locator):
+    located = locate(locator, purchase=[product("none", "a bag for the beach")])
+    item = located.products_purchase[0]
+    assert (item.product_name, item.product_description, item.price) == ("Vibrant Tote", "Colourful canvas tote bag", 39)
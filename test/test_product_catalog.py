@@ -0,0 +1,84 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import product_catalog
+from product_catalog import ProductCatalogProcessor
+
+class FakeDBHandler:
+    def __init__(self, documents):
+        self.documents = documents
+        self.bulk_updates = []
+
+    def find_documents(self, collection_name, query={}, limit=0, projection=None):
+        return [dict(document) for document in self.documents]
+
+    def bulk_update(self, collection_name, updates):
+        self.bulk_updates.append(updates)
+        return len(updates)
+
+class FakeEmbeddings:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.inputs = []
+        self._lock = threading.Lock()
+
+    def create(self, input, model):
+        with self._lock:
+            self.inputs.append(list(input))
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("rate limited")
+        # Out of order, as the API does not promise the input order
+        data = [SimpleNamespace(index=index, embedding=[float(len(text)), 1.0]) for index, text in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))
+
+def processor(monkeypatch, documents, batch_size="2", failures=0):
+    monkeypatch.setenv("CATALOG_EMBEDDING_BATCH_SIZE", batch_size)
+    monkeypatch.setenv("CATALOG_EMBEDDING_RETRIES", "2")
+    monkeypatch.setattr(product_catalog.time, "sleep", lambda seconds: None)
+    catalog_processor = ProductCatalogProcessor("test-key", FakeDBHandler(documents))
+    catalog_processor.client = SimpleNamespace(embeddings=FakeEmbeddings(failures))
+    return catalog_processor
+
+DOCUMENTS = [
+    {"_id": 1, "description": "a", "embedding": [0.5, 0.5]},
+    {"_id": 2, "description": "bb"},
+    {"_id": 3, "description": "ccc"},
+    {"_id": 4, "description": ""},
+    {"_id": 5, "description": "ddddd"},
+]
+
+def test_only_missing_embeddings_are_requested_in_batches(monkeypatch):
+    catalog_processor = processor(monkeypatch, DOCUMENTS)
+    catalog_processor.process_catalog()
+    requested = sorted(catalog_processor.client.embeddings.inputs)
+    assert requested == [["bb", "ccc"], ["ddddd"]]
+    assert catalog_processor.get_product_catalog()["embedding"].tolist() == [
+        [0.5, 0.5], [2.0, 1.0], [3.0, 1.0], [], [5.0, 1.0]
+    ]
+
+def test_embeddings_are_written_back_in_one_bulk_update(monkeypatch):
+    catalog_processor = processor(monkeypatch, DOCUMENTS)
+    catalog_processor.process_catalog()
+    assert len(catalog_processor.db_handler.bulk_updates) == 1
+    written = sorted((query["_id"], update["embedding"]) for query, update in catalog_processor.db_handler.bulk_updates[0])
+    assert written == [(2, [2.0, 1.0]), (3, [3.0, 1.0]), (5, [5.0, 1.0])]
+
+def test_failed_batch_is_retried(monkeypatch):
+    catalog_processor = processor(monkeypatch, DOCUMENTS, batch_size="10", failures=1)
+    catalog_processor.process_catalog()
+    assert catalog_processor.client.embeddings.inputs == [["bb", "ccc", "ddddd"]] * 2
+    assert catalog_processor.get_product_catalog()["embedding"].tolist()[4] == [5.0, 1.0]
+
+def test_batch_failing_every_retry_is_skipped(monkeypatch):
+    catalog_processor = processor(monkeypatch, DOCUMENTS, batch_size="10", failures=2)
+    catalog_processor.process_catalog()
+    assert catalog_processor.db_handler.bulk_updates == []
+    assert catalog_processor.get_product_catalog()["embedding"].tolist()[1] == []
+
+def test_catalog_without_any_embedding_is_rejected(monkeypatch):
+    catalog_processor = processor(monkeypatch, [{"_id": 1, "description": "a"}], failures=2)
+    with pytest.raises(ValueError):
+        catalog_processor.process_catalog()
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from rate_limiter import AIMDConcurrency, DeadlineExceeded, RateLimiter, TokenBucket, is_retryable, retry_after_seconds
+
+class StatusError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after": retry_after} if retry_after is not None else {})
+
+def flaky(*errors, result="ok"):
+    """A request raising the given errors in turn, then returning result."""
+    remaining = list(errors)
+    calls = []
+
+    async def request():
+        calls.append(time.monotonic())
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    return request, calls
+
+def test_throttle_halves_the_limit_once_per_cooldown():
+    concurrency = AIMDConcurrency(16, minimum=2, cooldown_seconds=60.0)
+    concurrency.on_throttle()
+    concurrency.on_throttle()
+    assert concurrency.limit == 8
+
+    concurrency.last_decrease -= 60.0
+    concurrency.on_throttle()
+    assert concurrency.limit == 4
+
+def test_throttle_never_goes_below_the_minimum():
+    concurrency = AIMDConcurrency(3, minimum=2, cooldown_seconds=0.0)
+    for _ in range(5):
+        concurrency.on_throttle()
+    assert concurrency.limit == 2
+
+def test_successes_recover_about_one_slot_per_window():
+    concurrency = AIMDConcurrency(4, maximum=6)
+    for _ in range(4):
+        concurrency.on_success()
+    assert int(concurrency.limit) == 4
+    concurrency.on_success()
+    assert int(concurrency.limit) == 5
+    for _ in range(100):
+        concurrency.on_success()
+    assert concurrency.limit == 6
+
+def test_acquire_waits_for_a_slot_and_honours_the_deadline():
+    async def main():
+        concurrency = AIMDConcurrency(1)
+        await concurrency.acquire(time.monotonic() + 1.0)
+        with pytest.raises(DeadlineExceeded):
+            await concurrency.acquire(time.monotonic() + 0.01)
+
+        waiter = asyncio.ensure_future(concurrency.acquire(time.monotonic() + 1.0))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await concurrency.release()
+        await waiter
+        return concurrency.in_flight
+
+    assert asyncio.run(main()) == 1
+
+def test_token_bucket_rejects_waits_past_the_deadline():
+    async def main():
+        bucket = TokenBucket(60)
+        await bucket.acquire(60, time.monotonic() + 1.0)
+        with pytest.raises(DeadlineExceeded):
+            await bucket.acquire(10, time.monotonic() + 1.0)
+        bucket.adjust(-5)
+        await bucket.acquire(5, time.monotonic() + 0.01)
+
+    asyncio.run(main())
+
+def test_retryable_errors():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError("bad json"))
+    assert retry_after_seconds(StatusError(429, retry_after="2")) == 2.0
+    assert retry_after_seconds(StatusError(429)) is None
+
+def test_throttled_calls_back_off_and_then_succeed():
+    limiter = RateLimiter(concurrency=8, base_delay=0.001, max_delay=0.01)
+    request, calls = flaky(StatusError(429), StatusError(500))
+    assert asyncio.run(limiter.call("model", 10, request)) == "ok"
+    assert len(calls) == 3
+    stats = limiter.stats()["model"]
+    assert (stats["retries"], stats["throttled"], stats["server_errors"], stats["succeeded"]) == (2, 1, 1, 1)
+    assert stats["concurrency_limit"] == 4
+
+def test_limit_recovers_after_throttling():
+    limiter = RateLimiter(concurrency=8, base_delay=0.001)
+    request, _ = flaky(StatusError(429))
+
+    async def main():
+        await limiter.call("model", 1, request)
+        for _ in range(20):
+            await limiter.call("model", 1, flaky()[0])
+
+    asyncio.run(main())
+    assert limiter.stats()["model"]["concurrency_limit"] > 4
+
+def test_non_retryable_errors_are_raised_at_once():
+    limiter = RateLimiter(base_delay=0.001)
+    request, calls = flaky(StatusError(400))
+    with pytest.raises(StatusError):
+        asyncio.run(limiter.call("model", 1, request))
+    assert len(calls) == 1
+    assert limiter.stats()["model"]["failed"] == 1
+
+def test_retries_stop_after_max_retries():
+    limiter = RateLimiter(max_retries=2, base_delay=0.001)
+    request, calls = flaky(*[StatusError(503)] * 5)
+    with pytest.raises(StatusError):
+        asyncio.run(limiter.call("model", 1, request))
+    assert len(calls) == 3
+
+def test_retry_after_beyond_the_deadline_is_not_waited_for():
+    limiter = RateLimiter(deadline_seconds=0.5, base_delay=0.001)
+    request, calls = flaky(StatusError(429, retry_after="5"))
+    with pytest.raises(StatusError):
+        asyncio.run(limiter.call("model", 1, request))
+    assert len(calls) == 1
+    assert limiter.stats()["model"]["deadline_exceeded"] == 1
+
+def test_backoff_is_jittered_and_capped():
+    limiter = RateLimiter(base_delay=0.5, max_delay=4.0)
+    delays = [limiter._backoff(10, ValueError()) for _ in range(200)]
+    assert all(0.0 <= delay <= 4.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert 2.0 <= limiter._backoff(0, StatusError(429, retry_after="2")) <= 2.5
+
+def test_actual_usage_corrects_the_token_estimate():
+    limiter = RateLimiter(tpm=1000)
+    request, _ = flaky(result={"tokens": 100})
+    asyncio.run(limiter.call("model", 500, request, actual_tokens=lambda result: result["tokens"]))
+    assert limiter.stats()["model"]["tokens_available"] == pytest.approx(900, abs=1)
+
+def test_overrides_apply_per_model():
+    limiter = RateLimiter(concurrency=8, overrides={"small": {"concurrency": 2, "rpm": 10}})
+    assert limiter.for_model("small").stats()["concurrency_limit"] == 2
+    assert limiter.for_model("small").stats()["rpm_limit"] == 10
+    assert limiter.for_model("large").stats()["concurrency_limit"] == 8
@@ -0,0 +1,92 @@
+import asyncio
+
+from result_store import ResultStore
+
+class FakeDBHandler:
+    def __init__(self, documents=()):
+        self.documents = {document["_id"]: document for document in documents}
+        self.writes = []
+        self.fail_writes = False
+
+    def find_documents(self, collection_name, query={}, limit=0, projection=None):
+        document = self.documents.get(query["_id"])
+        return [document] if document is not None else []
+
+    def bulk_upsert(self, collection_name, documents, ordered=False):
+        if self.fail_writes:
+            raise RuntimeError("write failed")
+        self.writes.append(documents)
+        for query, document in documents:
+            self.documents[query["_id"]] = document
+        return len(documents)
+
+def test_hot_hit_for_the_same_content():
+    store = ResultStore()
+    store.put("E001", "content:a", {"response": "hi"})
+    assert asyncio.run(store.get("E001", "content:a")) == {"response": "hi"}
+    assert store.stats()["hot_hits"] == 1
+
+def test_changed_content_is_a_miss():
+    store = ResultStore()
+    store.put("E001", "content:a", {"response": "hi"})
+    assert asyncio.run(store.get("E001", "content:b")) is None
+    assert store.stats()["content_mismatches"] == 1
+
+def test_force_bypasses_a_stored_result():
+    store = ResultStore()
+    store.put("E001", "content:a", {"response": "hi"})
+    assert asyncio.run(store.get("E001", "content:a", force=True)) is None
+    assert store.stats()["forced"] == 1
+    assert asyncio.run(store.get("E001", "content:a")) == {"response": "hi"}
+
+def test_degraded_results_are_not_stored():
+    db_handler = FakeDBHandler()
+    store = ResultStore(db_handler, "results")
+    store.put("E001", "content:a", {"response": ""}, degraded=True)
+    asyncio.run(store.flush())
+    assert asyncio.run(store.get("E001", "content:a")) is None
+    assert db_handler.writes == []
+    assert store.stats()["degraded_skipped"] == 1
+
+def test_degraded_retry_does_not_replace_a_good_result():
+    store = ResultStore()
+    store.put("E001", "content:a", {"response": "hi"})
+    store.put("E001", "content:a", {"response": ""}, degraded=True)
+    assert asyncio.run(store.get("E001", "content:a")) == {"response": "hi"}
+
+def test_store_hit_is_read_through_and_cached():
+    db_handler = FakeDBHandler([{"_id": "E001", "content_hash": "content:a", "payload": {"response": "hi"}}])
+    store = ResultStore(db_handler, "results")
+    assert asyncio.run(store.get("E001", "content:a")) == {"response": "hi"}
+    db_handler.documents.clear()
+    assert asyncio.run(store.get("E001", "content:a")) == {"response": "hi"}
+    assert (store.stats()["store_hits"], store.stats()["hot_hits"]) == (1, 1)
+
+def test_flush_writes_the_latest_result_per_email():
+    db_handler = FakeDBHandler()
+    store = ResultStore(db_handler, "results")
+    store.put("E001", "content:a", {"response": "first"})
+    store.put("E001", "content:a", {"response": "second"})
+    asyncio.run(store.flush())
+    assert len(db_handler.writes) == 1
+    assert [document["payload"] for _, document in db_handler.writes[0]] == [{"response": "second"}]
+
+def test_failed_flush_keeps_the_batch():
+    db_handler = FakeDBHandler()
+    db_handler.fail_writes = True
+    store = ResultStore(db_handler, "results")
+    store.put("E001", "content:a", {"response": "hi"})
+    asyncio.run(store.flush())
+    assert store.stats()["buffered"] == 1
+    db_handler.fail_writes = False
+    asyncio.run(store.flush())
+    assert (store.stats()["buffered"], store.stats()["written"]) == (0, 1)
+
+def test_hot_tier_evicts_least_recently_used():
+    store = ResultStore(hot_entries=2)
+    store.put("E001", "content:a", {"response": "1"})
+    store.put("E002", "content:b", {"response": "2"})
+    asyncio.run(store.get("E001", "content:a"))
+    store.put("E003", "content:c", {"response": "3"})
+    assert asyncio.run(store.get("E002", "content:b")) is None
+    assert asyncio.run(store.get("E001", "content:a")) == {"response": "1"}
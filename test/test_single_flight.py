@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from single_flight import EventFeed, SingleFlight, content_key
+
+def test_content_key_depends_on_subject_and_message():
+    assert content_key("Hi", "Order VBT2345") == content_key("Hi", "Order VBT2345")
+    assert content_key("Hi", "Order VBT2345") != content_key("Hi ", "Order VBT2345")
+    assert content_key("a", "bc") != content_key("ab", "c")
+
+def test_concurrent_calls_sharing_a_key_run_once():
+    single_flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(
+            single_flight.do(["id:E001", "content:a"], work),
+            single_flight.do(["id:E002", "content:a"], work),
+            single_flight.do(["id:E001", None], work)
+        )
+
+    assert asyncio.run(main()) == ["done", "done", "done"]
+    assert len(runs) == 1
+    assert single_flight.stats()["executions"] == 1
+    assert single_flight.stats()["coalesced"] == 2
+    assert single_flight.stats()["in_flight"] == 0
+
+def test_disjoint_keys_run_separately():
+    single_flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            single_flight.do(["id:E001"], lambda: asyncio.sleep(0, "first")),
+            single_flight.do(["id:E002"], lambda: asyncio.sleep(0, "second"))
+        )
+
+    assert asyncio.run(main()) == ["first", "second"]
+    assert single_flight.stats()["executions"] == 2
+
+def test_finished_runs_are_not_reused():
+    single_flight = SingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        return len(runs)
+
+    async def main():
+        return [await single_flight.do(["id:E001"], work), await single_flight.do(["id:E001"], work)]
+
+    assert asyncio.run(main()) == [1, 2]
+
+def test_errors_reach_every_caller_and_release_the_keys():
+    single_flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("graph failed")
+
+    async def main():
+        outcomes = await asyncio.gather(
+            single_flight.do(["id:E001"], fail), single_flight.do(["id:E001"], fail), return_exceptions=True
+        )
+        retried = await single_flight.do(["id:E001"], lambda: asyncio.sleep(0, "ok"))
+        return outcomes, retried
+
+    outcomes, retried = asyncio.run(main())
+    assert [str(outcome) for outcome in outcomes] == ["graph failed", "graph failed"]
+    assert retried == "ok"
+
+def test_cancelled_caller_does_not_cancel_the_shared_run():
+    single_flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(single_flight.do(["id:E001"], work))
+        second = asyncio.ensure_future(single_flight.do(["id:E001"], work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+def test_start_reports_the_leader():
+    single_flight = SingleFlight()
+
+    async def main():
+        task, leader = single_flight.start(["id:E001"], lambda: asyncio.sleep(0.01, "done"))
+        joined, joined_leader = single_flight.start(["id:E001"], lambda: asyncio.sleep(0, "unused"))
+        return leader, joined_leader, joined is task, await task
+
+    assert asyncio.run(main()) == (True, False, True, "done")
+
+def test_event_feed_replays_to_late_subscribers():
+    async def main():
+        feed = EventFeed()
+
+        async def collect():
+            return [event async for event in feed.subscribe()]
+
+        early = asyncio.ensure_future(collect())
+        feed.publish("node")
+        await asyncio.sleep(0)
+        late = asyncio.ensure_future(collect())
+        feed.publish("token")
+        await asyncio.sleep(0)
+        feed.close()
+        return await early, await late, await collect()
+
+    assert asyncio.run(main()) == (["node", "token"], ["node", "token"], ["node", "token"])
+
+def test_streamed_run_is_shared_with_duplicates():
+    single_flight = SingleFlight()
+    feeds = {}
+
+    async def stream(feed):
+        try:
+            for event in ("node", "token"):
+                feed.publish(event)
+                await asyncio.sleep(0)
+        finally:
+            feed.close()
+        return "result"
+
+    async def subscriber():
+        feed = EventFeed()
+        task, leader = single_flight.start(["content:a"], lambda: stream(feed))
+        if leader:
+            feeds[task] = feed
+        else:
+            feed = feeds[task]
+        return [event async for event in feed.subscribe()] + [await asyncio.shield(task)]
+
+    async def main():
+        return await asyncio.gather(subscriber(), subscriber())
+
+    assert asyncio.run(main()) == [["node", "token", "result"], ["node", "token", "result"]]
+    assert single_flight.stats()["executions"] == 1
+
+@pytest.mark.parametrize("keys", [[], [None, ""]])
+def test_calls_without_keys_are_not_coalesced(keys):
+    single_flight = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(
+            single_flight.do(keys, lambda: asyncio.sleep(0, 1)), single_flight.do(keys, lambda: asyncio.sleep(0, 2))
+        )
+
+    assert asyncio.run(main()) == [1, 2]
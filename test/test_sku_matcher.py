@@ -0,0 +1,159 @@
+import pandas as pd
+import pytest
+
+from catalog_store import CatalogStore
+from global_state import Category, CustomerMessage, Product
+from lexical_index import LexicalIndex
+from sku_matcher import AhoCorasick, SkuMatcher
+
+CATALOG = pd.DataFrame([
+    {"product_id": "LTH0976", "name": "Leather Bifold Wallet", "description": "Slim leather wallet", "stock": 4, "price": 21},
+    {"product_id": "VBT2345", "name": "Vibrant Tote", "description": "Colourful canvas tote bag", "stock": 10, "price": 39},
+    {"product_id": "CSH1098", "name": "Cozy Shawl", "description": "Soft knitted shawl", "stock": 3, "price": 29},
+    {"product_id": "FZZ1098", "name": "Fuzzy Slippers", "description": "Warm fleece slippers", "stock": 7, "price": 29},
+    {"product_id": "SDE2345", "name": "Saddle Bag", "description": "Vintage saddle bag", "stock": 2, "price": 35},
+    {"product_id": "DJN8901", "name": "Denim Jacket", "description": "Classic denim jacket", "stock": 5, "price": 30},
+    {"product_id": "RGD7654", "name": "Retro Glasses", "description": "Round retro sunglasses", "stock": 1, "price": 26},
+    {"product_id": "CRD3210", "name": "Corduroy Pants", "description": "Wide leg corduroy pants", "stock": 6, "price": 40},
+])
+
+@pytest.fixture(scope="module")
+def matcher():
+    store = CatalogStore(CATALOG)
+    return SkuMatcher(store, LexicalIndex(store))
+
+def matches_by_id(matcher, body, subject=""):
+    return {match.product_id: match for match in matcher.find_matches(subject, body)}
+
+def message(category, purchase=(), inquiry=(), body=""):
+    return CustomerMessage(
+        body=body,
+        category=category,
+        products_purchase=list(purchase),
+        products_inquiry=list(inquiry)
+    )
+
+def product(name, product_id="", quantity=0, description=""):
+    return Product(product_name=name, product_description=description, quantity=quantity, product_id=product_id)
+
+def test_aho_corasick_finds_overlapping_patterns():
+    found = sorted(AhoCorasick(["ABC", "BC", "C"]).find_all("XABC"))
+    assert found == [(1, 4, "ABC"), (2, 4, "BC"), (3, 4, "C")]
+
+def test_matches_are_case_insensitive_and_whole_word(matcher):
+    found = matches_by_id(matcher, "Please send vbt2345 and XLTH0976 and CSH10985.")
+    assert list(found) == ["VBT2345"]
+
+def test_body_match_wins_over_subject(matcher):
+    found = matcher.find_matches("VBT2345", "I want 2 VBT2345 please")
+    assert [(match.product_id, match.quantity) for match in found] == [("VBT2345", 2)]
+
+@pytest.mark.parametrize("body, quantity", [
+    ("I want to order 3 VBT2345", 3),
+    ("I want to order three VBT2345", 3),
+    ("Please send a pair of VBT2345", 2),
+    ("Please send VBT2345 x4", 4),
+    ("Please send VBT2345 (qty 5)", 5),
+    ("I need all the remaining LTH0976", 4),
+    ("Please send VBT2345", 0),
+    ("I want to order three to four VBT2345", 0),
+    ("I want to order 3-4 VBT2345", 0),
+    ("I want to order 2 or 3 VBT2345", 0),
+    ("Please send a VBT2345", 1),
+])
+def test_quantity(matcher, body, quantity):
+    product_id = "LTH0976" if "LTH0976" in body else "VBT2345"
+    assert matches_by_id(matcher, body)[product_id].quantity == quantity
+
+@pytest.mark.parametrize("body, intent", [
+    ("I want to order VBT2345.", "purchase"),
+    ("Does VBT2345 come in blue?", "inquiry"),
+    ("Can you tell me more about VBT2345, and I'd also like to buy one.", "purchase"),
+    ("VBT2345 is lovely.", None),
+    ("I bought VBT2345 last year and need a new strap.", None),
+    ("Last time I got VBT2345 it was great.", None),
+])
+def test_intent(matcher, body, intent):
+    assert matches_by_id(matcher, body)["VBT2345"].intent == intent
+
+def test_intent_is_scoped_to_the_sentence(matcher):
+    found = matches_by_id(matcher, "I love my VBT2345. I want to order CSH1098.")
+    assert found["VBT2345"].intent is None
+    assert found["CSH1098"].intent == "purchase"
+
+def test_past_purchase_mention_is_not_added_as_an_order(matcher):
+    # E019: the slippers were bought before; the boots and sunglasses are what the extractor found
+    body = (
+        "Hey there, I would like to buy Chelsea Boots [CBT 89 01] from you guys! You're so awesome I'm so "
+        "impressed with the quality of Fuzzy Slippers - FZZ1098 I've bought from you before. I hope the "
+        "quality stays. I would like to order Retro sunglasses from you, but probably next time! Thanks"
+    )
+    found = matcher.find_matches("Hi", body)
+    assert [(match.product_id, match.intent) for match in found] == [("FZZ1098", None)]
+
+    extracted = message(Category.ORDER, purchase=[product("Chelsea Boots", quantity=1)], body=body)
+    seeded = matcher.seed_products(extracted, found)
+    assert [(item.product_name, item.product_id) for item in seeded.products_purchase] == [("Chelsea Boots", "")]
+    assert seeded.products_inquiry == []
+
+def test_past_purchase_list_adds_no_inquiry_items(matcher):
+    # E021: four SKUs of past purchases, then a question about something else
+    body = (
+        "So I've bought quite large collection of vintage items from your store: SDE2345, DJN8901, RGD7654, "
+        "CRD3210, those are perfect fit for my style! I need your advice if there are any winter hats in your "
+        "store? Thank you!"
+    )
+    found = matcher.find_matches("", body)
+    assert sorted(match.product_id for match in found) == ["CRD3210", "DJN8901", "RGD7654", "SDE2345"]
+    assert all(match.intent is None for match in found)
+
+    extracted = message(Category.INQUIRY, inquiry=[product("winter hats")], body=body)
+    seeded = matcher.seed_products(extracted, found)
+    assert [(item.product_name, item.product_id) for item in seeded.products_inquiry] == [("winter hats", "")]
+
+def test_uncued_mention_still_resolves_a_matching_extracted_item(matcher):
+    found = matcher.find_matches("", "The Fuzzy Slippers FZZ1098 are lovely.")
+    extracted = message(Category.INQUIRY, inquiry=[product("Fuzzy Slippers", quantity=0)])
+    seeded = matcher.seed_products(extracted, found)
+    assert [(item.product_name, item.product_id) for item in seeded.products_inquiry] == [("Fuzzy Slippers", "FZZ1098")]
+
+def test_cued_match_fills_missing_id_and_quantity(matcher):
+    found = matcher.find_matches("", "I want to order 2 VBT2345.")
+    extracted = message(Category.ORDER, purchase=[product("Vibrant Tote")])
+    seeded = matcher.seed_products(extracted, found)
+    assert [(item.product_id, item.quantity) for item in seeded.products_purchase] == [("VBT2345", 2)]
+    assert seeded.seeded_product_ids == ["VBT2345"]
+
+def test_range_leaves_the_extracted_quantity(matcher):
+    found = matcher.find_matches("", "I want to order three to four VBT2345.")
+    extracted = message(Category.ORDER, purchase=[product("Vibrant Tote", quantity=3)])
+    seeded = matcher.seed_products(extracted, found)
+    assert [(item.product_id, item.quantity) for item in seeded.products_purchase] == [("VBT2345", 3)]
+
+def test_extracted_quantity_is_kept(matcher):
+    found = matcher.find_matches("", "I want to order 2 VBT2345.")
+    extracted = message(Category.ORDER, purchase=[product("Vibrant Tote", product_id="VBT2345", quantity=5)])
+    seeded = matcher.seed_products(extracted, found)
+    assert [(item.product_id, item.quantity) for item in seeded.products_purchase] == [("VBT2345", 5)]
+    assert seeded.seeded_product_ids == []
+
+def test_cued_match_missed_by_the_extractor_is_added(matcher):
+    found = matcher.find_matches("", "Please send 3 VBT2345.")
+    seeded = matcher.seed_products(message(Category.ORDER), found)
+    assert [(item.product_name, item.product_id, item.quantity) for item in seeded.products_purchase] == [
+        ("Vibrant Tote", "VBT2345", 3)
+    ]
+
+def test_elimination_does_not_fill_an_item_naming_another_product(matcher):
+    found = matcher.find_matches("", "I want to order LTH0976.")
+    extracted = message(Category.ORDER, purchase=[product("Cozy Shawl")])
+    seeded = matcher.seed_products(extracted, found)
+    assert [(item.product_name, item.product_id) for item in seeded.products_purchase] == [
+        ("Cozy Shawl", ""), ("Leather Bifold Wallet", "LTH0976")
+    ]
+
+def test_order_inquiry_routes_by_intent(matcher):
+    found = matcher.find_matches("", "I want to order VBT2345. Is CSH1098 warm?")
+    seeded = matcher.seed_products(message(Category.ORDER_INQUIRY), found)
+    assert [item.product_id for item in seeded.products_purchase] == ["VBT2345"]
+    assert [item.product_id for item in seeded.products_inquiry] == ["CSH1098"]
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from vector_index import LocalVectorIndex, NeighbourTable
+
+def catalog(n_rows):
+    return pd.DataFrame({"product_id": [f"P{row:03d}" for row in range(n_rows)], "stock": [1] * n_rows})
+
+def index_of(embeddings):
+    return LocalVectorIndex(catalog(len(embeddings)), [list(embedding) if embedding is not None else None for embedding in embeddings])
+
+def random_embeddings(n_rows, dimension=8, seed=0):
+    return list(np.random.default_rng(seed).normal(size=(n_rows, dimension)))
+
+def assert_same_table(table, expected):
+    np.testing.assert_array_equal(table.neighbours, expected.neighbours)
+    np.testing.assert_allclose(table.distances, expected.distances, rtol=1e-5, atol=1e-6)
+
+def test_build_lists_nearest_other_products_first():
+    index = index_of([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0], [-1.0, 0.0]])
+    table = NeighbourTable.build(index, n_neighbours=2)
+    assert [row for row, _ in table.neighbours_of(0)] == [1, 2]
+    assert [row for row, _ in table.neighbours_of(3)] == [2, 1]
+    distances = [distance for _, distance in table.neighbours_of(0)]
+    assert distances == sorted(distances)
+    assert distances[1] == pytest.approx(0.5)
+
+def test_build_agrees_with_search():
+    embeddings = random_embeddings(30)
+    index = index_of(embeddings)
+    table = NeighbourTable.build(index, n_neighbours=5, block_size=7)
+    for row in (0, 13, 29):
+        product_ids, distances, _ = index.search(embeddings[row], k=6)
+        assert [index.product_ids[neighbour] for neighbour, _ in table.neighbours_of(row)] == product_ids[1:]
+        np.testing.assert_allclose([distance for _, distance in table.neighbours_of(row)], distances[0][1:], atol=1e-6)
+
+def test_rows_without_vectors_have_no_neighbours():
+    index = index_of([[1.0, 0.0], None, [0.0, 1.0]])
+    table = NeighbourTable.build(index, n_neighbours=2)
+    assert table.neighbours_of(1) == []
+    assert [row for row, _ in table.neighbours_of(0)] == [2]
+
+@pytest.mark.parametrize("changed_rows", [[3], [0, 17, 39], list(range(0, 40, 3))])
+def test_update_rows_matches_a_full_rebuild(changed_rows):
+    embeddings = random_embeddings(40)
+    table = NeighbourTable.build(index_of(embeddings), n_neighbours=6, block_size=16)
+
+    replacements = random_embeddings(len(changed_rows), seed=1)
+    for row, embedding in zip(changed_rows, replacements):
+        embeddings[row] = embedding
+    updated_index = index_of(embeddings)
+    table.update_rows(updated_index, changed_rows, block_size=16)
+
+    assert_same_table(table, NeighbourTable.build(updated_index, n_neighbours=6))
+    np.testing.assert_array_equal(table.digests, updated_index.row_digests())
+
+def test_update_rows_moves_a_product_next_to_its_new_neighbours():
+    embeddings = [[1.0, 0.0, 0.0], [0.9, 0.1, 0.0], [0.0, 1.0, 0.0], [0.0, 0.9, 0.1], [0.0, 0.0, 1.0]]
+    table = NeighbourTable.build(index_of(embeddings), n_neighbours=1)
+    embeddings[4] = [0.95, 0.05, 0.0]
+    updated_index = index_of(embeddings)
+    table.update_rows(updated_index, [4])
+    assert table.neighbours_of(0)[0][0] == 4
+    assert table.neighbours_of(4)[0][0] == 0
+    assert_same_table(table, NeighbourTable.build(updated_index, n_neighbours=1))
+
+def test_update_rows_without_rows_changes_nothing():
+    index = index_of(random_embeddings(10))
+    table = NeighbourTable.build(index, n_neighbours=3)
+    neighbours = table.neighbours.copy()
+    table.update_rows(index, [])
+    np.testing.assert_array_equal(table.neighbours, neighbours)
+
+def test_load_or_build_refreshes_only_changed_rows(tmp_path):
+    path = str(tmp_path / "neighbours.npz")
+    embeddings = random_embeddings(20)
+    NeighbourTable.load_or_build(index_of(embeddings), path, n_neighbours=4)
+
+    embeddings[5] = random_embeddings(1, seed=2)[0]
+    updated_index = index_of(embeddings)
+    table = NeighbourTable.load_or_build(updated_index, path, n_neighbours=4)
+    assert_same_table(table, NeighbourTable.build(updated_index, n_neighbours=4))
+    assert_same_table(NeighbourTable.load_or_build(updated_index, path, n_neighbours=4), table)
+
+def test_load_or_build_rebuilds_when_products_change(tmp_path):
+    path = str(tmp_path / "neighbours.npz")
+    NeighbourTable.load_or_build(index_of(random_embeddings(20)), path, n_neighbours=4)
+    smaller_index = index_of(random_embeddings(12, seed=3))
+    table = NeighbourTable.load_or_build(smaller_index, path, n_neighbours=4)
+    assert_same_table(table, NeighbourTable.build(smaller_index, n_neighbours=4))
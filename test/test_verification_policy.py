@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from catalog_store import CatalogStore
+from global_state import Category, CustomerMessage, Product
+from verification_policy import VerificationPolicy
+
+CATALOG = pd.DataFrame([
+    {"product_id": "VBT2345", "name": "Vibrant Tote", "description": "Colourful canvas tote bag", "stock": 10, "price": 39},
+    {"product_id": "CSH1098", "name": "Cozy Shawl", "description": "Soft knitted shawl", "stock": 3, "price": 29},
+])
+
+@pytest.fixture
+def policy():
+    return VerificationPolicy(CatalogStore(CATALOG), skip_rules=("exact_ids",), sample_rate=0.0, seed=0)
+
+def order(*product_ids, seeded=()):
+    return CustomerMessage(
+        category=Category.ORDER,
+        products_purchase=[
+            Product(product_name=product_id, product_description="", quantity=1, product_id=product_id)
+            for product_id in product_ids
+        ],
+        seeded_product_ids=list(seeded)
+    )
+
+def test_exact_ids_skips_extracted_catalog_ids(policy):
+    assert policy.decide("extracted_data", order("VBT2345", "CSH1098")) == (False, "exact_ids")
+
+def test_exact_ids_needs_every_id_in_the_catalog(policy):
+    assert policy.decide("extracted_data", order("VBT2345", "XXX0000")) == (True, None)
+
+def test_exact_ids_ignores_sku_seeded_ids(policy):
+    assert policy.decide("extracted_data", order("VBT2345", "CSH1098", seeded=["CSH1098"])) == (True, None)
+
+def test_exact_ids_does_not_apply_to_category(policy):
+    assert policy.decide("category", order("VBT2345")) == (True, None)
+
+def test_sampled_requests_are_verified_and_counted():
+    policy = VerificationPolicy(CatalogStore(CATALOG), skip_rules=("exact_ids",), sample_rate=1.0, seed=0)
+    assert policy.decide("extracted_data", order("VBT2345")) == (True, "exact_ids")
+    policy.record_sample("extracted_data", "exact_ids", False)
+    stats = policy.stats()["extracted_data"]
+    assert (stats["sampled"], stats["sampled_failed"], stats["sampled_failure_rate"]) == (1, 1, 1.0)
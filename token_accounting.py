@@ -0,0 +1,153 @@
+import json
+import logging
+from contextvars import ContextVar
+
+from metrics import FALLBACKS
+
+logger = logging.getLogger(__name__)
+
+_current_usage = ContextVar("request_token_usage", default=None)
+
+def estimate_tokens(text):
+    # Same 4-characters-per-token estimate the rate limiter budgets with
+    return len(text) // 4
+
+def current_node():
+    """The LangGraph node the caller is running in, or "" outside the graph."""
+    try:
+        from langgraph.config import get_config
+        return get_config().get("metadata", {}).get("langgraph_node", "")
+    except Exception:
+        return ""
+
+def _empty_counters():
+    return {"calls": 0, "cached_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+def _add(counters, prompt_tokens, completion_tokens, cost, cached):
+    counters["calls"] += 1
+    counters["cached_calls"] += cached
+    counters["prompt_tokens"] += prompt_tokens
+    counters["completion_tokens"] += completion_tokens
+    counters["cost"] += cost
+
+class RequestUsage:
+    """Token usage of one email, broken down by "node/prompt"."""
+
+    def __init__(self):
+        self.calls = {}
+        self.totals = _empty_counters()
+        self.failed_calls = 0
+
+    def add(self, key, prompt_tokens, completion_tokens, cost, cached):
+        _add(self.calls.setdefault(key, _empty_counters()), prompt_tokens, completion_tokens, cost, cached)
+        _add(self.totals, prompt_tokens, completion_tokens, cost, cached)
+
+    def to_dict(self):
+        return {"totals": self.totals, "calls": self.calls, "failed_calls": self.failed_calls}
+
+class TokenAccountant:
+    """Records prompt/completion tokens of every LLM call by node and prompt name, and
+    aggregates per-email totals and cost by category.
+
+    prices maps a model name to {"prompt": ..., "completion": ...} in currency per 1K tokens;
+    calls to models without a price are counted with zero cost.
+    """
+
+    def __init__(self, prices=None):
+        self.prices = prices or {}
+        self.by_prompt = {}
+        self.by_category = {}
+        self.totals = _empty_counters()
+        self.counters = {"emails": 0, "failed_calls": 0, "bodies_truncated": 0, "bodies_summarized": 0}
+
+    @classmethod
+    def from_env(cls, getenv):
+        return cls(prices=json.loads(getenv('LLM_PRICES', '{}') or '{}'))
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        price = self.prices.get(model)
+        if not price:
+            return 0.0
+        return (prompt_tokens * price.get("prompt", 0.0) + completion_tokens * price.get("completion", 0.0)) / 1000.0
+
+    def record(self, model, prompt_name, prompt_tokens, completion_tokens, cached=False):
+        node = current_node() or "-"
+        key = f"{node}/{prompt_name or '-'}"
+        cost = 0.0 if cached else self.cost(model, prompt_tokens, completion_tokens)
+        _add(self.by_prompt.setdefault(key, _empty_counters()), prompt_tokens, completion_tokens, cost, cached)
+        _add(self.totals, prompt_tokens, completion_tokens, cost, cached)
+        usage = _current_usage.get()
+        if usage is not None:
+            usage.add(key, prompt_tokens, completion_tokens, cost, cached)
+
+    def record_failure(self):
+        """Count an LLM call that raised or returned unusable output against the current email."""
+        self.counters["failed_calls"] += 1
+        usage = _current_usage.get()
+        if usage is not None:
+            usage.failed_calls += 1
+
+    def begin_request(self):
+        """Start collecting the calls made from this context (and tasks it spawns) into a new RequestUsage."""
+        usage = RequestUsage()
+        _current_usage.set(usage)
+        return usage
+
+    def finish_request(self, category, usage):
+        self.counters["emails"] += 1
+        counters = self.by_category.setdefault(category, {"emails": 0, **_empty_counters()})
+        counters["emails"] += 1
+        for key in ("calls", "cached_calls", "prompt_tokens", "completion_tokens", "cost"):
+            counters[key] += usage.totals[key]
+        logger.debug(f"{category} email used {usage.totals['prompt_tokens']} prompt and {usage.totals['completion_tokens']} completion tokens")
+
+    def stats(self):
+        by_category = {}
+        for category, counters in self.by_category.items():
+            emails = counters["emails"] or 1
+            by_category[category] = {
+                **counters,
+                "avg_prompt_tokens": counters["prompt_tokens"] / emails,
+                "avg_completion_tokens": counters["completion_tokens"] / emails,
+                "avg_cost": counters["cost"] / emails
+            }
+        return {**self.counters, "totals": self.totals, "by_category": by_category, "by_prompt": self.by_prompt}
+
+class BodyBudget:
+    """Caps the email body at max_tokens once, before the graph runs, instead of every prompt
+    carrying the full text.
+
+    "truncate" keeps the opening and the closing of the body (orders, and the sign-off used
+    for the customer's name); "summarize" asks the LLM for a condensed version and falls back
+    to truncation if that fails.
+    """
+
+    def __init__(self, max_tokens=0, mode="truncate", tail_fraction=0.25):
+        self.max_tokens = max_tokens
+        self.mode = mode
+        self.tail_fraction = tail_fraction
+
+    def over_budget(self, body):
+        return self.max_tokens > 0 and estimate_tokens(body) > self.max_tokens
+
+    def truncate(self, body):
+        max_chars = self.max_tokens * 4
+        tail_chars = int(max_chars * self.tail_fraction)
+        head = body[:max_chars - tail_chars].rstrip()
+        tail = body[len(body) - tail_chars:].lstrip() if tail_chars else ""
+        return f"{head}\n[...]\n{tail}" if tail else head
+
+    async def apply(self, body, summarize=None):
+        """Return (body, action) with action "", "truncated" or "summarized"."""
+        if not self.over_budget(body):
+            return body, ""
+        if self.mode == "summarize" and summarize is not None:
+            try:
+                summary = await summarize(body, self.max_tokens)
+                if summary and not self.over_budget(summary):
+                    return summary, "summarized"
+                logger.warning("Email summary missing or still over budget, truncating instead")
+            except Exception as e:
+                logger.error(f"Error summarizing email body: {e}")
+            FALLBACKS.inc(kind="body_summary_truncated")
+        return self.truncate(body), "truncated"
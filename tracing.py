@@ -0,0 +1,299 @@
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = ContextVar("current_span", default=None)
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "status_message", "sampled")
+
+    def __init__(self, name, trace_id, parent_id=None, kind=SPAN_KIND_INTERNAL, sampled=True):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = {}
+        self.status = None
+        self.status_message = ""
+        self.sampled = sampled
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def set_error(self, error):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+def otlp_payload(spans, service_name):
+    """An OTLP/JSON ExportTraceServiceRequest for the given finished spans."""
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": _otlp_attributes(span.attributes)
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        if span.status is not None:
+            otlp_span["status"] = {"code": span.status, "message": span.status_message}
+        otlp_spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+            "scopeSpans": [{"scope": {"name": "ai-agent-emails"}, "spans": otlp_spans}]
+        }]
+    }
+
+class FileSpanExporter:
+    """Appends one OTLP/JSON export request per line, the layout the OpenTelemetry Collector's
+    file exporter writes and its otlpjsonfile receiver reads."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, payload):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+    def close(self):
+        pass
+
+class OTLPHttpExporter:
+    """POSTs OTLP/JSON to a collector's /v1/traces endpoint (e.g. http://localhost:4318)."""
+
+    def __init__(self, endpoint, timeout=5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+        self.client = httpx.Client(timeout=timeout)
+
+    def export(self, payload):
+        response = self.client.post(self.url, json=payload)
+        response.raise_for_status()
+
+    def reopen(self):
+        self.client = httpx.Client(timeout=self.timeout)
+
+    def close(self):
+        self.client.close()
+
+class Tracer:
+    """Request-scoped spans carried in a contextvar, so spans opened in graph nodes, asyncio
+    tasks and asyncio.to_thread calls nest under the span that was current when they started.
+
+    Finished spans are batched and exported from a background thread. Until configure() is
+    given an exporter every span() is a no-op; sample_rate is decided once per trace at its root.
+    """
+
+    def __init__(self, max_batch=512, flush_interval=2.0, max_queue=10000):
+        self.exporter = None
+        self.service_name = "ai-customer-agent"
+        self.sample_rate = 1.0
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.counters = {"exported": 0, "dropped": 0, "export_errors": 0}
+        self._queue = None
+        self._thread = None
+
+    def configure(self, exporter, service_name="ai-customer-agent", sample_rate=1.0):
+        self.shutdown()
+        self.exporter = exporter
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+        self._start_exporting()
+
+    def configure_from_env(self, getenv):
+        backend = getenv('TRACING_EXPORTER', 'none').lower()
+        if backend == "file":
+            exporter = FileSpanExporter(getenv('TRACING_FILE_PATH', 'traces.jsonl'))
+        elif backend == "otlp":
+            exporter = OTLPHttpExporter(getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318'))
+        else:
+            exporter = None
+        self.configure(
+            exporter,
+            service_name=getenv('OTEL_SERVICE_NAME', 'ai-customer-agent'),
+            sample_rate=float(getenv('TRACING_SAMPLE_RATE', '1.0'))
+        )
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def _start_exporting(self):
+        if self.exporter is None:
+            return
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = threading.Thread(target=self._export_loop, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """Restart the export thread (and HTTP client) in a forked worker process."""
+        if self.exporter is None:
+            return
+        if hasattr(self.exporter, "reopen"):
+            self.exporter.reopen()
+        self._start_exporting()
+
+    @contextmanager
+    def span(self, name, kind=SPAN_KIND_INTERNAL, attributes=None, parent=None):
+        """Open a child of the current span, or of parent (parse_traceparent output) when there is none.
+
+        Yields None when tracing is off; annotate through set_attributes() rather than the yielded span.
+        """
+        if self.exporter is None:
+            yield None
+            return
+        current = _current_span.get()
+        if current is not None:
+            span = Span(name, current.trace_id, current.span_id, kind, current.sampled)
+        elif parent is not None:
+            span = Span(name, parent[0], parent[1], kind, parent[2])
+        else:
+            span = Span(name, os.urandom(16).hex(), None, kind, random.random() < self.sample_rate)
+        if attributes:
+            span.set_attributes(attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # An async generator finalised from another context; the span still ends
+                pass
+            span.end_ns = time.time_ns()
+            if span.sampled:
+                self._enqueue(span)
+
+    def traced(self, name, kind=SPAN_KIND_INTERNAL, attributes=None):
+        """Decorator opening a span around every call of a sync function."""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name, kind, attributes):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _enqueue(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.counters["dropped"] += 1
+
+    def _export_loop(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    span = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._export(batch)
+                    return
+                batch.append(span)
+            self._export(batch)
+
+    def _export(self, batch):
+        if not batch:
+            return
+        try:
+            self.exporter.export(otlp_payload(batch, self.service_name))
+            self.counters["exported"] += len(batch)
+        except Exception as e:
+            self.counters["export_errors"] += 1
+            self.counters["dropped"] += len(batch)
+            logger.error(f"Error exporting {len(batch)} spans: {e}")
+
+    def shutdown(self, timeout=5.0):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self.exporter.close()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "exporter": type(self.exporter).__name__ if self.exporter else None,
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize() if self._queue else 0,
+            **self.counters
+        }
+
+tracer = Tracer()
+
+def parse_traceparent(header):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None."""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+def current_span():
+    return _current_span.get()
+
+def set_attributes(attributes):
+    """Annotate the current span, if any; a no-op when tracing is off."""
+    span = _current_span.get()
+    if span is not None:
+        span.set_attributes(attributes)
@@ -77,20 +77,14 @@ def find_similar_products(
         logger.warning(f"No products found in vector search in '{collection_name}'")
         return [], [], pd.DataFrame()
 
-    # Fetch all product documents
-    all_products = db_handler.find_documents(collection_name)
-    if not all_products:
+    # vector_search returns row positions into the catalog loaded by the handler
+    df = db_handler.get_catalog(collection_name)
+    if df.empty:
         logger.warning(f"No documents found in '{collection_name}'")
         return [], [], pd.DataFrame()
 
-    # Create DataFrame from all products
-    df = pd.DataFrame(all_products)
-    df['_id'] = df['_id'].astype(str)
-
-    # Filter DataFrame to match indices from vector search
     try:
-        closest_indices = [df.index[df['_id'] == str(result['_id'])].tolist()[0] for result in indices]
-        closest_products_df = df.iloc[closest_indices].copy()
+        closest_products_df = df.iloc[indices[0]].copy()
         closest_products_df["distance"] = distances[0]
     except IndexError:
         logger.warning(f"Error matching vector search indices to products")
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+class LocalVectorIndex:
+    """Exact cosine search over the in-memory catalog embeddings.
+
+    Distances follow Atlas $vectorSearch cosine scoring (score = (1 + cos) / 2,
+    distance = 1 - score) so callers' distance thresholds keep their meaning.
+    """
+
+    def __init__(self, product_catalog_df, catalog_embeddings, catalog_store=None):
+        self.product_catalog_df = product_catalog_df
+        self.catalog_store = catalog_store
+        self.product_ids = product_catalog_df['product_id'].to_numpy(dtype=object)
+        dimension = max((len(embedding) for embedding in catalog_embeddings if embedding is not None and len(embedding)), default=0)
+        if dimension == 0:
+            raise ValueError("No valid embeddings to build the local vector index")
+
+        matrix = np.zeros((len(catalog_embeddings), dimension), dtype=np.float32)
+        self.valid = np.zeros(len(catalog_embeddings), dtype=bool)
+        for row, embedding in enumerate(catalog_embeddings):
+            if embedding is not None and len(embedding) == dimension:
+                matrix[row] = embedding
+                self.valid[row] = True
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        matrix /= norms[:, None]
+        self.matrix = np.ascontiguousarray(matrix)
+        self.dimension = dimension
+        self.row_by_product_id = {product_id: row for row, product_id in enumerate(self.product_ids)}
+        logger.info(f"Local vector index built with {int(self.valid.sum())} vectors of dimension {dimension}")
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def stock(self):
+        if self.catalog_store is not None:
+            return self.catalog_store.stock
+        return pd.to_numeric(self.product_catalog_df['stock'], errors='coerce').fillna(0).to_numpy()
+
+    def candidate_mask(self, exclude_product_ids=None, min_stock=0):
+        mask = self.valid & (self.stock() > min_stock)
+        if exclude_product_ids:
+            for product_id in exclude_product_ids:
+                row = self.row_by_product_id.get(product_id)
+                if row is not None:
+                    mask[row] = False
+        return mask
+
+    def normalize(self, query_embedding):
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[-1] != self.dimension:
+            raise ValueError(f"Query dimension {query.shape[-1]} does not match index dimension {self.dimension}")
+        norms = np.linalg.norm(query, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return query / norms
+
+    @staticmethod
+    def top_k(scores, k):
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < len(scores):
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(len(scores))
+        return rows[np.argsort(-scores[rows], kind="stable")]
+
+    def search(self, query_embedding, k=1, exclude_product_ids=None, min_stock=0):
+        """Return (product_ids, distances, indices) shaped like MongoDBHandler.vector_search."""
+        query = self.normalize(query_embedding)
+        scores = self.matrix @ query
+        scores[~self.candidate_mask(exclude_product_ids, min_stock)] = -np.inf
+        rows = self.top_k(scores, k)
+        if len(rows) == 0:
+            return [], [], []
+        distances = 1.0 - (1.0 + scores[rows]) / 2.0
+        return self.product_ids[rows].tolist(), np.array([distances]), np.array([rows])
+
+    def search_many(self, query_embeddings, k=1, exclude_product_ids=None, min_stock=0):
+        """Score several queries in one matrix product; returns one search() result per query."""
+        queries = self.normalize(np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dimension))
+        scores = queries @ self.matrix.T
+        scores[:, ~self.candidate_mask(exclude_product_ids, min_stock)] = -np.inf
+        results = []
+        for query_scores in scores:
+            rows = self.top_k(query_scores, k)
+            if len(rows) == 0:
+                results.append(([], [], []))
+                continue
+            distances = 1.0 - (1.0 + query_scores[rows]) / 2.0
+            results.append((self.product_ids[rows].tolist(), np.array([distances]), np.array([rows])))
+        return results
+
+    def row_digests(self):
+        return np.array([hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest() for row in self.matrix], dtype=object)
+
+class NeighbourTable:
+    """Top-N nearest catalog neighbours per product, precomputed from a LocalVectorIndex.
+
+    Rows hold index row numbers (-1 when fewer than N neighbours exist) and
+    distances on the same Atlas cosine scale as LocalVectorIndex.search.
+    """
+
+    def __init__(self, neighbours, distances, product_ids, digests):
+        self.neighbours = neighbours
+        self.distances = distances
+        self.product_ids = product_ids
+        self.digests = digests
+
+    @property
+    def n_neighbours(self):
+        return self.neighbours.shape[1]
+
+    @classmethod
+    def build(cls, index, n_neighbours=20, block_size=1024):
+        n_rows = len(index)
+        n_neighbours = max(1, min(n_neighbours, n_rows - 1))
+        neighbours = np.full((n_rows, n_neighbours), -1, dtype=np.int32)
+        distances = np.full((n_rows, n_neighbours), np.inf, dtype=np.float32)
+        table = cls(neighbours, distances, index.product_ids.copy(), index.row_digests())
+        started = time.perf_counter()
+        table._compute_rows(index, np.arange(n_rows), block_size)
+        logger.info(f"Neighbour table for {n_rows} products built in {time.perf_counter() - started:.2f}s")
+        return table
+
+    def _compute_rows(self, index, rows, block_size=1024):
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            scores = index.matrix[block] @ index.matrix.T
+            scores[:, ~index.valid] = -np.inf
+            scores[~index.valid[block]] = -np.inf
+            scores[np.arange(len(block)), block] = -np.inf
+            self._store_top(block, scores)
+
+    def _store_top(self, rows, scores):
+        n_neighbours = self.n_neighbours
+        if n_neighbours < scores.shape[1]:
+            top = np.argpartition(-scores, n_neighbours - 1, axis=1)[:, :n_neighbours]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (len(rows), 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        found = np.isfinite(top_scores)
+        self.neighbours[rows] = np.where(found, top, -1)
+        self.distances[rows] = np.where(found, 1.0 - (1.0 + top_scores) / 2.0, np.inf)
+
+    def update_rows(self, index, rows, block_size=1024):
+        """Refresh the table after the vectors of the given rows changed, without a full rebuild."""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if len(rows) == 0:
+            return
+        changed = np.zeros(len(index), dtype=bool)
+        changed[rows] = True
+
+        # Rows that listed a changed product hold a stale distance and are recomputed in full
+        stale = np.any(changed[np.clip(self.neighbours, 0, None)] & (self.neighbours >= 0), axis=1)
+        recompute = np.flatnonzero(changed | stale)
+        self._compute_rows(index, recompute, block_size)
+
+        # Every other row only needs to consider the changed products as new candidates
+        others = np.flatnonzero(~(changed | stale) & index.valid)
+        for start in range(0, len(others), block_size):
+            block = others[start:start + block_size]
+            new_scores = index.matrix[block] @ index.matrix[rows].T
+            new_scores[:, ~index.valid[rows]] = -np.inf
+            current = self.neighbours[block]
+            current_scores = np.where(current >= 0, 1.0 - 2.0 * self.distances[block], -np.inf)
+            candidates = np.concatenate([current, np.broadcast_to(rows, (len(block), len(rows)))], axis=1)
+            candidate_scores = np.concatenate([current_scores, new_scores], axis=1)
+            order = np.argsort(-candidate_scores, axis=1, kind="stable")[:, :self.n_neighbours]
+            top = np.take_along_axis(candidates, order, axis=1)
+            top_scores = np.take_along_axis(candidate_scores, order, axis=1)
+            found = np.isfinite(top_scores)
+            self.neighbours[block] = np.where(found, top, -1)
+            self.distances[block] = np.where(found, 1.0 - (1.0 + top_scores) / 2.0, np.inf)
+
+        self.digests = index.row_digests()
+        logger.info(f"Neighbour table updated for {len(rows)} changed products ({len(recompute)} rows recomputed)")
+
+    def neighbours_of(self, row):
+        """Return (row, distance) pairs for a product's neighbours, nearest first."""
+        return [
+            (int(neighbour), float(distance))
+            for neighbour, distance in zip(self.neighbours[row], self.distances[row])
+            if neighbour >= 0
+        ]
+
+    def save(self, path):
+        np.savez(
+            path,
+            neighbours=self.neighbours,
+            distances=self.distances,
+            product_ids=self.product_ids.astype(str),
+            digests=self.digests.astype(str)
+        )
+        logger.info(f"Neighbour table saved to {path}")
+
+    @classmethod
+    def load_or_build(cls, index, path=None, n_neighbours=20):
+        """Load a saved table, refreshing only rows whose vectors changed; rebuild if the product set changed."""
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as saved:
+                    table = cls(
+                        saved["neighbours"], saved["distances"],
+                        saved["product_ids"].astype(object), saved["digests"].astype(object)
+                    )
+                if table.n_neighbours == max(1, min(n_neighbours, len(index) - 1)) \
+                        and np.array_equal(table.product_ids, index.product_ids):
+                    changed = np.flatnonzero(table.digests != index.row_digests())
+                    if len(changed):
+                        table.update_rows(index, changed)
+                        table.save(path)
+                    else:
+                        logger.info(f"Neighbour table loaded from {path}")
+                    return table
+                logger.info("Catalog products changed since the neighbour table was saved, rebuilding")
+            except Exception as e:
+                logger.error(f"Error loading neighbour table from {path}: {e}")
+
+        table = cls.build(index, n_neighbours)
+        if path:
+            try:
+                table.save(path)
+            except Exception as e:
+                logger.error(f"Error saving neighbour table to {path}: {e}")
+        return table
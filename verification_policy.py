@@ -0,0 +1,89 @@
+import logging
+import random
+import threading
+
+from global_state import Category, CustomerMessage
+
+logger = logging.getLogger(__name__)
+
+SKIP_RULES = ("fast_path", "exact_ids", "template_category")
+
+class VerificationPolicy:
+    """Decides per request whether the category and extracted-data verification calls run.
+
+    A skip rule that matches lets the stage be skipped, except for a sample_rate
+    fraction of those requests, which are verified anyway so the quality of skipped
+    stages stays measurable through stats().
+    """
+
+    def __init__(self, catalog_store, skip_rules=SKIP_RULES, sample_rate=0.05, template_categories=None, seed=None):
+        unknown_rules = set(skip_rules) - set(SKIP_RULES)
+        if unknown_rules:
+            raise ValueError(f"Unknown verification skip rules: {sorted(unknown_rules)}")
+        self.catalog_store = catalog_store
+        self.skip_rules = tuple(skip_rules)
+        self.sample_rate = sample_rate
+        self.template_categories = set(template_categories or (Category.COMPLAINT, Category.STATUS, Category.UNKNOWN))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {
+            stage: {"verified": 0, "skipped": {rule: 0 for rule in self.skip_rules}, "sampled": 0, "sampled_failed": 0}
+            for stage in ("category", "extracted_data")
+        }
+
+    def _matching_rule(self, stage, customer_message: CustomerMessage):
+        for rule in self.skip_rules:
+            if rule == "fast_path":
+                source = customer_message.category_source if stage == "category" else customer_message.products_source
+                if source in ("local", "sku"):
+                    return rule
+            elif rule == "exact_ids" and stage == "extracted_data":
+                # IDs filled in by the SKU prepass rather than the extractor still need verifying
+                seeded_ids = set(customer_message.seeded_product_ids)
+                products = customer_message.products_purchase + customer_message.products_inquiry
+                if products and all(
+                    product.product_id in self.catalog_store and product.product_id not in seeded_ids
+                    for product in products
+                ):
+                    return rule
+            elif rule == "template_category" and customer_message.category in self.template_categories:
+                return rule
+        return None
+
+    def decide(self, stage, customer_message: CustomerMessage):
+        """Return (verify, rule): rule is the matching skip rule, or None when no rule applies."""
+        rule = self._matching_rule(stage, customer_message)
+        with self._lock:
+            counters = self.counters[stage]
+            if rule is None:
+                counters["verified"] += 1
+                return True, None
+            if self._random.random() < self.sample_rate:
+                counters["sampled"] += 1
+                counters["verified"] += 1
+                return True, rule
+            counters["skipped"][rule] += 1
+        logger.info(f"Skipping {stage} verification ({rule})")
+        return False, rule
+
+    def record_sample(self, stage, rule, passed):
+        """Record the outcome of a verification that ran only because it was sampled."""
+        if rule is None or passed:
+            return
+        with self._lock:
+            self.counters[stage]["sampled_failed"] += 1
+        logger.warning(f"Sampled {stage} verification failed for a request the '{rule}' rule would have skipped")
+
+    def stats(self):
+        with self._lock:
+            stages = {}
+            for stage, counters in self.counters.items():
+                skipped = sum(counters["skipped"].values())
+                total = counters["verified"] + skipped
+                stages[stage] = {
+                    **counters,
+                    "skipped": dict(counters["skipped"]),
+                    "skip_rate": skipped / total if total else 0.0,
+                    "sampled_failure_rate": counters["sampled_failed"] / counters["sampled"] if counters["sampled"] else 0.0
+                }
+        return {"skip_rules": list(self.skip_rules), "sample_rate": self.sample_rate, **stages}
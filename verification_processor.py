@@ -1,16 +1,14 @@
 import json
 import logging
-import os
-
-import openai
 
 from global_state import Category, CustomerMessage, State, VerificationResult
 
 logger = logging.getLogger(__name__)
 
 class VerificationProcessor:
-    def __init__(self, api_key, prompts, db_handler=None):
+    def __init__(self, api_key, prompts, db_handler=None, llm_client=None):
         self.api_key = api_key
+        self.llm_client = llm_client
         self.prompts = prompts
         self.db_handler = db_handler
 
@@ -22,18 +20,9 @@ class VerificationProcessor:
             return obj.get(key, default)
         return default
 
-    def _call_openai(self, system_prompt, user_prompt):
+    async def _call_openai(self, system_prompt, user_prompt, prompt_name=None):
         try:
-            response = openai.chat.completions.create(
-                model=os.getenv('OPEN_AI_CHAT_MODEL'),
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=500,
-                temperature=0.0,
-            )
-            return json.loads(response.choices[0].message.content.strip())
+            return await self.llm_client.chat_json(system_prompt, user_prompt, max_tokens=500, temperature=0.0, prompt_name=prompt_name)
         except json.JSONDecodeError as e:
             logger.error(f"Error parsing OpenAI response: {e}")
             return None
@@ -60,7 +49,7 @@ class VerificationProcessor:
             logger.error(f"Error calling OpenAI API: {e}")
             return None
 
-    def verify_category(self, state: State) -> dict:
+    async def verify_category(self, state: State) -> dict:
         try:
             system_prompt_doc = self.prompts.get("verify_customer_message_system")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -83,7 +72,7 @@ class VerificationProcessor:
             extracted_info = {"category": customer_message.category.value}
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body).replace("{extracted_info}", json.dumps(extracted_info))
             
-            verification_data = self._call_openai(system_prompt, user_prompt)
+            verification_data = await self._call_openai(system_prompt, user_prompt, prompt_name="verify_category")
             if verification_data and isinstance(verification_data, dict) and "category" in verification_data:
                 logger.info("Category verification successful")
                 return {"verification_result": VerificationResult(category=verification_data["category"])}
@@ -95,7 +84,7 @@ class VerificationProcessor:
             logger.error(f"Unexpected error in verify_category: {e}")
             return {"verification_result": VerificationResult(category=False)}
 
-    def verify_remaining_extracted_data(self, state: State) -> dict:
+    async def verify_remaining_extracted_data(self, state: State) -> dict:
         try:
             system_prompt_doc = self.prompts.get("verify_customer_message_system")
             if not system_prompt_doc or system_prompt_doc.get("role") != "system":
@@ -128,7 +117,7 @@ class VerificationProcessor:
             # Use json.dumps with default parameter to handle any remaining serialization issues
             user_prompt = user_prompt_doc["content"].replace("{subject}", subject).replace("{email}", body).replace("{extracted_info}", json.dumps(extracted_info, default=str))
             
-            verification_data = self._call_openai(system_prompt, user_prompt)
+            verification_data = await self._call_openai(system_prompt, user_prompt, prompt_name="verify_remaining_extracted_data")
             if verification_data and isinstance(verification_data, dict) and all(key in verification_data for key in ["first_name", "last_name", "title", "occasion", "products_purchase", "products_inquiry"]):
                 logger.info("Remaining extracted data verification successful")
                 return {"verification_result": verification_data}